@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Timeouts adaptativos por host e etapa
+
+Em vez de um único DEFAULT_TIMEOUT para tudo, cada etapa (connect, handshake,
+login) recebe p99 × fator do histórico do host, limitado por piso e teto da
+etapa. Hosts sem histórico usam o p99 global da etapa e, sem nenhum histórico,
+um valor inicial fixo. O timeout pedido pelo cliente continua sendo o limite
+superior.
+"""
+
+import os
+from typing import Dict, Optional, Tuple
+
+from latency_stats import GLOBAL_HOST, latency_tracker
+
+# Configurações
+ADAPTIVE_TIMEOUTS = os.environ.get('ADAPTIVE_TIMEOUTS', 'true').lower() == 'true'
+ADAPTIVE_TIMEOUT_FACTOR = float(os.environ.get('ADAPTIVE_TIMEOUT_FACTOR', '3'))
+# Usado quando os timeouts adaptativos estão desligados e o cliente não pediu um valor
+FALLBACK_TIMEOUT = float(os.environ.get('DEFAULT_TIMEOUT', '10'))  # segundos
+
+# (piso, teto) em segundos por etapa
+STAGE_LIMITS: Dict[str, Tuple[float, float]] = {
+    'connect': (1.0, 10.0),
+    'handshake': (1.0, 10.0),
+    'login': (2.0, 30.0),
+}
+
+# Valores iniciais (segundos) antes de existir qualquer histórico
+STAGE_PRIORS: Dict[str, float] = {
+    'connect': 5.0,
+    'handshake': 5.0,
+    'login': 10.0,
+}
+
+
+def stage_timeout(host: str, stage: str, requested: Optional[float] = None) -> float:
+    """
+    Timeout (segundos) para uma etapa de sondagem do host
+
+    Args:
+        host: Host sondado
+        stage: 'connect', 'handshake' ou 'login'
+        requested: Timeout pedido pelo cliente (limite superior), se houver
+    """
+    if not ADAPTIVE_TIMEOUTS:
+        return float(requested) if requested is not None else FALLBACK_TIMEOUT
+
+    floor, ceiling = STAGE_LIMITS[stage]
+    upper = ceiling if requested is None else min(ceiling, float(requested))
+    floor = min(floor, upper)
+
+    p99 = latency_tracker.percentile(host, stage, 99)
+    if p99 is None:
+        p99 = latency_tracker.percentile(GLOBAL_HOST, stage, 99)
+    value = STAGE_PRIORS[stage] if p99 is None else p99 / 1000 * ADAPTIVE_TIMEOUT_FACTOR
+    return round(max(floor, min(upper, value)), 3)
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Controle de admissão e descarte de carga para os endpoints de sondagem
+
+Cada worker aceita até ADMISSION_MAX_CONCURRENT sondagens simultâneas; as
+seguintes esperam em uma fila limitada a ADMISSION_MAX_QUEUE posições e a
+ADMISSION_MAX_QUEUE_WAIT segundos. A fila é ordenada pela classe de
+prioridade (interactive, bulk, background, informada no cabeçalho
+X-Request-Priority ou no campo 'priority'), com vagas reservadas para
+interactive e envelhecimento para que bulk e background não fiquem parados.
+O pedido só rebaixa a classe padrão do endpoint; subir acima dela depende do
+max_priority do tenant. Entre clientes (tenants, ver tenants.py) as vagas
+são divididas conforme o peso de cada um, para que a importação de um
+cliente não monopolize o serviço. Com a fila cheia, ou se a espera passar
+do limite, a requisição é recusada na hora com 503 + Retry-After, em vez de
+ficar presa até o timeout do gunicorn matar o worker no meio dos logins já
+feitos. Endpoints baratos (/api/health, /api/status) não passam por aqui.
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from functools import wraps
+from typing import Dict, Any, List, Optional
+
+from flask import g, jsonify, make_response, request
+
+from tenants import ANONYMOUS_TENANT, PRIORITY_CLASSES, Tenant
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.admission')
+
+# Configurações
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '8'))  # por worker
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '16'))  # por worker
+ADMISSION_MAX_QUEUE_WAIT = float(os.environ.get('ADMISSION_MAX_QUEUE_WAIT', '10'))  # segundos
+# Vagas que só sondagens interativas podem ocupar
+ADMISSION_INTERACTIVE_RESERVED = int(os.environ.get('ADMISSION_INTERACTIVE_RESERVED', '2'))
+# A cada intervalo de espera, o pedido sobe uma classe na fila (evita inanição)
+ADMISSION_AGING_INTERVAL = float(os.environ.get('ADMISSION_AGING_INTERVAL', '2'))  # segundos
+ADMISSION_MAX_RETRY_AFTER = 60  # segundos
+
+# Classes de prioridade, da mais para a menos urgente
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BULK = 'bulk'
+PRIORITY_BACKGROUND = 'background'
+PRIORITIES = PRIORITY_CLASSES
+PRIORITY_HEADER = 'X-Request-Priority'
+
+# Tenant dos endpoints sem autenticação
+ANONYMOUS = Tenant(ANONYMOUS_TENANT)
+
+# Peso da amostra mais recente na média do tempo de atendimento
+SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """
+    Requisição recusada pelo controle de admissão (503 por sobrecarga, 429 por cota do tenant)
+    """
+
+    def __init__(self, reason: str, retry_after: int, status: int = 503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status = status
+
+
+class _Waiter:
+    """
+    Pedido de vaga; depois de concedido serve de comprovante para release()
+    """
+
+    __slots__ = ('priority', 'rank', 'tenant', 'event', 'granted', 'evicted', 'enqueued_at')
+
+    def __init__(self, priority: str, tenant: Tenant):
+        self.priority = priority
+        self.rank = PRIORITIES.index(priority)
+        self.tenant = tenant
+        self.event = threading.Event()
+        self.granted = False
+        self.evicted = False
+        self.enqueued_at = time.monotonic()
+
+    def effective_class(self, now: float) -> int:
+        """
+        Classe após o envelhecimento: sobe uma a cada ADMISSION_AGING_INTERVAL de espera
+        """
+        if ADMISSION_AGING_INTERVAL <= 0:
+            return self.rank
+        return max(0, self.rank - int((now - self.enqueued_at) // ADMISSION_AGING_INTERVAL))
+
+
+class _TenantState:
+    """
+    Contadores e tempo virtual de um tenant no escalonador
+    """
+
+    __slots__ = ('in_flight', 'queued', 'completed', 'rejected', 'virtual_time')
+
+    def __init__(self):
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.virtual_time = 0.0
+
+
+class AdmissionController:
+    """
+    Semáforo com fila de espera por prioridade e por tenant, limitada em tamanho e em tempo
+
+    Pedidos interativos passam à frente na fila e têm vagas reservadas; bulk e
+    background usam as vagas restantes e envelhecem na fila até serem atendidos.
+    Dentro de uma mesma classe, as vagas são divididas entre os tenants na
+    proporção dos pesos (fila justa por tempo virtual, equivalente ao deficit
+    round robin com custo unitário), respeitando as cotas de cada tenant. Com
+    a fila cheia, um pedido mais urgente desloca o mais recente da classe
+    menos urgente, de preferência do tenant com mais pedidos na fila.
+    """
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+                 max_queue: int = ADMISSION_MAX_QUEUE,
+                 max_queue_wait: float = ADMISSION_MAX_QUEUE_WAIT,
+                 interactive_reserved: int = ADMISSION_INTERACTIVE_RESERVED):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.interactive_reserved = min(interactive_reserved, max(0, max_concurrent - 1))
+        self._in_flight: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._waiters: List[_Waiter] = []
+        self._tenants: Dict[str, _TenantState] = {}
+        self._virtual_clock = 0.0
+        self._lock = threading.Lock()
+        self._service_time: Optional[float] = None  # média móvel (segundos)
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected_queue_full': 0,
+                      'rejected_queue_timeout': 0, 'rejected_tenant_quota': 0,
+                      'evicted': 0, 'max_queue_wait_ms': 0.0}
+        self.class_stats = {priority: {'admitted': 0, 'rejected': 0} for priority in PRIORITIES}
+
+    def _tenant(self, tenant: Tenant) -> _TenantState:
+        state = self._tenants.get(tenant.name)
+        if state is None:
+            state = self._tenants[tenant.name] = _TenantState()
+        return state
+
+    def _limit(self, priority: str) -> int:
+        if priority == PRIORITY_INTERACTIVE:
+            return self.max_concurrent
+        return self.max_concurrent - self.interactive_reserved
+
+    def _eligible(self, waiter: _Waiter, in_flight: int) -> bool:
+        if in_flight >= self._limit(waiter.priority):
+            return False
+        quota = waiter.tenant.max_in_flight
+        return not quota or self._tenant(waiter.tenant).in_flight < quota
+
+    def _grant(self, waiter: _Waiter) -> None:
+        state = self._tenant(waiter.tenant)
+        self._waiters.remove(waiter)
+        state.queued -= 1
+        state.in_flight += 1
+        self._virtual_clock = max(self._virtual_clock, state.virtual_time)
+        state.virtual_time += 1 / waiter.tenant.weight
+        self._in_flight[waiter.priority] += 1
+        waiter.granted = True
+        waiter.event.set()
+
+    def _dispatch(self) -> None:
+        """
+        Concede vagas livres: classe mais urgente (já envelhecida) primeiro, depois o
+        tenant com menor tempo virtual e, dentro dele, o pedido mais antigo
+        """
+        now = time.monotonic()
+        while self._waiters:
+            in_flight = sum(self._in_flight.values())
+            eligible = [w for w in self._waiters if self._eligible(w, in_flight)]
+            if not eligible:
+                return
+            best_class = min(w.effective_class(now) for w in eligible)
+            candidates = [w for w in eligible if w.effective_class(now) == best_class]
+            self._grant(min(candidates, key=lambda w: (
+                self._tenant(w.tenant).virtual_time, w.enqueued_at)))
+
+    def retry_after(self) -> int:
+        """
+        Segundos estimados até haver vaga: fila à frente × tempo médio de atendimento
+        """
+        service_time = self._service_time if self._service_time is not None else self.max_queue_wait
+        estimate = service_time * (len(self._waiters) + 1) / max(1, self.max_concurrent)
+        return int(min(ADMISSION_MAX_RETRY_AFTER, max(1, math.ceil(estimate))))
+
+    def _reject(self, waiter: _Waiter, counter: str, reason: str, status: int = 503) -> AdmissionRejected:
+        self.stats[counter] += 1
+        self.class_stats[waiter.priority]['rejected'] += 1
+        self._tenant(waiter.tenant).rejected += 1
+        return AdmissionRejected(reason, self.retry_after(), status)
+
+    def _remove_queued(self, waiter: _Waiter) -> None:
+        self._waiters.remove(waiter)
+        self._tenant(waiter.tenant).queued -= 1
+
+    def acquire(self, priority: str = PRIORITY_INTERACTIVE, tenant: Optional[Tenant] = None) -> _Waiter:
+        """
+        Ocupa uma vaga da classe de prioridade para o tenant, esperando na fila se preciso
+
+        Returns:
+            Comprovante a ser entregue a release()
+
+        Raises:
+            AdmissionRejected: fila cheia, cota de fila do tenant excedida, pedido
+            deslocado por outro mais urgente ou espera acima de max_queue_wait
+        """
+        waiter = _Waiter(priority, tenant or ANONYMOUS)
+        with self._lock:
+            state = self._tenant(waiter.tenant)
+            if waiter.tenant.max_queued and state.queued >= waiter.tenant.max_queued:
+                raise self._reject(waiter, 'rejected_tenant_quota',
+                                   'Cota de pedidos em fila do cliente excedida', 429)
+            # Quem pode ser atendido na hora não ocupa a fila (pedidos elegíveis
+            # nunca ficam esperando: _dispatch os atende assim que chegam)
+            immediate = self._eligible(waiter, sum(self._in_flight.values()))
+            if not immediate and len(self._waiters) >= self.max_queue:
+                # Desloca o mais recente da classe menos urgente, do tenant com mais pedidos na fila
+                worst = max(self._waiters, key=lambda w: (
+                    w.rank, self._tenant(w.tenant).queued, w.enqueued_at), default=None)
+                if worst is None or worst.rank <= waiter.rank:
+                    raise self._reject(waiter, 'rejected_queue_full', 'Fila de espera cheia')
+                self._remove_queued(worst)
+                worst.evicted = True
+                worst.event.set()
+            if state.queued == 0 and state.in_flight == 0:
+                # Tenant que volta a ficar ativo não acumula crédito do tempo parado
+                state.virtual_time = max(state.virtual_time, self._virtual_clock)
+            self._waiters.append(waiter)
+            state.queued += 1
+            self._dispatch()
+            if not waiter.granted:
+                self.stats['queued'] += 1
+
+        if not waiter.granted:
+            waiter.event.wait(self.max_queue_wait)
+
+        with self._lock:
+            # A vaga pode ter sido concedida logo após o fim da espera
+            if not waiter.granted:
+                if waiter.evicted:
+                    raise self._reject(waiter, 'evicted',
+                                       'Fila de espera cheia (pedido mais urgente passou à frente)')
+                self._remove_queued(waiter)
+                raise self._reject(waiter, 'rejected_queue_timeout',
+                                   'Tempo máximo de espera na fila excedido')
+            waited_ms = round((time.monotonic() - waiter.enqueued_at) * 1000, 2)
+            self.stats['admitted'] += 1
+            self.class_stats[priority]['admitted'] += 1
+            self.stats['max_queue_wait_ms'] = max(self.stats['max_queue_wait_ms'], waited_ms)
+        return waiter
+
+    def release(self, ticket: _Waiter, service_time: Optional[float] = None) -> None:
+        """
+        Libera a vaga e a repassa ao próximo da fila
+        """
+        with self._lock:
+            if service_time is not None:
+                self._service_time = service_time if self._service_time is None else \
+                    SERVICE_TIME_ALPHA * service_time + (1 - SERVICE_TIME_ALPHA) * self._service_time
+            self._in_flight[ticket.priority] -= 1
+            state = self._tenant(ticket.tenant)
+            state.in_flight -= 1
+            state.completed += 1
+            self._dispatch()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {'in_flight': sum(self._in_flight.values()), 'queued': len(self._waiters)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            classes = {
+                priority: dict(self.class_stats[priority],
+                               in_flight=self._in_flight[priority],
+                               queued=sum(1 for w in self._waiters if w.priority == priority))
+                for priority in PRIORITIES
+            }
+            tenants = {
+                name: {'in_flight': state.in_flight, 'queued': state.queued,
+                       'completed': state.completed, 'rejected': state.rejected}
+                for name, state in self._tenants.items()
+            }
+            return dict(
+                self.stats,
+                enabled=ADMISSION_ENABLED,
+                in_flight=sum(self._in_flight.values()),
+                queue_depth=len(self._waiters),
+                max_concurrent=self.max_concurrent,
+                interactive_reserved=self.interactive_reserved,
+                max_queue=self.max_queue,
+                max_queue_wait_s=self.max_queue_wait,
+                avg_service_time_ms=round(self._service_time * 1000, 2)
+                if self._service_time is not None else None,
+                classes=classes,
+                tenants=tenants
+            )
+
+
+admission_controller = AdmissionController()
+
+
+def _add_load_headers(response, priority: str) -> None:
+    counts = admission_controller.counts()
+    response.headers[PRIORITY_HEADER] = priority
+    response.headers['X-Admission-In-Flight'] = str(counts['in_flight'])
+    response.headers['X-Admission-Queued'] = str(counts['queued'])
+
+
+def request_priority(default: str = PRIORITY_INTERACTIVE, tenant: Optional[Tenant] = None) -> Optional[str]:
+    """
+    Classe de prioridade da requisição: cabeçalho X-Request-Priority ou campo
+    'priority' do corpo JSON; None se o valor informado for inválido
+
+    Qualquer cliente pode rebaixar a classe, mas não subir acima de default
+    (ex.: uma importação bulk pedindo interactive); só o max_priority do
+    tenant permite isso.
+    """
+    priority = request.headers.get(PRIORITY_HEADER)
+    if not priority:
+        body = request.get_json(silent=True)
+        priority = body.get('priority') if isinstance(body, dict) else None
+    if not priority:
+        return default
+    priority = str(priority).strip().lower()
+    if priority not in PRIORITIES:
+        return None
+    ceiling = PRIORITIES.index(default)
+    if tenant is not None and tenant.max_priority is not None:
+        ceiling = min(ceiling, PRIORITIES.index(tenant.max_priority))
+    return PRIORITIES[max(ceiling, PRIORITIES.index(priority))]
+
+
+def admission_controlled(default_priority: str = PRIORITY_INTERACTIVE):
+    """
+    Decorator para os endpoints de sondagem: passa pelo controle de admissão na
+    classe de prioridade pedida (ou default_priority) e informa a carga do
+    worker nos cabeçalhos da resposta
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not ADMISSION_ENABLED:
+                return f(*args, **kwargs)
+
+            tenant = g.get('tenant') or ANONYMOUS
+            priority = request_priority(default_priority, tenant)
+            if priority is None:
+                return jsonify({
+                    'success': False,
+                    'message': f'Prioridade inválida; use uma de: {", ".join(PRIORITIES)}'
+                }), 400
+
+            try:
+                ticket = admission_controller.acquire(priority, tenant)
+            except AdmissionRejected as e:
+                logger.warning(f"Requisição {priority} de {tenant.name} recusada pelo controle de "
+                               f"admissão: {e.reason}")
+                prefix = 'Serviço sobrecarregado: ' if e.status == 503 else ''
+                response = make_response(jsonify({
+                    'success': False,
+                    'message': f'{prefix}{e.reason}. Tente novamente em {e.retry_after}s',
+                    'retryAfter': e.retry_after
+                }), e.status)
+                response.headers['Retry-After'] = str(e.retry_after)
+                _add_load_headers(response, priority)
+                return response
+
+            start_time = time.monotonic()
+            released = False
+
+            def release():
+                nonlocal released
+                if not released:
+                    released = True
+                    admission_controller.release(ticket, time.monotonic() - start_time)
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                release()
+                raise
+            _add_load_headers(response, priority)
+            if response.is_streamed:
+                # Respostas transmitidas mantêm a vaga até o fim da transmissão
+                response.call_on_close(release)
+            else:
+                release()
+            return response
+        return decorated_function
+    return decorator
+
+
+def get_admission_stats() -> Dict[str, Any]:
+    """
+    Estatísticas do controle de admissão deste worker
+    """
+    return admission_controller.snapshot()
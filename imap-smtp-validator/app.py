@@ -10,22 +10,50 @@ contornando as limitações das Edge Functions do Supabase.
 import os
 import ssl
 import json
+import errno
 import socket
+import hashlib
 import logging
-import imaplib
-import smtplib
-import dns.resolver
-import platform
-import psutil
+import ipaddress
 import datetime
-from email.mime.text import MIMEText
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, List, Optional, Tuple, Union
 import time
 from logging.handlers import RotatingFileHandler
-from imap_error_diagnostic import sanitizar_erro_imap, diagnosticar_erro_imap
+from imap_error_diagnostic import get_diagnostic_cache_stats, sanitizar_erro_imap, diagnosticar_erro_imap
+from smtp_error_diagnostic import TIPOS_AUTENTICACAO as SMTP_AUTH_ERROR_TYPES, sanitizar_erro_smtp
+from server_discovery import discover_servers
+from provider_registry import get_registry
+from domain_resolution import DomainResolution, resolve_domain
+import dns_resolver_pool
+from happy_eyeballs import HappyEyeballsError
+from hedged_connect import establish_connection
+from latency_stats import get_latency_stats, record_latency
+from adaptive_timeouts import ADAPTIVE_TIMEOUTS, stage_timeout
+from latency_sketch import DEFAULT_WINDOWS, record_sample, sketch_store
+from cache_backend import MISS, get_cache
+from tenants import build_registry
+from rate_limit import get_rate_limit_stats, rate_limited
+from auth_suppression import check_suppressed, get_auth_suppression_stats, record_auth_result
+from credential_precheck import CredentialPrecheck
+from probe_context import (
+    ProbeCancelled,
+    cancellable_probe,
+    get_probe_cancellation_stats,
+    probe_stage,
+    track_resource
+)
+from probe_watchdog import get_probe_dump, get_watchdog_stats, probe_budget, watch_probe, watchdog_result
+from admission_control import PRIORITY_BACKGROUND, PRIORITY_BULK, admission_controlled, get_admission_stats
+from connection_prewarm import (
+    PREWARM_ON_VERIFY,
+    get_prewarm_stats,
+    prewarm_provider_settings,
+    take_parked_connection
+)
 
 # Configuração do logging
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
@@ -36,29 +64,31 @@ LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d]
 logger = logging.getLogger('emailmax-validator')
 logger.setLevel(getattr(logging, LOG_LEVEL))
 
-# Configurar formatador
-formatter = logging.Formatter(LOG_FORMAT)
-
-# Console handler
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
-
-# Adicionar file handler se LOG_FILE estiver definido
-if LOG_FILE:
-    file_handler = RotatingFileHandler(
-        LOG_FILE, 
-        maxBytes=10*1024*1024,  # 10MB
-        backupCount=5
-    )
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+# Os handlers são adicionados uma única vez, mesmo que o módulo seja importado
+# de novo (ex.: como __main__ e como 'app')
+if not logger.handlers:
+    # Configurar formatador
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    # Console handler
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+
+    # Adicionar file handler se LOG_FILE estiver definido
+    if LOG_FILE:
+        file_handler = RotatingFileHandler(
+            LOG_FILE, 
+            maxBytes=10*1024*1024,  # 10MB
+            backupCount=5
+        )
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
 
 logger.info("Inicializando o microserviço de validação IMAP/SMTP")
 
-# Inicialização da aplicação Flask
-app = Flask(__name__)
-CORS(app)
+# Rotas da API; a aplicação Flask é montada por create_app()
+api_bp = Blueprint('api', __name__)
 
 # Variáveis globais para monitoramento
 SERVICE_START_TIME = datetime.datetime.now()
@@ -72,8 +102,19 @@ HEALTH_CHECK_TARGETS = [
 API_KEY = os.environ.get('API_KEY', 'dev_key_change_me_in_production')
 DEFAULT_TIMEOUT = int(os.environ.get('DEFAULT_TIMEOUT', '10'))  # segundos
 HEALTH_CHECK_INTERVAL = int(os.environ.get('HEALTH_CHECK_INTERVAL', '300'))  # segundos
-
-logger.info(f"Usando timeout padrão de {DEFAULT_TIMEOUT} segundos")
+BULK_MAX_EMAILS = int(os.environ.get('BULK_MAX_EMAILS', '10000'))
+BULK_MAX_IN_FLIGHT = int(os.environ.get('BULK_MAX_IN_FLIGHT', '32'))
+CACHE_DNS_TTL = int(os.environ.get('CACHE_DNS_TTL', '300'))  # segundos
+CACHE_DNS_NEGATIVE_TTL = int(os.environ.get('CACHE_DNS_NEGATIVE_TTL', '30'))  # segundos
+CACHE_PROVIDER_CONFIG_TTL = int(os.environ.get('CACHE_PROVIDER_CONFIG_TTL', '3600'))  # segundos
+CACHE_PROVIDER_CONFIG_NEGATIVE_TTL = int(os.environ.get('CACHE_PROVIDER_CONFIG_NEGATIVE_TTL', '600'))  # segundos
+# Sondagens SMTP seguradas enquanto o provedor pede para reduzir o ritmo (decisão 'throttle')
+SMTP_THROTTLE_NAMESPACE = 'smtp-throttle'
+
+if ADAPTIVE_TIMEOUTS:
+    logger.info("Usando timeouts adaptativos por host e etapa")
+else:
+    logger.info(f"Usando timeout padrão de {DEFAULT_TIMEOUT} segundos")
 if API_KEY == 'dev_key_change_me_in_production':
     logger.warning("Usando API_KEY padrão! Altere para um valor seguro em produção.")
 
@@ -82,7 +123,8 @@ KNOWN_PROVIDERS = {
     'gmail': {
         'imap': {'host': 'imap.gmail.com', 'port': 993, 'secure': True},
         'smtp': {'host': 'smtp.gmail.com', 'port': 587, 'secure': False, 'starttls': True},
-        'password_pattern': r'^[a-z]{4} [a-z]{4} [a-z]{4} [a-z]{4}$',
+        # 16 letras, com ou sem os espaços exibidos pelo Google
+        'password_pattern': r'^[a-z]{4} ?[a-z]{4} ?[a-z]{4} ?[a-z]{4}$',
         'password_instructions': 'Para contas Gmail, use uma Senha de Aplicativo no formato: xxxx xxxx xxxx xxxx'
     },
     'outlook': {
@@ -100,7 +142,13 @@ KNOWN_PROVIDERS = {
     }
 }
 
-# Decorator para verificar API key
+# Regras locais de formato de credenciais, compiladas uma única vez
+credential_precheck = CredentialPrecheck(KNOWN_PROVIDERS)
+
+# Clientes (tenants) identificados pelas chaves de API; API_KEY é o tenant 'default'
+tenant_registry = build_registry(API_KEY)
+
+# Decorator para verificar API key e identificar o tenant (disponível em g.tenant)
 def require_api_key(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -108,43 +156,76 @@ def require_api_key(f):
         if api_key and api_key.startswith('Bearer '):
             api_key = api_key[7:]  # Remover 'Bearer ' do início
         
-        if not api_key or api_key != API_KEY:
+        tenant = tenant_registry.authenticate(api_key)
+        if tenant is None:
             return jsonify({'success': False, 'message': 'API key inválida ou não fornecida'}), 401
+        g.tenant = tenant
         return f(*args, **kwargs)
     return decorated_function
 
+# Função auxiliar para obter configurações a partir de um veredito do registro
+def _provider_settings(verdict: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Retorna as configurações do provedor identificado, priorizando KNOWN_PROVIDERS
+    """
+    if not verdict:
+        return None
+    provider_id = verdict['provider']
+    if provider_id in KNOWN_PROVIDERS:
+        return KNOWN_PROVIDERS[provider_id]
+    return get_registry().settings_for(provider_id)
+
 # Função para detectar configuração automática com base no email
-def detect_provider_config(email: str) -> Dict[str, Any]:
+def detect_provider_config(email: str, resolution: Optional[DomainResolution] = None,
+                           discover: bool = True) -> Dict[str, Any]:
     """
     Detecta automaticamente as configurações com base no domínio do email
+
+    Se a requisição já tiver um contexto de resolução do domínio, ele é
+    reaproveitado para evitar consultas DNS repetidas. Com discover=False a
+    descoberta por sondagem de servidores é pulada (apenas DNS e registro).
     """
     domain = email.split('@')[-1].lower()
-    
-    # Detecção básica de provedores conhecidos
-    if 'gmail' in domain:
-        return KNOWN_PROVIDERS['gmail']
-    elif 'outlook' in domain or 'hotmail' in domain or 'live' in domain:
-        return KNOWN_PROVIDERS['outlook']
-    elif 'yahoo' in domain:
-        return KNOWN_PROVIDERS['yahoo']
-    
-    # Tentar descobrir servidores via DNS MX
-    try:
-        result = dns.resolver.resolve(domain, 'MX')
-        if result:
-            mx_record = str(result[0].exchange)
-            logger.info(f"MX record para {domain}: {mx_record}")
-            
-            # Tentar inferir configurações com base no MX
-            if 'google' in mx_record or 'gmail' in mx_record:
-                return KNOWN_PROVIDERS['gmail']
-            elif 'outlook' in mx_record or 'microsoft' in mx_record:
-                return KNOWN_PROVIDERS['outlook']
-            elif 'yahoo' in mx_record:
-                return KNOWN_PROVIDERS['yahoo']
-    except Exception as e:
-        logger.warning(f"Erro ao resolver DNS MX para {domain}: {e}")
-    
+
+    # Detecção de provedores conhecidos pelo registro offline (sem rede)
+    if resolution is None:
+        settings = _provider_settings(get_registry().lookup_domain(domain))
+        if settings:
+            return settings
+
+    # Resultados que dependem de DNS/sondagem são compartilhados entre os workers
+    cache = get_cache()
+    cache_key = f'{domain}|{int(discover)}'
+    settings = cache.get('provider_config', cache_key)
+    if settings is not MISS:
+        return settings
+
+    settings = _detect_provider_config_network(domain, resolution or resolve_domain(domain), discover)
+    ttl = CACHE_PROVIDER_CONFIG_NEGATIVE_TTL if settings.get('detected') == 'auto' \
+        else CACHE_PROVIDER_CONFIG_TTL
+    cache.set('provider_config', cache_key, settings, ttl)
+    return settings
+
+def _detect_provider_config_network(domain: str, resolution: DomainResolution,
+                                    discover: bool) -> Dict[str, Any]:
+    """
+    Parte da detecção que depende de DNS (MX) e, opcionalmente, da descoberta de servidores
+    """
+    # Veredito pelo domínio ou, em seguida, pelos registros MX
+    settings = _provider_settings(resolution.verdict)
+    if settings:
+        return settings
+
+    # Descoberta paralela de candidatos (SRV, padrões de hostname, MX e portas)
+    discovered = discover_servers(domain, resolution.mx_hosts) if discover else None
+    if discovered:
+        return {
+            'imap': discovered.get('imap', {'host': f'imap.{domain}', 'port': 993, 'secure': True}),
+            'smtp': discovered.get('smtp', {'host': f'smtp.{domain}', 'port': 587, 'secure': False, 'starttls': True}),
+            'detected': 'discovery',
+            'discovery': discovered['discovery']
+        }
+
     # Configuração padrão se não conseguir detectar
     return {
         'imap': {'host': f'imap.{domain}', 'port': 993, 'secure': True},
@@ -155,16 +236,31 @@ def detect_provider_config(email: str) -> Dict[str, Any]:
 # Função para verificar DNS
 def check_dns(host: str) -> Dict[str, Any]:
     """
-    Verifica se o servidor existe através de resolução DNS
+    Verifica se o servidor existe através de resolução DNS (registros A e AAAA em paralelo)
+
+    O resultado fica no cache compartilhado; falhas ficam por menos tempo.
     """
+    return get_cache().get_or_compute(
+        'dns', host.lower(), CACHE_DNS_TTL, lambda: _resolve_host(host),
+        negative_ttl=CACHE_DNS_NEGATIVE_TTL, is_negative=lambda result: not result['success'])
+
+def _resolve_host(host: str) -> Dict[str, Any]:
+    import dns.resolver
     try:
-        addresses = dns.resolver.resolve(host, 'A')
-        if addresses:
+        answers = dns_resolver_pool.resolve_many(host, ['A', 'AAAA'])
+        ipv4 = [] if isinstance(answers['A'], Exception) else [str(addr) for addr in answers['A']]
+        ipv6 = [] if isinstance(answers['AAAA'], Exception) else [str(addr) for addr in answers['AAAA']]
+        if ipv4 or ipv6:
             return {
                 'success': True,
                 'message': f'Servidor {host} encontrado via DNS',
-                'addresses': [str(addr) for addr in addresses]
+                'addresses': ipv4 + ipv6,
+                'ipv4': ipv4,
+                'ipv6': ipv6
             }
+        error = answers['A'] if isinstance(answers['A'], Exception) else None
+        if error is not None and not isinstance(error, (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN)):
+            raise error
         return {
             'success': False,
             'message': f'Não foi possível resolver o servidor {host} via DNS'
@@ -176,78 +272,187 @@ def check_dns(host: str) -> Dict[str, Any]:
         }
 
 # Função para testar conexão de rede básica
-def test_network_connection(host: str, port: int, timeout: int = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+def test_network_connection(host: str, port: int, timeout: Optional[int] = None,
+                            addresses: Optional[List[str]] = None,
+                            keep_socket: bool = False, tls: bool = False,
+                            keep_error: bool = False) -> Dict[str, Any]:
     """
     Testa se é possível estabelecer uma conexão TCP com o servidor e porta
+
+    timeout é o limite superior pedido pelo cliente; os timeouts efetivos de
+    cada etapa vêm do histórico do host (adaptive_timeouts). Todos os
+    endereços resolvidos (IPv6 e IPv4) disputam a conexão no estilo Happy
+    Eyeballs. Com tls=True o handshake TLS direto também é feito aqui, com
+    uma tentativa extra (hedge) se passar do p95 do host. Com
+    keep_socket=True o socket conectado é devolvido em 'socket' para ser
+    reaproveitado pelo cliente IMAP/SMTP; com keep_error=True a exceção de
+    uma falha vem em 'error', para o diagnóstico (não é serializável).
     """
+    if addresses is None:
+        try:
+            ipaddress.ip_address(host)
+            addresses = [host]
+        except ValueError:
+            dns_result = check_dns(host)
+            if not dns_result['success']:
+                return {
+                    'success': False,
+                    'message': dns_result['message']
+                }
+            addresses = dns_result['addresses']
+
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        
-        result = sock.connect_ex((host, port))
-        sock.close()
-        
-        if result == 0:
-            return {
-                'success': True,
-                'message': f'Conexão com {host}:{port} estabelecida com sucesso'
-            }
-        else:
-            # Converter código de erro para mensagem mais amigável
-            error_message = f'Não foi possível conectar a {host}:{port} - Erro: {result}'
-            if result == 111:
-                error_message = f'Conexão recusada por {host}:{port} - verifique se o servidor está online'
-            elif result == 110 or result == 10060:
-                error_message = f'Tempo limite excedido ao conectar a {host}:{port}'
-                
-            return {
-                'success': False,
-                'message': error_message
-            }
+        connection = establish_connection(host, port, addresses, timeout, tls=tls)
+    except HappyEyeballsError as e:
+        # Converter código de erro para mensagem mais amigável
+        error_message = f'Não foi possível conectar a {host}:{port} - Erro: {e.strerror}'
+        if e.errno == errno.ECONNREFUSED:
+            error_message = f'Conexão recusada por {host}:{port} - verifique se o servidor está online'
+        elif e.errno == errno.ETIMEDOUT:
+            error_message = f'Tempo limite excedido ao conectar a {host}:{port}'
+
+        failure = {
+            'success': False,
+            'message': error_message,
+            'attempts': e.attempts
+        }
+        error = e
+    except ssl.SSLError as e:
+        failure = {
+            'success': False,
+            'message': f'Erro no handshake TLS com {host}:{port}: {str(e)}',
+            'stage': 'ssl'
+        }
+        error = e
     except Exception as e:
-        return {
+        failure = {
             'success': False,
             'message': f'Erro ao conectar com {host}:{port}: {str(e)}'
         }
+        error = e
+    else:
+        failure = None
+    if failure is not None:
+        if keep_error:
+            failure['error'] = error
+        return failure
+
+    sock = connection.pop('socket')
+    result = dict(connection, success=True,
+                  message=f'Conexão com {host}:{port} estabelecida com sucesso')
+    if keep_socket:
+        result['socket'] = sock
+    else:
+        sock.close()
+    return result
+
+def _network_summary(net_check: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Resumo da etapa de rede incluído nos resultados de sucesso
+    """
+    keys = ('address', 'family', 'connect_ms', 'handshake_ms', 'hedged', 'timeouts')
+    return {key: net_check[key] for key in keys if key in net_check}
+
+# Função para calcular o prazo total de uma sondagem (vigia de sondagens travadas)
+def _probe_budget(host: str, secure: bool, timeout: Optional[int]) -> float:
+    handshake = stage_timeout(host, 'handshake', timeout) if secure else 0.0
+    dns = dns_resolver_pool.DNS_QUERY_TIMEOUT * dns_resolver_pool.DNS_MAX_ATTEMPTS
+    return probe_budget(stage_timeout(host, 'connect', timeout), handshake,
+                        stage_timeout(host, 'login', timeout), dns)
 
 # Função para testar conexão IMAP
 def test_imap_connection(email: str, password: str, host: str, port: int, 
-                         secure: bool = True, timeout: int = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+                         secure: bool = True, timeout: Optional[int] = None,
+                         resolution: Optional[DomainResolution] = None) -> Dict[str, Any]:
     """
     Testa uma conexão IMAP completa, incluindo autenticação
+
+    Credenciais em formato impossível (credential_precheck) são recusadas sem
+    acesso à rede, e credenciais recusadas recentemente (auth_suppression)
+    recebem o diagnóstico guardado sem contatar o provedor, para não levar a
+    conta a um bloqueio.
     """
+    precheck = credential_precheck.check(email, password, host)
+    if precheck is not None:
+        return precheck
+
+    suppressed = check_suppressed(email, host, password)
+    if suppressed is not None:
+        logger.info(f"Login IMAP em {host} suprimido: credenciais recusadas recentemente")
+        return suppressed
+
+    with watch_probe('imap', host, port, _probe_budget(host, secure, timeout)) as watch:
+        result = _probe_imap_connection(email, password, host, port, secure, timeout, resolution)
+    if watch is not None and watch.forced:
+        # O erro de socket da etapa presa não diz nada; o vigia sabe onde parou
+        result = watchdog_result(watch)
+    record_auth_result(email, host, password, result)
+    return result
+
+def _probe_imap_connection(email: str, password: str, host: str, port: int,
+                           secure: bool, timeout: Optional[int],
+                           resolution: Optional[DomainResolution]) -> Dict[str, Any]:
+    import imaplib
+    from probe_clients import open_imap_client
+
     logger.info(f"Testando conexão IMAP para {email} em {host}:{port}")
-    
-    # Primeiro verificar DNS
-    dns_check = check_dns(host)
-    if not dns_check['success']:
-        return {
-            'success': False,
-            'message': f'Falha na resolução DNS: {dns_check["message"]}',
-            'stage': 'dns',
-            'details': dns_check
-        }
-        
-    # Depois verificar conexão de rede
-    net_check = test_network_connection(host, port, timeout)
-    if not net_check['success']:
-        return {
-            'success': False,
-            'message': f'Falha na conexão de rede: {net_check["message"]}',
-            'stage': 'network',
-            'details': net_check
-        }
+    probe_stage('dns')
+
+    # Conexão pré-aquecida por /api/verify-email-domain dispensa DNS e rede
+    parked_sock = take_parked_connection(host, port, secure)
+    connected_sock = parked_sock
+    network = None
+    if parked_sock is None:
+        # Primeiro verificar DNS
+        dns_check = check_dns(host)
+        if not dns_check['success']:
+            return {
+                'success': False,
+                'message': f'Falha na resolução DNS: {dns_check["message"]}',
+                'stage': 'dns',
+                'details': dns_check
+            }
+
+        # Depois verificar conexão de rede (o socket vencedor é reaproveitado pelo cliente)
+        probe_stage('connect')
+        net_check = test_network_connection(host, port, timeout, addresses=dns_check['addresses'],
+                                            keep_socket=True, tls=secure)
+        if not net_check['success'] and net_check.get('stage') == 'ssl':
+            diagnostico = sanitizar_erro_imap(ssl.SSLError(net_check['message']), host, email, resolution)
+            return {
+                'success': False,
+                'message': diagnostico["message"],
+                'stage': 'ssl',
+                'error_type': 'ssl_error',
+                'solutions': diagnostico['solutions'],
+                'diagnostic_info': diagnostico
+            }
+        if not net_check['success']:
+            return {
+                'success': False,
+                'message': f'Falha na conexão de rede: {net_check["message"]}',
+                'stage': 'network',
+                'details': net_check
+            }
+        connected_sock = net_check.pop('socket')
+        network = _network_summary(net_check)
+    track_resource(connected_sock)
     
     # Agora tentar autenticação IMAP
+    probe_stage('login')
     try:
         # Criar cliente IMAP com SSL se necessário
-        if secure:
-            imap = imaplib.IMAP4_SSL(host, port=port, timeout=timeout)
-        else:
-            imap = imaplib.IMAP4(host, port=port, timeout=timeout)
-        
-        # Tentar login
-        imap.login(email, password)
+        login_start = time.time()
+        try:
+            imap = open_imap_client(host, port, secure, stage_timeout(host, 'login', timeout),
+                                    sock=connected_sock)
+            track_resource(imap)
+
+            # Tentar login
+            imap.login(email, password)
+        finally:
+            # Falhas e timeouts também contam para o timeout adaptativo
+            record_latency(host, 'login', (time.time() - login_start) * 1000)
         
         # Listar caixas de correio
         mailboxes = []
@@ -279,12 +484,14 @@ def test_imap_connection(email: str, password: str, host: str, port: int,
             'success': True,
             'message': f'Conexão IMAP com {host}:{port} estabelecida com sucesso',
             'mailboxes': mailboxes,
-            'stage': 'authenticated'
+            'stage': 'authenticated',
+            'prewarmed': parked_sock is not None,
+            'network': network
         }
         
     except imaplib.IMAP4.error as e:
         # Utiliza o novo sistema de diagnóstico
-        diagnostico = sanitizar_erro_imap(e, host, email)
+        diagnostico = sanitizar_erro_imap(e, host, email, resolution)
 
         error_msg = str(e)
         error_type = diagnostico["error_type"]
@@ -310,7 +517,7 @@ def test_imap_connection(email: str, password: str, host: str, port: int,
             }
     except ssl.SSLError as e:
         # Diagnóstico específico para erros SSL
-        diagnostico = sanitizar_erro_imap(e, host, email)
+        diagnostico = sanitizar_erro_imap(e, host, email, resolution)
         return {
             'success': False,
             'message': diagnostico["message"],
@@ -321,7 +528,7 @@ def test_imap_connection(email: str, password: str, host: str, port: int,
         }
     except (socket.timeout, socket.error, ConnectionRefusedError, ConnectionError) as e:
         # Diagnóstico para erros de conexão
-        diagnostico = sanitizar_erro_imap(e, host, email)
+        diagnostico = sanitizar_erro_imap(e, host, email, resolution)
         return {
             'success': False,
             'message': diagnostico["message"],
@@ -332,7 +539,7 @@ def test_imap_connection(email: str, password: str, host: str, port: int,
         }
     except Exception as e:
         # Diagnóstico genérico para outros erros
-        diagnostico = sanitizar_erro_imap(e, host, email)
+        diagnostico = sanitizar_erro_imap(e, host, email, resolution)
         return {
             'success': False,
             'message': diagnostico["message"],
@@ -345,50 +552,143 @@ def test_imap_connection(email: str, password: str, host: str, port: int,
 # Função para testar conexão SMTP
 def test_smtp_connection(email: str, password: str, host: str, port: int,
                          secure: bool = False, starttls: bool = True,
-                         timeout: int = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+                         timeout: Optional[int] = None) -> Dict[str, Any]:
     """
     Testa uma conexão SMTP completa, incluindo autenticação
+
+    Como no IMAP, credenciais recusadas recentemente (auth_suppression)
+    recebem o diagnóstico guardado sem contatar o provedor; a decisão de
+    supressão vem do diagnóstico SMTP (smtp_error_diagnostic). Se o
+    diagnóstico pediu para reduzir o ritmo (throttle), a conta também não é
+    sondada de novo naquele host até passar o retry_after.
     """
+    precheck = credential_precheck.check(email, password, host)
+    if precheck is not None:
+        return precheck
+
+    suppressed = check_suppressed(email, host, password)
+    if suppressed is not None:
+        logger.info(f"Login SMTP em {host} suprimido: credenciais recusadas recentemente")
+        return suppressed
+
+    throttled = _smtp_throttled(email, host)
+    if throttled is not None:
+        logger.info(f"Sondagem SMTP em {host} adiada: o provedor pediu para reduzir o ritmo")
+        return throttled
+
+    with watch_probe('smtp', host, port, _probe_budget(host, secure, timeout)) as watch:
+        result = _probe_smtp_connection(email, password, host, port, secure, starttls, timeout)
+    if watch is not None and watch.forced:
+        result = watchdog_result(watch)
+    record_auth_result(email, host, password, result)
+    _record_smtp_throttle(email, host, result)
+    return result
+
+# Função para obter a chave do freio de sondagens SMTP (conta e host, só como hash)
+def _smtp_throttle_key(email: str, host: str) -> str:
+    return hashlib.sha256(f'{email.strip().lower()}|{host.lower()}'.encode('utf-8')).hexdigest()
+
+# Função para devolver o resultado guardado enquanto o provedor pede para reduzir o ritmo
+def _smtp_throttled(email: str, host: str) -> Optional[Dict[str, Any]]:
+    entry = get_cache().get(SMTP_THROTTLE_NAMESPACE, _smtp_throttle_key(email, host))
+    if entry is MISS:
+        return None
+    remaining = entry['until'] - time.time()
+    if remaining <= 0:
+        return None
+    return dict(entry['result'], throttled=True, retryAfter=int(remaining) + 1)
+
+# Função para segurar novas sondagens da conta quando o diagnóstico pede limitação
+def _record_smtp_throttle(email: str, host: str, result: Dict[str, Any]) -> None:
+    decision = result.get('decision') or {}
+    if result.get('success') or not decision.get('throttle') or not decision.get('retry_after'):
+        return
+    get_cache().set(SMTP_THROTTLE_NAMESPACE, _smtp_throttle_key(email, host), {
+        'until': time.time() + decision['retry_after'],
+        'result': result
+    }, decision['retry_after'])
+
+# Função para montar o resultado de uma falha SMTP a partir do diagnóstico
+def _smtp_failure(error: Exception, host: str, email: str, stage: str, smtp=None) -> Dict[str, Any]:
+    # A última resposta de erro do servidor explica quedas de conexão (ex.: 421 antes de fechar)
+    last_reply = getattr(smtp, 'last_error_reply', None)
+    diagnostico = sanitizar_erro_smtp(error, host, email, resposta=last_reply)
+    if diagnostico['error_type'] in SMTP_AUTH_ERROR_TYPES:
+        stage = 'authentication'
+    result = {
+        'success': False,
+        'message': diagnostico['message'],
+        'stage': stage,
+        'error_type': diagnostico['error_type'],
+        'decision': diagnostico['decision'],
+        'solutions': diagnostico['solutions'],
+        'diagnostic_info': diagnostico
+    }
+    if diagnostico['technical_details']['reply_code'] is not None:
+        result['error_code'] = diagnostico['technical_details']['reply_code']
+    if diagnostico['decision']['retry'] and diagnostico['decision']['retry_after']:
+        # Falha temporária: quanto esperar antes de testar de novo (vira Retry-After)
+        result['retryAfter'] = diagnostico['decision']['retry_after']
+    return result
+
+def _probe_smtp_connection(email: str, password: str, host: str, port: int,
+                           secure: bool, starttls: bool, timeout: Optional[int]) -> Dict[str, Any]:
+    import smtplib
+    from probe_clients import open_smtp_client
+
     logger.info(f"Testando conexão SMTP para {email} em {host}:{port}")
-    
-    # Primeiro verificar DNS
-    dns_check = check_dns(host)
-    if not dns_check['success']:
-        return {
-            'success': False,
-            'message': f'Falha na resolução DNS: {dns_check["message"]}',
-            'stage': 'dns',
-            'details': dns_check
-        }
-        
-    # Depois verificar conexão de rede
-    net_check = test_network_connection(host, port, timeout)
-    if not net_check['success']:
-        return {
-            'success': False,
-            'message': f'Falha na conexão de rede: {net_check["message"]}',
-            'stage': 'network',
-            'details': net_check
-        }
+    probe_stage('dns')
+
+    # Conexão pré-aquecida por /api/verify-email-domain dispensa DNS e rede
+    parked_sock = take_parked_connection(host, port, secure)
+    connected_sock = parked_sock
+    network = None
+    if parked_sock is None:
+        # Primeiro verificar DNS
+        dns_check = check_dns(host)
+        if not dns_check['success']:
+            result = _smtp_failure(socket.gaierror(dns_check['message']), host, email, 'dns')
+            result['details'] = dns_check
+            return result
+
+        # Depois verificar conexão de rede (o socket vencedor é reaproveitado pelo cliente)
+        probe_stage('connect')
+        net_check = test_network_connection(host, port, timeout, addresses=dns_check['addresses'],
+                                            keep_socket=True, tls=secure, keep_error=True)
+        if not net_check['success']:
+            # Timeout, recusa e erro TLS passam pelo diagnóstico para ter a decisão de nova tentativa
+            error = net_check.pop('error')
+            result = _smtp_failure(error, host, email, 'ssl' if net_check.get('stage') == 'ssl' else 'network')
+            result['details'] = net_check
+            return result
+        connected_sock = net_check.pop('socket')
+        network = _network_summary(net_check)
+    track_resource(connected_sock)
     
     # Agora tentar autenticação SMTP
+    probe_stage('login')
+    smtp = None
     try:
         # Criar cliente SMTP com SSL se necessário
-        if secure:
-            smtp = smtplib.SMTP_SSL(host, port=port, timeout=timeout)
-        else:
-            smtp = smtplib.SMTP(host, port=port, timeout=timeout)
-            
-        # Iniciar conexão
-        smtp.ehlo()
-        
-        # Ativar STARTTLS se necessário
-        if starttls and not secure:
-            smtp.starttls()
-            smtp.ehlo()  # Precisa fazer ehlo novamente após STARTTLS
-        
-        # Tentar login
-        smtp.login(email, password)
+        login_start = time.time()
+        try:
+            smtp = open_smtp_client(host, port, secure, stage_timeout(host, 'login', timeout),
+                                    sock=connected_sock)
+            track_resource(smtp)
+
+            # Iniciar conexão
+            smtp.ehlo()
+
+            # Ativar STARTTLS se necessário
+            if starttls and not secure:
+                smtp.starttls()
+                smtp.ehlo()  # Precisa fazer ehlo novamente após STARTTLS
+
+            # Tentar login
+            smtp.login(email, password)
+        finally:
+            # Falhas e timeouts também contam para o timeout adaptativo
+            record_latency(host, 'login', (time.time() - login_start) * 1000)
         
         # Verificar suporte a extensões
         supported_extensions = []
@@ -402,44 +702,27 @@ def test_smtp_connection(email: str, password: str, host: str, port: int,
             'success': True,
             'message': f'Conexão SMTP com {host}:{port} estabelecida com sucesso',
             'extensions': supported_extensions,
-            'stage': 'authenticated'
+            'stage': 'authenticated',
+            'prewarmed': parked_sock is not None,
+            'network': network
         }
         
     except smtplib.SMTPAuthenticationError as e:
-        return {
-            'success': False,
-            'message': f'Falha na autenticação SMTP: {str(e)}',
-            'stage': 'authentication',
-            'error_type': 'credentials',
-            'error_code': e.smtp_code
-        }
+        # Utiliza o diagnóstico por código de resposta e status estendido
+        return _smtp_failure(e, host, email, 'authentication', smtp)
     except smtplib.SMTPException as e:
-        return {
-            'success': False,
-            'message': f'Erro SMTP: {str(e)}',
-            'stage': 'protocol',
-            'error_type': 'protocol_error'
-        }
+        return _smtp_failure(e, host, email, 'protocol', smtp)
     except ssl.SSLError as e:
-        return {
-            'success': False,
-            'message': f'Erro SSL na conexão SMTP: {str(e)}',
-            'stage': 'ssl',
-            'error_type': 'ssl_error'
-        }
+        return _smtp_failure(e, host, email, 'ssl', smtp)
     except Exception as e:
-        return {
-            'success': False,
-            'message': f'Erro ao conectar via SMTP: {str(e)}',
-            'stage': 'connection',
-            'error_type': 'unknown'
-        }
+        return _smtp_failure(e, host, email, 'connection', smtp)
 
 # Funções para monitoramento de saúde
 def get_system_resources() -> Dict[str, Any]:
     """
     Coleta informações sobre recursos do sistema (CPU, memória, etc)
     """
+    import psutil
     try:
         # Coletar informações de CPU
         cpu_percent = psutil.cpu_percent(interval=0.5)
@@ -495,6 +778,8 @@ def check_external_connectivity() -> Dict[str, Any]:
                 start_time = time.time()
                 connection_result = test_network_connection(host, port, timeout=5)
                 response_time = round((time.time() - start_time) * 1000, 2)  # ms
+                if connection_result['success']:
+                    record_sample(host, f'health_{protocol}', response_time)
 
                 results[host] = {
                     'success': connection_result['success'],
@@ -507,6 +792,8 @@ def check_external_connectivity() -> Dict[str, Any]:
                 start_time = time.time()
                 dns_result = check_dns(host)
                 response_time = round((time.time() - start_time) * 1000, 2)  # ms
+                if dns_result['success']:
+                    record_sample(host, 'health_dns', response_time)
 
                 results[host] = {
                     'success': dns_result['success'],
@@ -547,17 +834,18 @@ def get_service_uptime() -> Dict[str, Any]:
     }
 
 # Rota básica de status (compatibilidade com versões anteriores)
-@app.route('/api/status', methods=['GET'])
+@api_bp.route('/api/status', methods=['GET'])
 @require_api_key
 def status():
     return jsonify({
         'status': 'online',
         'service': 'EmailMax Validation Service',
-        'version': SERVICE_VERSION
+        'version': SERVICE_VERSION,
+        'admission': get_admission_stats()
     })
 
 # Nova rota avançada de health check
-@app.route('/api/health', methods=['GET'])
+@api_bp.route('/api/health', methods=['GET'])
 def health_check():
     """
     Endpoint de verificação de saúde completo para monitoramento
@@ -573,6 +861,7 @@ def health_check():
         })
 
     # Coleta informações detalhadas de saúde
+    import platform
     try:
         # Informações do sistema
         system_info = {
@@ -607,6 +896,16 @@ def health_check():
             'resources': resources,
             'uptime': uptime,
             'connectivity': connectivity,
+            'prewarm': get_prewarm_stats(),
+            'latency': get_latency_stats(),
+            'dns': dns_resolver_pool.get_resolver_stats(),
+            'cache': get_cache().snapshot(),
+            'admission': get_admission_stats(),
+            'rate_limit': get_rate_limit_stats(),
+            'auth_suppression': get_auth_suppression_stats(),
+            'cancellation': get_probe_cancellation_stats(),
+            'watchdog': get_watchdog_stats(),
+            'imap_diagnostic_cache': get_diagnostic_cache_stats(),
             'response_time_ms': response_time
         })
     except Exception as e:
@@ -618,8 +917,11 @@ def health_check():
         }), 500
 
 # Rota principal para testar conexões de email
-@app.route('/api/test-connection', methods=['POST'])
+@api_bp.route('/api/test-connection', methods=['POST'])
 @require_api_key
+@rate_limited(per_account=True)
+@admission_controlled()
+@cancellable_probe
 def test_connection():
     try:
         data = request.json
@@ -633,6 +935,16 @@ def test_connection():
             
         email = data['email']
         password = data['password']
+
+        # Email impossível não chega nem à resolução do domínio
+        precheck = credential_precheck.check_email(email)
+        if precheck is not None:
+            return jsonify({
+                'success': False,
+                'message': precheck['message'],
+                'stage': 'precheck',
+                'details': {'precheck': precheck}
+            })
         
         # Verificar se os detalhes de servidor foram fornecidos ou se devemos detectar
         detect_settings = data.get('autodetect', True)
@@ -640,7 +952,8 @@ def test_connection():
         # Se não foram fornecidos todos os detalhes de servidor, tentar detectar
         if (not all(k in data for k in ['imapHost', 'imapPort', 'smtpHost', 'smtpPort']) 
                 or detect_settings):
-            provider_settings = detect_provider_config(email)
+            resolution = resolve_domain(email.split('@')[-1])
+            provider_settings = detect_provider_config(email, resolution)
             
             # Usar configurações detectadas ou fornecidas
             imap_host = data.get('imapHost', provider_settings['imap']['host'])
@@ -652,6 +965,8 @@ def test_connection():
             smtp_secure = data.get('smtpSecure', provider_settings['smtp'].get('secure', False))
             smtp_starttls = data.get('smtpStartTLS', provider_settings['smtp'].get('starttls', True))
         else:
+            resolution = None
+
             # Usar configurações fornecidas pelo cliente
             imap_host = data['imapHost']
             imap_port = int(data['imapPort'])
@@ -666,7 +981,8 @@ def test_connection():
         test_imap = data.get('testImap', True)
         test_smtp = data.get('testSmtp', True)
         
-        timeout = int(data.get('timeout', DEFAULT_TIMEOUT))
+        # Sem timeout explícito, cada etapa usa o timeout aprendido do histórico
+        timeout = int(data['timeout']) if data.get('timeout') else None
         
         # Inicializar resultados com versão melhorada para diagnósticos
         results = {
@@ -699,7 +1015,7 @@ def test_connection():
         if test_imap:
             imap_result = test_imap_connection(
                 email, password, imap_host, imap_port,
-                secure=imap_secure, timeout=timeout
+                secure=imap_secure, timeout=timeout, resolution=resolution
             )
             results['details']['imap'] = imap_result
 
@@ -747,9 +1063,16 @@ def test_connection():
             
         # Indicar que este é um teste real, não uma simulação
         results['details']['connectionType'] = 'real'
-            
-        return jsonify(results)
+
+        response = jsonify(results)
+        # Falha temporária no SMTP: o cliente deve esperar antes de repetir o teste
+        retry_after = (results['details']['smtp'] or {}).get('retryAfter')
+        if retry_after:
+            response.headers['Retry-After'] = str(retry_after)
+        return response
         
+    except ProbeCancelled:
+        raise
     except Exception as e:
         logger.error(f"Erro ao processar requisição: {str(e)}", exc_info=True)
         return jsonify({
@@ -759,8 +1082,10 @@ def test_connection():
         }), 500
 
 # Endpoint para verificação rápida de existência de servidor (apenas DNS)
-@app.route('/api/check-server', methods=['POST'])
+@api_bp.route('/api/check-server', methods=['POST'])
 @require_api_key
+@rate_limited()
+@admission_controlled()
 def check_server():
     try:
         data = request.json
@@ -784,7 +1109,7 @@ def check_server():
         
         # Se foi fornecida uma porta, verificar também a conexão de rede
         if port > 0 and dns_result['success']:
-            net_result = test_network_connection(host, port)
+            net_result = test_network_connection(host, port, addresses=dns_result['addresses'])
             result['network'] = net_result
             
             # Atualizar resultado com base no teste de rede
@@ -802,8 +1127,10 @@ def check_server():
         }), 500
 
 # Endpoint para verificar domínio de email
-@app.route('/api/verify-email-domain', methods=['POST'])
+@api_bp.route('/api/verify-email-domain', methods=['POST'])
 @require_api_key
+@rate_limited()
+@admission_controlled()
 def verify_email_domain():
     try:
         start_time = time.time()
@@ -828,59 +1155,30 @@ def verify_email_domain():
             
         logger.info(f"Verificando domínio de email: {domain}")
         
-        # Verificar registros MX
-        mx_records = []
-        has_mx = False
-        try:
-            mx_result = dns.resolver.resolve(domain, 'MX')
-            has_mx = len(mx_result) > 0
-            mx_records = [{
-                'preference': rec.preference,
-                'exchange': str(rec.exchange)
-            } for rec in mx_result]
-            logger.info(f"Encontrados {len(mx_records)} registros MX para {domain}")
-        except Exception as e:
-            logger.warning(f"Erro ao resolver registros MX para {domain}: {e}")
-            
-        # Detectar configurações
-        provider_settings = detect_provider_config(email)
-        provider_name = "Desconhecido"
-        
-        # Identificar o provedor
-        if 'gmail' in domain:
-            provider_name = "Gmail"
-        elif 'outlook' in domain or 'hotmail' in domain or 'live' in domain:
-            provider_name = "Outlook/Microsoft"
-        elif 'yahoo' in domain:
-            provider_name = "Yahoo"
-        elif mx_records:
-            # Tentar identificar com base no MX
-            mx_domain = str(mx_records[0]['exchange']).lower()
-            if 'google' in mx_domain or 'gmail' in mx_domain:
-                provider_name = "Gmail (G Suite)"
-            elif 'outlook' in mx_domain or 'microsoft' in mx_domain:
-                provider_name = "Microsoft 365"
-            elif 'yahoo' in mx_domain:
-                provider_name = "Yahoo"
-            elif 'zoho' in mx_domain:
-                provider_name = "Zoho"
-            elif 'protonmail' in mx_domain:
-                provider_name = "ProtonMail"
-            
+        # Contexto de resolução compartilhado: MX e veredito calculados uma única vez
+        resolution = resolve_domain(domain)
+        provider_settings = detect_provider_config(email, resolution)
+        provider_name = resolution.provider_name
+
         # Preparar resposta
         result = {
             'success': True,
             'domain': domain,
-            'hasMxRecords': has_mx,
-            'mxRecords': mx_records,
+            'hasMxRecords': resolution.has_mx,
+            'mxRecords': resolution.mx_records,
             'detectedSettings': {
                 'provider': provider_name,
                 'imap': provider_settings['imap'],
                 'smtp': provider_settings['smtp']
             },
+            'resolutionTimings': resolution.timings,
             'elapsedTime': round(time.time() - start_time, 2)
         }
         
+        # Pré-aquecer conexões para o /api/test-connection que costuma vir em seguida
+        if data.get('prewarm', PREWARM_ON_VERIFY):
+            result['prewarmScheduled'] = prewarm_provider_settings(provider_settings, check_dns)
+
         # Adicionar instruções específicas para o provedor, se disponíveis
         if provider_name == "Gmail":
             result['detectedSettings']['needsAppPassword'] = True
@@ -896,9 +1194,103 @@ def verify_email_domain():
             'message': f'Erro interno do servidor: {str(e)}'
         }), 500
 
+# Função auxiliar da verificação em lote: resolve e classifica um domínio
+def _verify_domain_for_bulk(domain: str, discover: bool) -> Dict[str, Any]:
+    """
+    Resolve e classifica um domínio uma única vez para todos os endereços dele
+    """
+    resolution = resolve_domain(domain)
+    provider_settings = detect_provider_config(f'@{domain}', resolution, discover=discover)
+    return {
+        'hasMxRecords': resolution.has_mx,
+        'provider': resolution.provider_name,
+        'detectedSettings': {
+            'imap': provider_settings['imap'],
+            'smtp': provider_settings['smtp']
+        }
+    }
+
+# Endpoint para verificar domínios de email em lote
+@api_bp.route('/api/verify-email-domain/bulk', methods=['POST'])
+@require_api_key
+@rate_limited()
+@admission_controlled(PRIORITY_BULK)
+def verify_email_domain_bulk():
+    """
+    Verifica uma lista grande de emails agrupando por domínio.
+
+    Cada domínio distinto é resolvido e classificado uma única vez, com no
+    máximo BULK_MAX_IN_FLIGHT domínios em paralelo. A resposta é transmitida
+    em NDJSON: uma linha por endereço, na ordem em que os domínios terminam,
+    seguida de uma linha final de resumo.
+    """
+    data = request.json
+
+    if not data or not isinstance(data.get('emails'), list):
+        return jsonify({
+            'success': False,
+            'message': 'Parâmetro emails (lista) é obrigatório'
+        }), 400
+
+    emails = data['emails']
+    if len(emails) > BULK_MAX_EMAILS:
+        return jsonify({
+            'success': False,
+            'message': f'Máximo de {BULK_MAX_EMAILS} emails por requisição'
+        }), 413
+
+    discover = bool(data.get('discover', False))
+
+    # Agrupar endereços por domínio
+    by_domain: Dict[str, List[str]] = {}
+    invalid = []
+    for email in emails:
+        if not isinstance(email, str) or email.count('@') != 1 or not email.split('@')[1]:
+            invalid.append(email)
+            continue
+        by_domain.setdefault(email.split('@')[1].strip().lower(), []).append(email)
+
+    logger.info(f"Verificação em lote: {len(emails)} emails, {len(by_domain)} domínios distintos")
+
+    def generate():
+        start_time = time.time()
+        for email in invalid:
+            yield json.dumps({'email': email, 'success': False,
+                              'message': 'Formato de email inválido'}) + '\n'
+
+        executor = ThreadPoolExecutor(max_workers=BULK_MAX_IN_FLIGHT, thread_name_prefix='bulk-verify')
+        try:
+            futures = {executor.submit(_verify_domain_for_bulk, domain, discover): domain
+                       for domain in by_domain}
+            for future in as_completed(futures):
+                domain = futures[future]
+                try:
+                    verdict = dict(future.result(), success=True)
+                except Exception as e:
+                    logger.warning(f"Erro na verificação em lote do domínio {domain}: {e}")
+                    verdict = {'success': False, 'message': f'Erro ao verificar domínio: {str(e)}'}
+                for email in by_domain[domain]:
+                    yield json.dumps(dict(verdict, email=email, domain=domain)) + '\n'
+        finally:
+            # Cliente desconectado ou fim do lote: descartar o que não começou
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        yield json.dumps({
+            'summary': {
+                'emails': len(emails),
+                'domains': len(by_domain),
+                'invalid': len(invalid),
+                'elapsedTime': round(time.time() - start_time, 2)
+            }
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 # Endpoint para verificar a conectividade com servidores de email comuns
-@app.route('/api/check-email-providers', methods=['GET'])
+@api_bp.route('/api/check-email-providers', methods=['GET'])
 @require_api_key
+@rate_limited()
+@admission_controlled(PRIORITY_BACKGROUND)
 def check_email_providers():
     """
     Verifica conectividade com servidores de email comuns
@@ -925,8 +1317,11 @@ def check_email_providers():
             start_time = time.time()
             dns_result = check_dns(provider['imap'])
             if dns_result['success']:
-                imap_result = test_network_connection(provider['imap'], provider['imap_port'], timeout=5)
+                imap_result = test_network_connection(provider['imap'], provider['imap_port'], timeout=5,
+                                                     addresses=dns_result['addresses'])
                 response_time = round((time.time() - start_time) * 1000, 2)  # ms
+                if imap_result['success']:
+                    record_sample(provider['imap'], 'reachability', response_time)
 
                 provider_results['imap'] = {
                     'success': imap_result['success'],
@@ -954,8 +1349,11 @@ def check_email_providers():
             start_time = time.time()
             dns_result = check_dns(provider['smtp'])
             if dns_result['success']:
-                smtp_result = test_network_connection(provider['smtp'], provider['smtp_port'], timeout=5)
+                smtp_result = test_network_connection(provider['smtp'], provider['smtp_port'], timeout=5,
+                                                     addresses=dns_result['addresses'])
                 response_time = round((time.time() - start_time) * 1000, 2)  # ms
+                if smtp_result['success']:
+                    record_sample(provider['smtp'], 'reachability', response_time)
 
                 provider_results['smtp'] = {
                     'success': smtp_result['success'],
@@ -987,8 +1385,52 @@ def check_email_providers():
         'timestamp': datetime.datetime.now().isoformat()
     })
 
+# Endpoint para consultar percentis de latência por provedor, host e etapa
+@api_bp.route('/api/stats/latency', methods=['GET'])
+@require_api_key
+def latency_percentiles():
+    """
+    Retorna p50/p95/p99 das latências registradas, somando todos os workers
+
+    Parâmetros de query opcionais: windows (segundos, separados por vírgula),
+    provider, host e stage
+    """
+    try:
+        windows_param = request.args.get('windows')
+        windows = [int(w) for w in windows_param.split(',') if w.strip()] if windows_param \
+            else list(DEFAULT_WINDOWS)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Parâmetro windows deve ser uma lista de segundos separada por vírgulas'
+        }), 400
+
+    result = sketch_store.query(
+        windows=windows,
+        provider=request.args.get('provider'),
+        host=request.args.get('host'),
+        stage=request.args.get('stage')
+    )
+    return jsonify(dict(result, success=True, windows=windows,
+                        timestamp=datetime.datetime.now().isoformat()))
+
+# Endpoint para ver o que cada worker está esperando (sondagens ativas e travadas)
+@api_bp.route('/api/debug/probes', methods=['GET'])
+@require_api_key
+def debug_probes():
+    """
+    Retorna as sondagens ativas de todos os workers, com etapa, idade, prazo e
+    o ponto da pilha em que cada uma está esperando, e as derrubadas recentes
+
+    Parâmetro de query opcional: threads=true inclui a pilha de todas as
+    threads do worker que atendeu a requisição
+    """
+    include_threads = request.args.get('threads', 'false').lower() == 'true'
+    return jsonify(dict(get_probe_dump(include_threads), success=True,
+                        timestamp=datetime.datetime.now().isoformat()))
+
 # Página inicial simples com informações de saúde
-@app.route('/', methods=['GET'])
+@api_bp.route('/', methods=['GET'])
 def home():
     return """
     <html>
@@ -1022,6 +1464,12 @@ def home():
                 <p>Verifica o domínio de um email e detecta configurações.</p>
             </div>
 
+            <div class="endpoint">
+                <h3>Verificação de Domínios em Lote</h3>
+                <p><code>POST /api/verify-email-domain/bulk</code></p>
+                <p>Verifica uma lista de emails agrupando por domínio; resposta em NDJSON.</p>
+            </div>
+
             <div class="endpoint">
                 <h3>Verificação de Servidor</h3>
                 <p><code>POST /api/check-server</code></p>
@@ -1046,6 +1494,18 @@ def home():
                 <p>Testa a conectividade com servidores de email comuns.</p>
             </div>
 
+            <div class="endpoint">
+                <h3>Estatísticas de Latência</h3>
+                <p><code>GET /api/stats/latency?windows=60,300,3600</code></p>
+                <p>Percentis p50/p95/p99 por provedor, host e etapa em janelas deslizantes.</p>
+            </div>
+
+            <div class="endpoint">
+                <h3>Sondagens em Andamento</h3>
+                <p><code>GET /api/debug/probes?threads=true</code></p>
+                <p>O que cada worker está esperando: etapa, idade e prazo de cada sondagem e as derrubadas pelo vigia.</p>
+            </div>
+
             <div class="endpoint">
                 <h3>Diagnóstico IMAP Avançado</h3>
                 <p><code>POST /api/imap-diagnostic</code></p>
@@ -1068,13 +1528,50 @@ def home():
     </html>
     """
 
+# Fábrica da aplicação
+def create_app() -> Flask:
+    """
+    Monta a aplicação Flask com todas as rotas (API e diagnóstico IMAP)
+    """
+    from imap_diagnostic_endpoint import register_diagnostic_endpoints
+
+    application = Flask(__name__)
+    CORS(application)
+    application.register_blueprint(api_bp)
+    register_diagnostic_endpoints(application)
+    return application
+
+def preload_shared_state() -> None:
+    """
+    Carrega no processo mestre do gunicorn (preload_app) o estado somente
+    leitura e os módulos pesados, que os workers herdam por copy-on-write
+    """
+    import imaplib  # noqa: F401
+    import smtplib  # noqa: F401
+    import dns.asyncresolver  # noqa: F401
+    import dns.resolver  # noqa: F401
+    import psutil  # noqa: F401
+    import probe_clients  # noqa: F401
+
+    registry = get_registry()
+    logger.info(f"Estado compartilhado pré-carregado ({len(registry)} provedores)")
+
+def reset_worker_state() -> None:
+    """
+    Recria, após o fork, os recursos que não podem ser herdados do mestre
+    (pools de threads e conexões); os demais já se recriam por PID
+    """
+    import connection_prewarm
+    import hedged_connect
+    connection_prewarm.reset_after_fork()
+    hedged_connect.reset_after_fork()
+
+# Instância usada pelo gunicorn (app:app) e pelo servidor de desenvolvimento
+app = create_app()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
-    
-    # Registrar os endpoints de diagnóstico IMAP
-    from imap_diagnostic_endpoint import register_diagnostic_endpoints
-    register_diagnostic_endpoints(app)
 
     logger.info(f"Iniciando servidor na porta {port}, debug={debug}")
-    app.run(host='0.0.0.0', port=port, debug=debug) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=debug)
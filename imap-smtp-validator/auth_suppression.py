@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro de falhas de autenticação para evitar bloqueios nos provedores
+
+Quando um login falha por credenciais (credentials, authentication ou
+app_password, ou quando o diagnóstico SMTP pede supressão), a conta entra em
+uma janela de supressão que dobra a cada nova falha com as mesmas
+credenciais (AUTH_SUPPRESSION_BASE até AUTH_SUPPRESSION_MAX). Durante a
+janela, novas tentativas com a mesma senha recebem o diagnóstico guardado na
+hora, sem contatar o provedor; uma senha diferente apaga o registro
+imediatamente, e um login bem-sucedido também.
+
+A senha nunca é guardada: o registro tem apenas um HMAC-SHA256 de conta +
+senha com um segredo do host (AUTH_SUPPRESSION_SECRET ou um arquivo gerado na
+primeira execução). O armazenamento é o SQLite compartilhado entre workers.
+"""
+
+import os
+import hmac
+import time
+import hashlib
+import logging
+import secrets
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+
+from cache_backend import MISS, MemoryLRUCache, SQLiteCache
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.auth-suppression')
+
+# Configurações
+AUTH_SUPPRESSION_ENABLED = os.environ.get('AUTH_SUPPRESSION_ENABLED', 'true').lower() == 'true'
+AUTH_SUPPRESSION_BACKEND = os.environ.get('AUTH_SUPPRESSION_BACKEND', 'sqlite').lower()  # ou 'memory'
+AUTH_SUPPRESSION_PATH = os.environ.get(
+    'AUTH_SUPPRESSION_PATH', os.path.join(tempfile.gettempdir(), 'emailmax-auth-ledger.sqlite3'))
+AUTH_SUPPRESSION_SECRET_FILE = os.environ.get(
+    'AUTH_SUPPRESSION_SECRET_FILE', os.path.join(tempfile.gettempdir(), 'emailmax-auth-ledger.key'))
+AUTH_SUPPRESSION_BASE = int(os.environ.get('AUTH_SUPPRESSION_BASE', '60'))  # segundos
+AUTH_SUPPRESSION_MAX = int(os.environ.get('AUTH_SUPPRESSION_MAX', '21600'))  # segundos (6h)
+# Por quanto tempo, após a janela, a contagem de falhas é lembrada
+AUTH_SUPPRESSION_MEMORY = int(os.environ.get('AUTH_SUPPRESSION_MEMORY', '86400'))  # segundos
+
+# Tipos de erro (sanitizar_erro_imap) que indicam credenciais rejeitadas; no
+# SMTP, a decisão vem do diagnóstico (result['decision']['suppress'])
+CREDENTIAL_ERROR_TYPES = ('credentials', 'authentication', 'app_password')
+
+NAMESPACE = 'auth-ledger'
+
+
+def _load_secret() -> bytes:
+    """
+    Segredo do HMAC: variável de ambiente ou arquivo criado atomicamente pelo
+    primeiro worker (os demais leem o mesmo arquivo)
+    """
+    secret = os.environ.get('AUTH_SUPPRESSION_SECRET')
+    if secret:
+        return secret.encode('utf-8')
+    try:
+        fd = os.open(AUTH_SUPPRESSION_SECRET_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    except FileExistsError:
+        pass
+    # Um worker pode ler o arquivo enquanto outro ainda o escreve
+    for _ in range(50):
+        with open(AUTH_SUPPRESSION_SECRET_FILE, 'r') as f:
+            secret = f.read().strip()
+        if secret:
+            return secret.encode('utf-8')
+        time.sleep(0.01)
+    raise RuntimeError('Segredo do registro de falhas de autenticação vazio')
+
+
+class AuthSuppressionLedger:
+    """
+    Falhas de autenticação por (conta, servidor), com a impressão das credenciais
+    """
+
+    def __init__(self, store=None):
+        if store is None:
+            store = MemoryLRUCache() if AUTH_SUPPRESSION_BACKEND == 'memory' \
+                else SQLiteCache(AUTH_SUPPRESSION_PATH)
+        self.store = store
+        self._secret: Optional[bytes] = None
+        self._lock = threading.Lock()
+        self.stats = {'recorded': 0, 'suppressed': 0, 'cleared_password_changed': 0,
+                      'cleared_success': 0}
+
+    def _incr(self, counter: str) -> None:
+        with self._lock:
+            self.stats[counter] += 1
+
+    def _fingerprint(self, account: str, password: str) -> str:
+        if self._secret is None:
+            self._secret = _load_secret()
+        message = f'{account}\0{password}'.encode('utf-8')
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def _key(account: str, host: str) -> str:
+        return hashlib.sha256(f'{account}|{host.lower()}'.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def window(failures: int) -> int:
+        """
+        Duração (segundos) da janela de supressão após a N-ésima falha seguida
+        """
+        return min(AUTH_SUPPRESSION_MAX, AUTH_SUPPRESSION_BASE * 2 ** max(0, failures - 1))
+
+    def check(self, account: str, host: str, password: str) -> Optional[Dict[str, Any]]:
+        """
+        Diagnóstico guardado se a conta estiver em janela de supressão com estas credenciais
+        """
+        account = account.strip().lower()
+        key = self._key(account, host)
+        entry = self.store.get(NAMESPACE, key)
+        if entry is MISS:
+            return None
+        if not hmac.compare_digest(entry['fingerprint'], self._fingerprint(account, password)):
+            # Senha trocada: a próxima tentativa vai ao provedor
+            self.store.delete(NAMESPACE, key)
+            self._incr('cleared_password_changed')
+            return None
+        remaining = entry['suppressed_until'] - time.time()
+        if remaining <= 0:
+            return None
+        self._incr('suppressed')
+        return dict(entry['result'], suppressed=True, suppression={
+            'failures': entry['failures'],
+            'suppressedUntil': round(entry['suppressed_until']),
+            'retryAfter': int(remaining) + 1
+        })
+
+    def record_failure(self, account: str, host: str, password: str, result: Dict[str, Any]) -> None:
+        """
+        Registra uma falha de credenciais e abre (ou dobra) a janela de supressão
+        """
+        account = account.strip().lower()
+        key = self._key(account, host)
+        fingerprint = self._fingerprint(account, password)
+        entry = self.store.get(NAMESPACE, key)
+        failures = 1
+        if entry is not MISS and hmac.compare_digest(entry['fingerprint'], fingerprint):
+            failures = entry['failures'] + 1
+        window = self.window(failures)
+        self.store.set(NAMESPACE, key, {
+            'fingerprint': fingerprint,
+            'failures': failures,
+            'suppressed_until': time.time() + window,
+            'result': result
+        }, window + AUTH_SUPPRESSION_MEMORY)
+        self._incr('recorded')
+        logger.info(f"Falha de credenciais registrada para conta em {host}: "
+                    f"{failures} falha(s), supressão por {window}s")
+
+    def record_success(self, account: str, host: str) -> None:
+        """
+        Login aceito: esquece as falhas anteriores da conta
+        """
+        key = self._key(account.strip().lower(), host)
+        if self.store.get(NAMESPACE, key) is not MISS:
+            self.store.delete(NAMESPACE, key)
+            self._incr('cleared_success')
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, enabled=AUTH_SUPPRESSION_ENABLED, backend=AUTH_SUPPRESSION_BACKEND,
+                        base_window_s=AUTH_SUPPRESSION_BASE, max_window_s=AUTH_SUPPRESSION_MAX)
+
+
+auth_ledger = AuthSuppressionLedger()
+
+
+def check_suppressed(account: str, host: str, password: str) -> Optional[Dict[str, Any]]:
+    """
+    Resultado guardado a devolver no lugar do login, ou None para tentar o login
+    """
+    if not AUTH_SUPPRESSION_ENABLED or not account or password is None:
+        return None
+    try:
+        return auth_ledger.check(account, host, password)
+    except Exception as e:
+        logger.warning(f"Falha ao consultar o registro de falhas de autenticação: {e}")
+        return None
+
+
+def record_auth_result(account: str, host: str, password: str, result: Dict[str, Any]) -> None:
+    """
+    Atualiza o registro com o resultado de um login (sucesso, falha de credenciais ou outro erro)
+    """
+    if not AUTH_SUPPRESSION_ENABLED or not account or password is None:
+        return
+    try:
+        if result.get('success'):
+            auth_ledger.record_success(account, host)
+        elif result.get('error_type') in CREDENTIAL_ERROR_TYPES or \
+                (result.get('decision') or {}).get('suppress'):
+            auth_ledger.record_failure(account, host, password, result)
+    except Exception as e:
+        logger.warning(f"Falha ao atualizar o registro de falhas de autenticação: {e}")
+
+
+def get_auth_suppression_stats() -> Dict[str, Any]:
+    """
+    Estatísticas do registro de falhas de autenticação deste worker
+    """
+    return auth_ledger.snapshot()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark da classificação de erros IMAP (imap_error_diagnostic)
+
+Compara, para um conjunto de erros reais de provedores, a implementação
+anterior (re.search sem compilar sobre ERROR_PATTERNS e busca por substring
+em cada catálogo, reproduzida aqui como referência) com a tabela compilada,
+sem cache (frio) e com cache (quente). Antes de medir, confere que as duas
+dão o mesmo tipo de erro e a mesma entrada de catálogo para cada erro e
+provedor; se alguma divergir, sai com código 1.
+
+O cenário 'surto' simula uma queda de provedor: milhares de erros que só
+diferem em números (IPs, portas, tags), passando por sanitizar_erro_imap.
+
+Uso:
+    python benchmarks/diagnostic_benchmark.py
+    python benchmarks/diagnostic_benchmark.py --iterations 1000
+"""
+
+import os
+import re
+import sys
+import ssl
+import json
+import time
+import socket
+import imaplib
+import argparse
+from typing import Callable, Dict, Any, List
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import imap_error_diagnostic as diag  # noqa: E402
+
+PROVEDORES = ('gmail', 'outlook', 'yahoo', 'generic')
+
+# Erros como chegam das sondagens (mensagens de imaplib, ssl e socket)
+ERROS = [
+    imaplib.IMAP4.error("b'[AUTHENTICATIONFAILED] Invalid credentials (Failure)'"),
+    imaplib.IMAP4.error("b'[ALERT] Application-specific password required: "
+                        "https://support.google.com/accounts/answer/185833 (Failure)'"),
+    imaplib.IMAP4.error("b'[ALERT] Please log in via your web browser: "
+                        "https://support.google.com/mail/accounts/answer/78754 (Failure)'"),
+    imaplib.IMAP4.error("b'[ALERT] Too many simultaneous connections. (Failure)'"),
+    imaplib.IMAP4.error("b'AUTHENTICATE failed.'"),
+    imaplib.IMAP4.error("b'LOGIN failed.'"),
+    imaplib.IMAP4.error("b'[UNAVAILABLE] User is authenticated but not connected.'"),
+    imaplib.IMAP4.error("b'Server Unavailable. 15'"),
+    imaplib.IMAP4.error("b'[SYS/TEMP_FAIL] Server error - Please try again later'"),
+    imaplib.IMAP4.error("b'[LIMIT/MAX_CONN] Too many connections'"),
+    imaplib.IMAP4.abort("socket error: EOF"),
+    imaplib.IMAP4.error("command SEARCH illegal in state AUTH, only allowed in states SELECTED"),
+    ssl.SSLError(1, '[SSL: CERTIFICATE_VERIFY_FAILED] certificate verify failed: '
+                    'unable to get local issuer certificate (_ssl.c:1006)'),
+    ssl.SSLError(1, '[SSL: WRONG_VERSION_NUMBER] wrong version number (_ssl.c:1006)'),
+    socket.timeout('timed out'),
+    TimeoutError(110, 'Connection timed out'),
+    ConnectionRefusedError(111, 'Connection refused'),
+    ConnectionResetError(104, 'Connection reset by peer'),
+    OSError(101, 'Network is unreachable'),
+    socket.gaierror(-2, 'Name or service not known'),
+    imaplib.IMAP4.error("b'[AUTHORIZATIONFAILED] Access denied for 203.0.113.7'"),
+    imaplib.IMAP4.error("b'Your account is temporarily blocked, throttling in effect'"),
+    Exception('unexpected response: * BYE Connection closed'),
+]
+
+
+# Função para classificar como a implementação anterior (referência)
+def referencia_tipo(erro) -> str:
+    erro_str = str(erro).lower()
+    for pattern, error_type in diag.ERROR_PATTERNS:
+        if re.search(pattern, erro_str, re.IGNORECASE):
+            return error_type
+    if isinstance(erro, imaplib.IMAP4.error):
+        return "imap_protocol"
+    elif isinstance(erro, ssl.SSLError):
+        return "ssl_error"
+    elif isinstance(erro, socket.timeout):
+        return "timeout"
+    elif isinstance(erro, socket.error):
+        return "socket_error"
+    elif isinstance(erro, ConnectionRefusedError):
+        return "connection_refused"
+    return "unknown"
+
+
+# Função para buscar no catálogo como a implementação anterior (referência)
+def referencia_catalogo(erro, provedor: str) -> Dict[str, Any]:
+    erro_str = str(erro)
+    catalogo = diag.obter_catalogo_provedor(provedor)
+    for pattern, info in catalogo.items():
+        if pattern.lower() in erro_str.lower():
+            return info
+    if provedor != "generic":
+        for pattern, info in diag.GENERIC_ERRORS.items():
+            if pattern.lower() in erro_str.lower():
+                return info
+    return diag.DIAGNOSTICO_NAO_CLASSIFICADO
+
+
+def verificar_equivalencia() -> List[Dict[str, Any]]:
+    """
+    Lista os erros em que a implementação compilada difere da referência
+    """
+    divergencias = []
+    for erro in ERROS:
+        mensagem = diag._normalizar_mensagem(str(erro))
+        for provedor in PROVEDORES:
+            tipo = diag._tipo_erro.__wrapped__(erro.__class__, mensagem)
+            info = diag._entrada_catalogo.__wrapped__(mensagem, provedor)
+            esperado_tipo, esperado_info = referencia_tipo(erro), referencia_catalogo(erro, provedor)
+            if tipo != esperado_tipo or info is not esperado_info:
+                divergencias.append({
+                    'erro': str(erro), 'provedor': provedor,
+                    'esperado': [esperado_tipo, esperado_info['causa']],
+                    'obtido': [tipo, info['causa']]
+                })
+    return divergencias
+
+
+def medir(funcao: Callable[[], Any], iterations: int) -> float:
+    """
+    Microssegundos por chamada de funcao (a melhor de 3 rodadas)
+    """
+    melhor = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            funcao()
+        elapsed = time.perf_counter() - start
+        melhor = elapsed if melhor is None else min(melhor, elapsed)
+    return round(melhor / iterations * 1e6, 3)
+
+
+def _ciclo(chamada: Callable[[Any, str], Any]) -> Callable[[], None]:
+    """
+    Função que aplica chamada a todos os erros e provedores
+    """
+    pares = [(erro, provedor) for erro in ERROS for provedor in PROVEDORES]
+
+    def executar():
+        for erro, provedor in pares:
+            chamada(erro, provedor)
+    return executar
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Micro-benchmark da classificação de erros IMAP')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='repetições do ciclo sobre todos os erros e provedores')
+    args = parser.parse_args()
+
+    divergencias = verificar_equivalencia()
+    if divergencias:
+        print(json.dumps({'equivalente': False, 'divergencias': divergencias}, indent=2, ensure_ascii=False))
+        return 1
+
+    chamadas = len(ERROS) * len(PROVEDORES)
+
+    def compilado_frio(erro, provedor):
+        mensagem = diag._normalizar_mensagem(str(erro))
+        diag._tipo_erro.__wrapped__(erro.__class__, mensagem)
+        diag._entrada_catalogo.__wrapped__(mensagem, provedor)
+
+    def compilado_quente(erro, provedor):
+        mensagem = diag._normalizar_mensagem(str(erro))
+        diag._tipo_erro(erro.__class__, mensagem)
+        diag._entrada_catalogo(mensagem, provedor)
+
+    def referencia(erro, provedor):
+        referencia_tipo(erro)
+        referencia_catalogo(erro, provedor)
+
+    resultados = {}
+    for nome, chamada in (('referencia', referencia), ('compilado_frio', compilado_frio),
+                          ('compilado_quente', compilado_quente)):
+        resultados[nome] = round(medir(_ciclo(chamada), args.iterations) / chamadas, 3)
+
+    # Surto: o mesmo erro com IPs/portas variando, pela função pública completa
+    surto = [imaplib.IMAP4.error(f"b'[UNAVAILABLE] Temporary failure from 10.{n % 250}.{n % 7}.{n % 13}:{1000 + n}'")
+             for n in range(5000)]
+    posicao = [0]
+
+    def sanitizar_surto():
+        erro = surto[posicao[0] % len(surto)]
+        posicao[0] += 1
+        diag.sanitizar_erro_imap(erro, 'outlook.office365.com', 'user@outlook.com')
+
+    resultados['sanitizar_surto'] = medir(sanitizar_surto, len(surto))
+
+    print(json.dumps({
+        'equivalente': True,
+        'erros': len(ERROS),
+        'provedores': len(PROVEDORES),
+        'us_por_classificacao': resultados,
+        'aceleracao_frio': round(resultados['referencia'] / resultados['compilado_frio'], 2),
+        'aceleracao_quente': round(resultados['referencia'] / resultados['compilado_quente'], 2),
+        'cache': diag.get_diagnostic_cache_stats()
+    }, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de vazão do pool de resolução DNS
+
+Sobe o servidor DNS de teste (harness/stub_dns.py) com uma zona sintética e
+compara a resolução MX+A+AAAA de N domínios feita pelo dns.resolver bloqueante
+(uma consulta por vez) com a feita pelo AsyncResolverPool (consultas em
+paralelo, limitadas por --concurrency).
+
+Uso:
+    python benchmarks/dns_resolver_benchmark.py --domains 500 --latency 0.005
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import dns.resolver
+from typing import Dict, Any, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dns_resolver_pool import AsyncResolverPool  # noqa: E402
+from harness.stub_dns import StubDNSServer, synthetic_zone  # noqa: E402
+
+RDTYPES = ('MX', 'A', 'AAAA')
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+def _summary(label: str, elapsed: float, latencies: List[float], errors: int) -> Dict[str, Any]:
+    return {
+        'mode': label,
+        'domains': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'domains_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'errors': errors
+    }
+
+
+def run_blocking(names: List[str], host: str, port: int) -> Dict[str, Any]:
+    resolver = dns.resolver.Resolver(configure=False)
+    resolver.nameservers = [host]
+    resolver.port = port
+    latencies, errors = [], 0
+    start_time = time.perf_counter()
+    for name in names:
+        t0 = time.perf_counter()
+        for rdtype in RDTYPES:
+            try:
+                resolver.resolve(name, rdtype)
+            except Exception:
+                errors += 1
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return _summary('blocking', time.perf_counter() - start_time, latencies, errors)
+
+
+async def _run_pool(names: List[str], host: str, port: int, concurrency: int) -> Dict[str, Any]:
+    pool = AsyncResolverPool([(host, port)])
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(name: str):
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            results = await pool.resolve_many(name, RDTYPES)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            errors += sum(1 for value in results.values() if isinstance(value, Exception))
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(one(name) for name in names))
+    summary = _summary('async-pool', time.perf_counter() - start_time, latencies, errors)
+    summary['nameservers'] = pool.stats()
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark do pool de resolução DNS')
+    parser.add_argument('--domains', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='latência artificial do servidor DNS de teste (segundos)')
+    parser.add_argument('--skip-blocking', action='store_true')
+    args = parser.parse_args()
+
+    zone = synthetic_zone(args.domains)
+    names = [f'd{i}.bench.test' for i in range(args.domains)]
+
+    with StubDNSServer(zone, latency=args.latency) as server:
+        results = []
+        if not args.skip_blocking:
+            results.append(run_blocking(names, server.host, server.port))
+        results.append(asyncio.run(_run_pool(names, server.host, server.port, args.concurrency)))
+        results.append({'stub_queries': server.queries})
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
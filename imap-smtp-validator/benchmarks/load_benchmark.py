@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de carga de /api/test-connection com limites de regressão
+
+Sobe o servidor DNS de teste e o servidor IMAP/SMTP de teste
+(harness/fake_mail_server.py) com uma conta por cliente simulado e dispara
+/api/test-connection (IMAP com TLS + SMTP com STARTTLS) em cada nível de
+concorrência pedido, por --duration segundos. Com --rate, a carga é de laço
+aberto (N requisições/s no total, latência medida a partir do horário
+agendado, sem omissão coordenada); sem --rate, cada cliente dispara a próxima
+assim que recebe a resposta.
+
+Modo 'inprocess' (padrão): a aplicação roda neste processo, pelo cliente de
+teste do Flask. Modo 'gunicorn': sobe o gunicorn com gunicorn.conf.py e mede
+por HTTP; CPU e RSS são medidos por worker.
+
+Cada nível registra vazão, p50/p95/p99, taxa de erro (respostas que não são
+200 com success=true), status HTTP, CPU e RSS máximo por processo. O
+resultado é gravado em JSON e comparado com o baseline (--baseline); uma
+regressão acima dos limites encerra com código 1. Sem baseline gravado a
+comparação não tem como acontecer: o benchmark recusa rodar (código 2) em vez
+de passar em silêncio, a menos que se peça --save-baseline ou --no-compare.
+
+Uso:
+    python benchmarks/load_benchmark.py --concurrency 1,8,32 --duration 10 --save-baseline
+    python benchmarks/load_benchmark.py --concurrency 1,8,32 --duration 10
+    python benchmarks/load_benchmark.py --mode gunicorn --workers 4 --concurrency 16 --rate 40 --no-compare
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import datetime
+import itertools
+import threading
+import subprocess
+import http.client
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import psutil
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+from harness.fake_mail_server import FakeMailServer  # noqa: E402
+from harness.stub_dns import StubDNSServer  # noqa: E402
+
+RESULTS_DIR = os.path.join(SERVICE_DIR, 'benchmarks', 'results')
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, 'load-baseline.json')
+
+IMAP_HOST = 'imap.bench.test'
+SMTP_HOST = 'smtp.bench.test'
+PASSWORD = 'bench-password'
+API_KEY = 'bench-api-key'
+
+# O limite de requisições mediria a si mesmo; o controle de admissão continua ativo
+BENCH_ENV = {
+    'API_KEY': API_KEY,
+    'RATE_LIMIT_ENABLED': 'false',
+    'LOG_LEVEL': 'WARNING',
+}
+
+DEFAULT_THRESHOLDS = {
+    'throughput_drop': 0.10,         # fração da vazão do baseline
+    'latency_increase': 0.20,        # fração de p50/p95/p99 do baseline
+    'latency_noise_ms': 2.0,         # diferenças absolutas menores são ignoradas
+    'error_rate_increase': 0.01,     # pontos absolutos de taxa de erro
+    'rss_increase': 0.25,            # fração do RSS máximo por worker
+}
+
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+class ProcessSampler:
+    """
+    CPU (diferença de cpu_times) e RSS máximo (amostrado) de um conjunto de processos
+    """
+
+    def __init__(self, pids: List[int], interval: float = 0.25):
+        self.processes = [psutil.Process(pid) for pid in pids]
+        self.interval = interval
+        self._cpu_start: Dict[int, float] = {}
+        self._rss_max: Dict[int, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+
+    @staticmethod
+    def _cpu(process: psutil.Process) -> float:
+        times = process.cpu_times()
+        return times.user + times.system
+
+    def _sample(self) -> None:
+        for process in self.processes:
+            try:
+                rss = process.memory_info().rss // 1024
+            except psutil.Error:
+                continue
+            self._rss_max[process.pid] = max(rss, self._rss_max.get(process.pid, 0))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self._started_at = time.perf_counter()
+        self._cpu_start = {p.pid: self._cpu(p) for p in self.processes}
+        self._sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='process-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> List[Dict[str, Any]]:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        elapsed = time.perf_counter() - self._started_at
+        workers = []
+        for process in self.processes:
+            try:
+                cpu_s = self._cpu(process) - self._cpu_start[process.pid]
+            except psutil.Error:
+                continue
+            workers.append({
+                'pid': process.pid,
+                'cpu_s': round(cpu_s, 3),
+                'cpu_percent': round(cpu_s / elapsed * 100, 1) if elapsed else 0.0,
+                'rss_max_kb': self._rss_max.get(process.pid, 0)
+            })
+        return workers
+
+
+def _request_bodies(mail: FakeMailServer, accounts: int) -> List[str]:
+    settings = mail.connection_settings(IMAP_HOST, SMTP_HOST)
+    bodies = []
+    for i in range(accounts):
+        email = f'bench{i}@bench.test'
+        mail.add_account(email, PASSWORD)
+        bodies.append(json.dumps(dict(settings, email=email, password=PASSWORD)))
+    return bodies
+
+
+def _inprocess_target(dns_server: StubDNSServer) -> Tuple[Callable[[], Callable[[str], Tuple[int, bool]]], List[int]]:
+    """
+    Aplicação carregada neste processo; cada thread cliente usa o próprio cliente de teste
+    """
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    import dns_resolver_pool
+    import app
+    dns_resolver_pool.configure_nameservers([(dns_server.host, dns_server.port)])
+
+    def make_client():
+        client = app.app.test_client()
+        headers = {'Authorization': f'Bearer {API_KEY}', 'Content-Type': 'application/json'}
+
+        def post(body: str) -> Tuple[int, bool]:
+            response = client.post('/api/test-connection', data=body, headers=headers)
+            payload = response.get_json(silent=True) or {}
+            return response.status_code, bool(payload.get('success'))
+        return post
+    return make_client, [os.getpid()]
+
+
+def _http_client_factory(port: int) -> Callable[[], Callable[[str], Tuple[int, bool]]]:
+    """
+    Uma conexão HTTP keep-alive por thread cliente
+    """
+    def make_client():
+        state = {'conn': None}
+        headers = {'Authorization': f'Bearer {API_KEY}', 'Content-Type': 'application/json'}
+
+        def post(body: str) -> Tuple[int, bool]:
+            for attempt in range(2):
+                if state['conn'] is None:
+                    state['conn'] = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                try:
+                    state['conn'].request('POST', '/api/test-connection', body=body, headers=headers)
+                    response = state['conn'].getresponse()
+                    data = response.read()
+                    break
+                except (http.client.HTTPException, OSError):
+                    # O worker fechou a conexão keep-alive; tenta de novo uma vez
+                    state['conn'].close()
+                    state['conn'] = None
+                    if attempt:
+                        raise
+            try:
+                success = bool(json.loads(data).get('success'))
+            except ValueError:
+                success = False
+            return response.status, success
+        return post
+    return make_client
+
+
+def _start_gunicorn(dns_server: StubDNSServer, workers: int, port: int,
+                    timeout: float) -> Tuple[subprocess.Popen, List[int]]:
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKERS=str(workers),
+               DNS_NAMESERVERS=f'{dns_server.host}:{dns_server.port}')
+    for key, value in BENCH_ENV.items():
+        env.setdefault(key, value)
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    start = time.perf_counter()
+    process = psutil.Process(master.pid)
+    while time.perf_counter() - start < timeout:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/status', headers={'Authorization': f'Bearer {API_KEY}'})
+            if conn.getresponse().status == 200 and len(process.children()) >= workers:
+                return master, [child.pid for child in process.children()]
+        except OSError:
+            pass
+        time.sleep(0.05)
+    _stop_gunicorn(master)
+    raise RuntimeError('gunicorn não respondeu dentro do prazo')
+
+
+def _stop_gunicorn(master: subprocess.Popen) -> None:
+    master.send_signal(signal.SIGTERM)
+    try:
+        master.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        master.kill()
+
+
+def run_level(make_client: Callable[[], Callable[[str], Tuple[int, bool]]], bodies: List[str],
+              pids: List[int], concurrency: int, rate: float, duration: float) -> Dict[str, Any]:
+    """
+    Executa um nível de carga e resume latências, erros e uso de recursos
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    failures = [0]
+    lock = threading.Lock()
+    sequence = itertools.count()
+    sampler = ProcessSampler(pids)
+    start = time.perf_counter() + 0.05
+    end = start + duration
+
+    def client_loop():
+        post = make_client()
+        while True:
+            i = next(sequence)
+            scheduled = start + i / rate if rate > 0 else time.perf_counter()
+            if scheduled >= end:
+                return
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                status, success = post(bodies[i % len(bodies)])
+            except Exception:
+                status, success = 0, False
+            elapsed_ms = (time.perf_counter() - scheduled) * 1000
+            with lock:
+                latencies.append(elapsed_ms)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status != 200 or not success:
+                    failures[0] += 1
+
+    sampler.start()
+    threads = [threading.Thread(target=client_loop, name=f'load-client-{n}') for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    workers = sampler.stop()
+
+    total = len(latencies)
+    return {
+        'concurrency': concurrency,
+        'rate': rate,
+        'requests': total,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'error_rate': round(failures[0] / total, 4) if total else 0.0,
+        'statuses': statuses,
+        'workers': workers,
+        'rss_max_kb': max((w['rss_max_kb'] for w in workers), default=0),
+        'cpu_ms_per_request': round(sum(w['cpu_s'] for w in workers) * 1000 / total, 2) if total else 0.0
+    }
+
+
+def _level_key(level: Dict[str, Any]) -> Tuple[int, float]:
+    return level['concurrency'], float(level['rate'])
+
+
+def compare(levels: List[Dict[str, Any]], baseline: Dict[str, Any],
+            thresholds: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    Regressões em relação ao baseline, nível a nível (mesma concorrência e taxa)
+    """
+    previous = {_level_key(level): level for level in baseline.get('levels', [])}
+    regressions = []
+
+    def regression(level, metric, before, after, limit):
+        regressions.append({'concurrency': level['concurrency'], 'rate': level['rate'], 'metric': metric,
+                            'baseline': before, 'current': after, 'threshold': limit})
+
+    for level in levels:
+        before = previous.get(_level_key(level))
+        if before is None:
+            continue
+        if level['throughput_rps'] < before['throughput_rps'] * (1 - thresholds['throughput_drop']):
+            regression(level, 'throughput_rps', before['throughput_rps'], level['throughput_rps'],
+                       thresholds['throughput_drop'])
+        for metric in LATENCY_METRICS:
+            increase = level[metric] - before[metric]
+            if increase > thresholds['latency_noise_ms'] and \
+                    level[metric] > before[metric] * (1 + thresholds['latency_increase']):
+                regression(level, metric, before[metric], level[metric], thresholds['latency_increase'])
+        if level['error_rate'] > before['error_rate'] + thresholds['error_rate_increase']:
+            regression(level, 'error_rate', before['error_rate'], level['error_rate'],
+                       thresholds['error_rate_increase'])
+        if before.get('rss_max_kb') and \
+                level['rss_max_kb'] > before['rss_max_kb'] * (1 + thresholds['rss_increase']):
+            regression(level, 'rss_max_kb', before['rss_max_kb'], level['rss_max_kb'],
+                       thresholds['rss_increase'])
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVICE_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de carga de /api/test-connection')
+    parser.add_argument('--mode', choices=('inprocess', 'gunicorn'), default='inprocess')
+    parser.add_argument('--concurrency', default='1,8,32',
+                        help='níveis de concorrência separados por vírgula')
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help='requisições/s no total (laço aberto); 0 = laço fechado')
+    parser.add_argument('--duration', type=float, default=10.0, help='segundos por nível')
+    parser.add_argument('--accounts', type=int, default=64, help='contas distintas no servidor de teste')
+    parser.add_argument('--server-latency', type=float, default=0.005,
+                        help='latência por resposta do servidor IMAP/SMTP de teste (segundos)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--output', default=None, help='arquivo JSON de resultados')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='grava este resultado como baseline')
+    parser.add_argument('--no-compare', action='store_true',
+                        help='só mede, sem comparar com o baseline')
+    parser.add_argument('--max-throughput-drop', type=float, default=DEFAULT_THRESHOLDS['throughput_drop'])
+    parser.add_argument('--max-latency-increase', type=float, default=DEFAULT_THRESHOLDS['latency_increase'])
+    parser.add_argument('--latency-noise-ms', type=float, default=DEFAULT_THRESHOLDS['latency_noise_ms'])
+    parser.add_argument('--max-error-rate-increase', type=float,
+                        default=DEFAULT_THRESHOLDS['error_rate_increase'])
+    parser.add_argument('--max-rss-increase', type=float, default=DEFAULT_THRESHOLDS['rss_increase'])
+    args = parser.parse_args()
+
+    compare_baseline = not (args.save_baseline or args.no_compare)
+    if compare_baseline and not os.path.exists(args.baseline):
+        print(f"Baseline {args.baseline} não encontrado: grave um com --save-baseline "
+              f"ou rode com --no-compare", file=sys.stderr)
+        return 2
+
+    levels_spec = [int(c) for c in args.concurrency.split(',') if c.strip()]
+    thresholds = {
+        'throughput_drop': args.max_throughput_drop,
+        'latency_increase': args.max_latency_increase,
+        'latency_noise_ms': args.latency_noise_ms,
+        'error_rate_increase': args.max_error_rate_increase,
+        'rss_increase': args.max_rss_increase,
+    }
+
+    master = None
+    with StubDNSServer() as dns_server, FakeMailServer([IMAP_HOST, SMTP_HOST]) as mail:
+        mail.install_dns(dns_server)
+        mail.script('*', latency=args.server_latency)
+        bodies = _request_bodies(mail, args.accounts)
+        if args.mode == 'gunicorn':
+            master, pids = _start_gunicorn(dns_server, args.workers, args.port, timeout=30)
+            make_client = _http_client_factory(args.port)
+        else:
+            make_client, pids = _inprocess_target(dns_server)
+        try:
+            # Aquecimento: uma requisição por conta, fora da medição
+            warm = make_client()
+            for body in bodies:
+                warm(body)
+            levels = [run_level(make_client, bodies, pids, concurrency, args.rate, args.duration)
+                      for concurrency in levels_spec]
+        finally:
+            if master is not None:
+                _stop_gunicorn(master)
+        server_stats = mail.stats
+
+    result: Dict[str, Any] = {
+        'benchmark': 'load',
+        'timestamp': datetime.datetime.now().isoformat(),
+        'commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'params': {
+            'mode': args.mode, 'workers': args.workers if args.mode == 'gunicorn' else 1,
+            'duration_s': args.duration, 'accounts': args.accounts,
+            'server_latency_s': args.server_latency
+        },
+        'levels': levels,
+        'fake_server': server_stats,
+    }
+
+    regressions: List[Dict[str, Any]] = []
+    if compare_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != result['params']:
+            print(f"Aviso: parâmetros diferentes do baseline {args.baseline}", file=sys.stderr)
+        regressions = compare(levels, baseline, thresholds)
+        result['comparison'] = {'baseline': args.baseline, 'baseline_commit': baseline.get('commit'),
+                                'thresholds': thresholds, 'regressions': regressions}
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    _write_json(output, result)
+    if args.save_baseline:
+        _write_json(args.baseline, result)
+
+    print(json.dumps({'output': output, 'levels': [
+        {k: level[k] for k in ('concurrency', 'rate', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms',
+                               'error_rate', 'rss_max_kb', 'cpu_ms_per_request')}
+        for level in levels], 'regressions': regressions}, indent=2))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark das sondagens contra transcrições gravadas de provedores reais
+
+Reproduz transcrições gravadas com PROBE_CAPTURE=true (probe_transcripts.py)
+pelo harness/replay_server.py e executa test_imap_connection ou
+test_smtp_connection (conforme o protocolo gravado) contra cada uma, N vezes.
+Com --speed 1 as respostas chegam no tempo real gravado (útil para ver como
+os timeouts se comportam com, por exemplo, a falha lenta de AUTHENTICATE);
+com --speed 0 não há espera e o que se mede é o custo de CPU do parser e da
+sondagem.
+
+Para cada transcrição: resultados obtidos (etapa e tipo de erro), p50/p95/p99
+da sondagem, duração gravada, CPU por sondagem (do processo inteiro,
+incluindo o reprodutor) e quantas reproduções saíram do roteiro.
+
+Uso:
+    PROBE_CAPTURE=true PROBE_CAPTURE_DIR=/tmp/transcripts python app.py   # gravar
+    python benchmarks/replay_benchmark.py /tmp/transcripts --speed 0 --iterations 200
+    python benchmarks/replay_benchmark.py /tmp/transcripts/imap-*.json --speed 1 --timeout 5
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+from typing import Dict, Any, List, Optional
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+# A sondagem repetida não pode ser suprimida nem gravar de novo o que reproduz
+os.environ.setdefault('AUTH_SUPPRESSION_ENABLED', 'false')
+os.environ['PROBE_CAPTURE'] = 'false'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from harness.replay_server import ReplayServer  # noqa: E402
+from harness.stub_dns import StubDNSServer  # noqa: E402
+from probe_transcripts import load_transcript  # noqa: E402
+
+# Credenciais fictícias no formato aceito pela verificação local (ex.: 16 letras do Gmail)
+EMAIL = 'user@example.invalid'
+PASSWORD = 'abcdefghijklmnop'
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+def _transcript_paths(arguments: List[str]) -> List[str]:
+    paths = []
+    for argument in arguments:
+        if os.path.isdir(argument):
+            paths.extend(sorted(glob.glob(os.path.join(argument, '*.json'))))
+        else:
+            paths.append(argument)
+    return paths
+
+
+def run_transcript(app, transcript: Dict[str, Any], host: str, port: int, secure: bool,
+                   iterations: int, concurrency: int, timeout: Optional[int]) -> Dict[str, Any]:
+    """
+    Executa a sondagem correspondente à transcrição iterations vezes
+    """
+    starttls = transcript['tls'] == 'starttls'
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+    lock = threading.Lock()
+    remaining = [iterations]
+
+    def probe():
+        if transcript['protocol'] == 'imap':
+            return app.test_imap_connection(EMAIL, PASSWORD, host, port, secure=secure, timeout=timeout)
+        return app.test_smtp_connection(EMAIL, PASSWORD, host, port, secure=secure,
+                                        starttls=starttls, timeout=timeout)
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            t0 = time.perf_counter()
+            result = probe()
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            outcome = 'success' if result.get('success') else \
+                f"{result.get('stage')}/{result.get('error_type', 'unknown')}"
+            with lock:
+                latencies.append(elapsed_ms)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f'replay-client-{n}') for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    cpu_s = time.process_time() - cpu_start
+
+    events = transcript['events']
+    return {
+        'protocol': transcript['protocol'],
+        'host': transcript['host'],
+        'tls': transcript['tls'],
+        'recorded_duration_ms': round(events[-1]['t'] * 1000, 2) if events else 0.0,
+        'iterations': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'probes_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'cpu_ms_per_probe': round(cpu_s * 1000 / len(latencies), 3) if latencies else 0.0,
+        'outcomes': outcomes
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark das sondagens contra transcrições gravadas')
+    parser.add_argument('transcripts', nargs='+', help='arquivos de transcrição ou diretórios')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='1 = tempo real gravado, 10 = dez vezes mais rápido, 0 = sem espera')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--timeout', type=int, default=None, help='timeout pedido para cada etapa (segundos)')
+    args = parser.parse_args()
+
+    paths = _transcript_paths(args.transcripts)
+    if not paths:
+        print('Nenhuma transcrição encontrada', file=sys.stderr)
+        return 2
+    transcripts = [load_transcript(path) for path in paths]
+
+    with StubDNSServer() as dns_server, ReplayServer(transcripts, speed=args.speed) as replay:
+        replay.install_dns(dns_server)
+        import dns_resolver_pool
+        import app
+        dns_resolver_pool.configure_nameservers([(dns_server.host, dns_server.port)])
+
+        results = []
+        for index, path in enumerate(paths):
+            host, port, secure = replay.endpoint(index)
+            result = run_transcript(app, transcripts[index], host, port, secure,
+                                    args.iterations, args.concurrency, args.timeout)
+            results.append(dict(result, transcript=os.path.basename(path)))
+
+    # Depois do stop, que espera as sessões em andamento; tentativas de hedge
+    # descartadas pelo cliente aparecem como conexões que saíram do roteiro
+    print(json.dumps({'speed': args.speed, 'results': results, 'replay': dict(replay.stats)}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de inicialização do microserviço
+
+Modo 'import' (padrão): em processos Python novos, mede o tempo de importar
+app.py, o tempo até a primeira resposta de /api/health (pelo cliente de teste
+do Flask) e o RSS do processo, e lista quais módulos pesados já estavam
+carregados antes da primeira requisição.
+
+Modo 'gunicorn': sobe o gunicorn com gunicorn.conf.py, mede o tempo até a
+primeira resposta HTTP e o RSS/USS de cada worker (USS = memória exclusiva do
+worker, que mostra quanto o copy-on-write está aproveitando do mestre).
+
+Uso:
+    python benchmarks/startup_benchmark.py --runs 5
+    python benchmarks/startup_benchmark.py --mode gunicorn --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+import urllib.request
+from typing import Dict, Any, List
+
+import psutil
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('imaplib', 'smtplib', 'dns.resolver', 'dns.asyncresolver', 'psutil', 'platform')
+
+# Executado em um processo novo para cada medição
+_PROBE = r'''
+import os, sys, json, time, resource
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+loaded = [m for m in %(heavy)r if m in sys.modules]
+client = app.app.test_client()
+response = client.get('/api/health')
+t2 = time.perf_counter()
+print(json.dumps({
+    'import_ms': round((t1 - t0) * 1000, 2),
+    'first_request_ms': round((t2 - t1) * 1000, 2),
+    'status': response.status_code,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy_loaded_at_import': loaded,
+}))
+'''
+
+
+def _median(values: List[float]) -> float:
+    ordered = sorted(values)
+    return round(ordered[len(ordered) // 2], 2) if ordered else 0.0
+
+
+def run_import(runs: int) -> Dict[str, Any]:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', _PROBE % {'heavy': HEAVY_MODULES}],
+            cwd=SERVICE_DIR, capture_output=True, text=True, check=True,
+            env=dict(os.environ, LOG_LEVEL='WARNING'))
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        'mode': 'import',
+        'runs': runs,
+        'import_ms_median': _median([s['import_ms'] for s in samples]),
+        'first_request_ms_median': _median([s['first_request_ms'] for s in samples]),
+        'max_rss_kb_median': _median([s['max_rss_kb'] for s in samples]),
+        'heavy_loaded_at_import': samples[-1]['heavy_loaded_at_import'],
+    }
+
+
+def run_gunicorn(workers: int, port: int, timeout: float) -> Dict[str, Any]:
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKERS=str(workers), LOG_LEVEL='WARNING')
+    start = time.perf_counter()
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first_response_ms = None
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1):
+                    first_response_ms = round((time.perf_counter() - start) * 1000, 2)
+                    break
+            except OSError:
+                time.sleep(0.02)
+
+        # Espera todos os workers subirem antes de medir a memória
+        process = psutil.Process(master.pid)
+        while len(process.children()) < workers and time.perf_counter() - start < timeout:
+            time.sleep(0.05)
+        time.sleep(0.5)
+
+        def memory(p: psutil.Process) -> Dict[str, Any]:
+            info = p.memory_full_info()
+            return {'pid': p.pid, 'rss_kb': info.rss // 1024, 'uss_kb': info.uss // 1024}
+
+        return {
+            'mode': 'gunicorn',
+            'workers': workers,
+            'time_to_first_response_ms': first_response_ms,
+            'master': memory(process),
+            'workers_memory': [memory(child) for child in process.children()],
+        }
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de inicialização do microserviço')
+    parser.add_argument('--mode', choices=('import', 'gunicorn'), default='import')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.mode == 'gunicorn':
+        result = run_gunicorn(args.workers, args.port, args.timeout)
+    else:
+        result = run_import(args.runs)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
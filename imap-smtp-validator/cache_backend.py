@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache compartilhado entre workers para DNS, capabilities e resultados de validação
+
+Duas camadas: um LRU em memória por processo (L1) na frente de um arquivo
+SQLite em modo WAL no próprio host (L2), que todos os workers do gunicorn
+enxergam. As entradas têm TTL, ambas as camadas têm limite de tamanho e as
+estatísticas são separadas por namespace. Não depende de nenhum serviço
+externo; CACHE_BACKEND escolhe entre 'tiered' (padrão), 'memory' e 'none'.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional, Tuple
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.cache')
+
+# Configurações
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'tiered').lower()
+CACHE_L1_MAX_ENTRIES = int(os.environ.get('CACHE_L1_MAX_ENTRIES', '4096'))
+CACHE_L2_MAX_ENTRIES = int(os.environ.get('CACHE_L2_MAX_ENTRIES', '100000'))
+CACHE_SQLITE_PATH = os.environ.get(
+    'CACHE_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'emailmax-cache.sqlite3'))
+CACHE_MAINTENANCE_INTERVAL = 256  # escritas entre limpezas do L2
+
+# Marcador de ausência (None é um valor válido para cachear)
+MISS = object()
+
+
+class NamespaceStats:
+    """
+    Contadores por namespace
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, namespace: str, counter: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(
+                namespace, {'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'sets': 0})
+            counters[counter] = counters.get(counter, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for namespace, counters in self._counters.items():
+                hits = counters['l1_hits'] + counters['l2_hits']
+                lookups = hits + counters['misses']
+                result[namespace] = dict(counters, hit_ratio=round(hits / lookups, 3) if lookups else None)
+            return result
+
+
+class MemoryLRUCache:
+    """
+    LRU em memória com TTL por entrada
+    """
+
+    def __init__(self, max_entries: int = CACHE_L1_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, namespace: str, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return MISS
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[(namespace, key)]
+                return MISS
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[(namespace, key)] = (time.time() + ttl, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    Camada compartilhada: arquivo SQLite em modo WAL, uma conexão por thread e processo
+    """
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, max_entries: int = CACHE_L2_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,'
+                ' expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_with_expiry(self, namespace: str, key: str) -> Tuple[Any, float]:
+        try:
+            row = self._connection().execute(
+                'SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?',
+                (namespace, key, time.time())).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f"Falha de leitura no cache compartilhado: {e}")
+            return MISS, 0.0
+        if row is None:
+            return MISS, 0.0
+        return json.loads(row[0]), row[1]
+
+    def get(self, namespace: str, key: str) -> Any:
+        return self.get_with_expiry(namespace, key)[0]
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        try:
+            conn = self._connection()
+            conn.execute('INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                         (namespace, key, json.dumps(value), time.time() + ttl))
+            self._writes += 1
+            if self._writes % CACHE_MAINTENANCE_INTERVAL == 0:
+                self._maintenance(conn)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.debug(f"Falha de escrita no cache compartilhado: {e}")
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            self._connection().execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, key))
+        except sqlite3.Error as e:
+            logger.debug(f"Falha ao remover do cache compartilhado: {e}")
+
+    def _maintenance(self, conn: sqlite3.Connection) -> None:
+        """
+        Remove expirados e, acima do limite, as entradas que expirariam primeiro
+        """
+        conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        excess = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute('DELETE FROM cache WHERE rowid IN '
+                         '(SELECT rowid FROM cache ORDER BY expires_at LIMIT ?)', (excess,))
+            self.evictions += excess
+
+    def __len__(self) -> int:
+        try:
+            return self._connection().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+class TieredCache:
+    """
+    L1 em memória na frente de um L2 opcional; acertos no L2 promovem a entrada ao L1
+    """
+
+    def __init__(self, l1: Optional[MemoryLRUCache], l2: Optional[SQLiteCache] = None):
+        self.l1 = l1
+        self.l2 = l2
+        self.stats = NamespaceStats()
+
+    def get(self, namespace: str, key: str) -> Any:
+        if self.l1 is not None:
+            value = self.l1.get(namespace, key)
+            if value is not MISS:
+                self.stats.incr(namespace, 'l1_hits')
+                return value
+        if self.l2 is not None:
+            value, expires_at = self.l2.get_with_expiry(namespace, key)
+            if value is not MISS:
+                self.stats.incr(namespace, 'l2_hits')
+                if self.l1 is not None:
+                    self.l1.set(namespace, key, value, expires_at - time.time())
+                return value
+        self.stats.incr(namespace, 'misses')
+        return MISS
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self.stats.incr(namespace, 'sets')
+        if self.l1 is not None:
+            self.l1.set(namespace, key, value, ttl)
+        if self.l2 is not None:
+            self.l2.set(namespace, key, value, ttl)
+
+    def delete(self, namespace: str, key: str) -> None:
+        if self.l1 is not None:
+            self.l1.delete(namespace, key)
+        if self.l2 is not None:
+            self.l2.delete(namespace, key)
+
+    def get_or_compute(self, namespace: str, key: str, ttl: float, compute: Callable[[], Any],
+                       negative_ttl: Optional[float] = None,
+                       is_negative: Callable[[Any], bool] = lambda value: not value) -> Any:
+        """
+        Retorna o valor em cache ou calcula e armazena; resultados negativos usam negative_ttl
+        """
+        value = self.get(namespace, key)
+        if value is not MISS:
+            return value
+        value = compute()
+        if negative_ttl is not None and is_negative(value):
+            self.set(namespace, key, value, negative_ttl)
+        else:
+            self.set(namespace, key, value, ttl)
+        return value
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'backend': CACHE_BACKEND,
+            'l1_entries': len(self.l1) if self.l1 is not None else None,
+            'l1_evictions': self.l1.evictions if self.l1 is not None else None,
+            'l2_entries': len(self.l2) if self.l2 is not None else None,
+            'l2_evictions': self.l2.evictions if self.l2 is not None else None,
+            'namespaces': self.stats.snapshot()
+        }
+
+
+def _build_cache() -> TieredCache:
+    if CACHE_BACKEND == 'none':
+        return TieredCache(None, None)
+    if CACHE_BACKEND == 'memory':
+        return TieredCache(MemoryLRUCache())
+    return TieredCache(MemoryLRUCache(), SQLiteCache())
+
+
+_cache: Optional[TieredCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TieredCache:
+    """
+    Retorna o cache do processo, criando-o na primeira utilização
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _build_cache()
+                logger.info(f"Cache inicializado (backend={CACHE_BACKEND})")
+    return _cache
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pré-aquecimento especulativo de conexões IMAP/SMTP
+
+Quando /api/verify-email-domain é chamado, o formulário de cadastro costuma
+chamar /api/test-connection alguns segundos depois. Este módulo resolve o DNS,
+abre a conexão TCP e faz o handshake TLS dos hosts detectados em segundo plano
+e estaciona o socket por pouco tempo, para que o próximo teste do mesmo host
+pule essas etapas. O estacionamento é limitado em tamanho e expira.
+
+O DNS passa pela função de resolução do serviço (check_dns, com o cache
+compartilhado) e a conexão por establish_connection (Happy Eyeballs, hedge e
+histórico de latência), como numa sondagem normal. O socket, porém, só existe
+no worker que o abriu: com vários workers do gunicorn, o teste seguinte cai
+em outro worker na maioria das vezes e só aproveita a resposta de DNS já
+cacheada. As estatísticas contam essas perdas à parte (misses_other_worker).
+"""
+
+import os
+import time
+import socket
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterable, Optional, Tuple
+
+from cache_backend import MISS, get_cache
+from hedged_connect import establish_connection
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.connection-prewarm')
+
+# Configurações
+PREWARM_ON_VERIFY = os.environ.get('PREWARM_ON_VERIFY', 'false').lower() == 'true'
+PREWARM_TTL = float(os.environ.get('PREWARM_TTL', '20'))  # segundos
+PREWARM_MAX_PARKED = int(os.environ.get('PREWARM_MAX_PARKED', '32'))
+PREWARM_MAX_WORKERS = int(os.environ.get('PREWARM_MAX_WORKERS', '4'))
+PREWARM_CONNECT_TIMEOUT = float(os.environ.get('PREWARM_CONNECT_TIMEOUT', '5'))  # segundos
+
+# Marca no cache compartilhado de quais endpoints têm socket estacionado (e em que worker)
+PREWARM_CACHE_NAMESPACE = 'prewarm'
+
+# Chave de estacionamento: (host, porta, modo) onde modo é 'ssl' ou 'plain'
+ParkingKey = Tuple[str, int, str]
+
+# Resolução de DNS do serviço: host -> {'success', 'message', 'addresses'}
+Resolver = Callable[[str], Dict[str, Any]]
+
+
+def _close_quietly(sock: socket.socket) -> None:
+    try:
+        sock.close()
+    except Exception:
+        pass
+
+
+class ParkedConnectionPool:
+    """
+    Estacionamento limitado de sockets pré-conectados, com expiração por TTL
+    """
+
+    def __init__(self, max_parked: int = PREWARM_MAX_PARKED, ttl: float = PREWARM_TTL):
+        self.max_parked = max_parked
+        self.ttl = ttl
+        self._parked: "OrderedDict[ParkingKey, Tuple[float, socket.socket]]" = OrderedDict()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self.stats = {'parked': 0, 'hits': 0, 'misses': 0, 'misses_other_worker': 0,
+                      'expired': 0, 'evicted': 0, 'failed': 0}
+
+    def _purge_expired(self, now: float) -> None:
+        for key in [k for k, (expires_at, _) in self._parked.items() if expires_at <= now]:
+            _, sock = self._parked.pop(key)
+            _close_quietly(sock)
+            self.stats['expired'] += 1
+
+    def begin(self, key: ParkingKey) -> bool:
+        """
+        Reserva a chave para aquecimento; retorna False se já houver socket ou tarefa em andamento
+        """
+        with self._lock:
+            self._purge_expired(time.time())
+            if key in self._parked or key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+            return True
+
+    def park(self, key: ParkingKey, sock: Optional[socket.socket]) -> None:
+        """
+        Estaciona o socket aquecido (ou apenas libera a reserva, se sock for None)
+        """
+        with self._lock:
+            self._in_flight.discard(key)
+            if sock is None:
+                self.stats['failed'] += 1
+                return
+            now = time.time()
+            self._purge_expired(now)
+            while len(self._parked) >= self.max_parked:
+                _, (_, oldest) = self._parked.popitem(last=False)
+                _close_quietly(oldest)
+                self.stats['evicted'] += 1
+            self._parked[key] = (now + self.ttl, sock)
+            self.stats['parked'] += 1
+
+        # Garante o fechamento mesmo que ninguém consulte o estacionamento
+        timer = threading.Timer(self.ttl, self._expire, args=(key, sock))
+        timer.daemon = True
+        timer.start()
+
+    def _expire(self, key: ParkingKey, sock: socket.socket) -> None:
+        with self._lock:
+            entry = self._parked.get(key)
+            if entry is None or entry[1] is not sock:
+                return
+            del self._parked[key]
+            self.stats['expired'] += 1
+        _close_quietly(sock)
+
+    def take(self, key: ParkingKey) -> Optional[socket.socket]:
+        """
+        Retira o socket estacionado para a chave, se ainda estiver válido
+        """
+        with self._lock:
+            self._purge_expired(time.time())
+            entry = self._parked.pop(key, None)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def record_other_worker_miss(self) -> None:
+        """
+        Conta uma perda cujo socket está estacionado em outro worker
+        """
+        with self._lock:
+            self.stats['misses_other_worker'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            taken = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats, current=len(self._parked), in_flight=len(self._in_flight),
+                        hit_ratio=round(self.stats['hits'] / taken, 4) if taken else None)
+
+
+_pool = ParkedConnectionPool()
+_executor = ThreadPoolExecutor(max_workers=PREWARM_MAX_WORKERS, thread_name_prefix='prewarm')
+
+
+def _cache_key(key: ParkingKey) -> str:
+    host, port, mode = key
+    return f'{host}:{port}:{mode}'
+
+
+def _addresses(host: str, resolve: Resolver) -> Optional[list]:
+    """
+    Endereços do host pela resolução do serviço (ou o próprio host, se for um IP)
+    """
+    try:
+        ipaddress.ip_address(host)
+        return [host]
+    except ValueError:
+        pass
+    dns_result = resolve(host)
+    return dns_result['addresses'] if dns_result['success'] else None
+
+
+def _warm(key: ParkingKey, resolve: Resolver) -> None:
+    """
+    Executa DNS + TCP (+ TLS, se for o caso) e estaciona o socket resultante
+    """
+    host, port, mode = key
+    sock = None
+    try:
+        addresses = _addresses(host, resolve)
+        if addresses is None:
+            raise OSError(f'não foi possível resolver {host}')
+        connection = establish_connection(host, port, addresses, PREWARM_CONNECT_TIMEOUT,
+                                          tls=mode == 'ssl')
+        sock = connection['socket']
+        logger.debug(f"Conexão pré-aquecida para {host}:{port} ({mode}) em "
+                     f"{connection['connect_ms'] + connection.get('handshake_ms', 0)}ms")
+    except Exception as e:
+        logger.debug(f"Falha ao pré-aquecer {host}:{port} ({mode}): {e}")
+    _pool.park(key, sock)
+    if sock is not None:
+        get_cache().set(PREWARM_CACHE_NAMESPACE, _cache_key(key), os.getpid(), _pool.ttl)
+
+
+def prewarm_endpoints(endpoints: Iterable[Tuple[str, int, bool]], resolve: Resolver) -> int:
+    """
+    Agenda o pré-aquecimento dos endpoints (host, porta, ssl direto), resolvendo
+    os hosts com resolve
+
+    Returns:
+        Número de endpoints efetivamente agendados
+    """
+    scheduled = 0
+    for host, port, secure in endpoints:
+        key = (host.lower(), int(port), 'ssl' if secure else 'plain')
+        if _pool.begin(key):
+            _executor.submit(_warm, key, resolve)
+            scheduled += 1
+    return scheduled
+
+
+def prewarm_provider_settings(settings: Dict[str, Any], resolve: Resolver) -> int:
+    """
+    Agenda o pré-aquecimento dos servidores IMAP e SMTP de uma configuração detectada
+    """
+    imap = settings['imap']
+    smtp = settings['smtp']
+    return prewarm_endpoints([
+        (imap['host'], imap['port'], imap.get('secure', True)),
+        (smtp['host'], smtp['port'], smtp.get('secure', False)),
+    ], resolve)
+
+
+def take_parked_connection(host: str, port: int, secure: bool) -> Optional[socket.socket]:
+    """
+    Retira uma conexão pré-aquecida para o host, se houver
+    """
+    key = (host.lower(), int(port), 'ssl' if secure else 'plain')
+    sock = _pool.take(key)
+    if sock is not None:
+        get_cache().delete(PREWARM_CACHE_NAMESPACE, _cache_key(key))
+    else:
+        owner = get_cache().get(PREWARM_CACHE_NAMESPACE, _cache_key(key))
+        if owner is not MISS and owner != os.getpid():
+            _pool.record_other_worker_miss()
+    return sock
+
+
+def reset_after_fork() -> None:
+    """
+    Descarta estacionamento e threads herdados do processo pai (chamado após o fork)
+    """
+    global _pool, _executor
+    _pool = ParkedConnectionPool()
+    _executor = ThreadPoolExecutor(max_workers=PREWARM_MAX_WORKERS, thread_name_prefix='prewarm')
+
+
+def get_prewarm_stats() -> Dict[str, Any]:
+    """
+    Estatísticas do estacionamento de conexões deste worker
+
+    Os sockets não são compartilhados entre workers: hits e misses valem só
+    para este processo, e misses_other_worker conta os testes que chegaram
+    aqui com o socket estacionado em outro worker.
+    """
+    return dict(_pool.snapshot(), worker=os.getpid(), scope='worker')
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verificação local do formato das credenciais antes de qualquer acesso à rede
+
+Recusa em microssegundos credenciais que com certeza falhariam: email fora da
+sintaxe ou não codificável em IDNA, senha vazia e senhas fora do formato
+exigido pelo provedor (ex.: Senha de Aplicativo do Gmail, 16 letras). As
+regras vêm de KNOWN_PROVIDERS (password_pattern e password_instructions) e
+são compiladas uma única vez na inicialização; o provedor é identificado
+pelo host do servidor através do registro offline.
+"""
+
+import re
+import logging
+from typing import Dict, Any, List, Optional
+
+from provider_registry import get_registry
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.credential-precheck')
+
+# Limites da RFC 5321
+MAX_EMAIL_LENGTH = 254
+MAX_LOCAL_PART_LENGTH = 64
+MAX_DOMAIN_LENGTH = 253
+MAX_LABEL_LENGTH = 63
+
+# Parte local no formato dot-atom (RFC 5322), incluindo caracteres UTF-8 (RFC 6531)
+_LOCAL_PART_RE = re.compile(r"^[\w!#$%&'*+/=?^`{|}~-]+(?:\.[\w!#$%&'*+/=?^`{|}~-]+)*$")
+# Rótulo de domínio já em ASCII (após IDNA)
+_LABEL_RE = re.compile(r'^(?!-)[a-z0-9-]{1,63}(?<!-)$', re.IGNORECASE)
+
+EMAIL_SOLUTIONS = ['Verifique se o endereço de email foi digitado corretamente (ex.: usuario@dominio.com)']
+
+
+class PasswordRule:
+    """
+    Formato de senha exigido por um provedor
+    """
+
+    __slots__ = ('provider', 'pattern', 'instructions')
+
+    def __init__(self, provider: str, pattern: str, instructions: Optional[str]):
+        self.provider = provider
+        self.pattern = re.compile(pattern)
+        self.instructions = instructions or f'A senha não está no formato exigido por {provider}'
+
+
+def _result(error_type: str, message: str, solutions: List[str]) -> Dict[str, Any]:
+    return {
+        'success': False,
+        'message': message,
+        'stage': 'precheck',
+        'error_type': error_type,
+        'solutions': solutions
+    }
+
+
+class CredentialPrecheck:
+    """
+    Regras compiladas a partir das configurações de provedores conhecidos
+    """
+
+    def __init__(self, providers: Dict[str, Dict[str, Any]]):
+        self.rules: Dict[str, PasswordRule] = {
+            provider: PasswordRule(provider, settings['password_pattern'],
+                                   settings.get('password_instructions'))
+            for provider, settings in providers.items()
+            if settings.get('password_pattern')
+        }
+
+    def check_email(self, email: Any) -> Optional[Dict[str, Any]]:
+        """
+        Resultado de falha se o email for sintaticamente inválido, ou None
+        """
+        if not isinstance(email, str) or email.count('@') != 1:
+            return _result('invalid_email', 'Formato de email inválido', EMAIL_SOLUTIONS)
+        local, domain = email.strip().rsplit('@', 1)
+        if not domain:
+            return _result('invalid_email', 'Formato de email inválido', EMAIL_SOLUTIONS)
+        if not local or len(local) > MAX_LOCAL_PART_LENGTH or not _LOCAL_PART_RE.match(local):
+            return _result('invalid_email', 'Parte local do email inválida', EMAIL_SOLUTIONS)
+        try:
+            ascii_domain = domain.rstrip('.').encode('idna').decode('ascii')
+        except UnicodeError:
+            return _result('invalid_email', f'Domínio do email não pode ser codificado (IDNA): {domain}',
+                           EMAIL_SOLUTIONS)
+        labels = ascii_domain.split('.')
+        if (len(ascii_domain) > MAX_DOMAIN_LENGTH or len(labels) < 2
+                or not all(_LABEL_RE.match(label) for label in labels)
+                or labels[-1].isdigit()
+                or len(local) + 1 + len(ascii_domain) > MAX_EMAIL_LENGTH):
+            return _result('invalid_email', f'Domínio do email inválido: {domain}', EMAIL_SOLUTIONS)
+        return None
+
+    def check_password(self, password: Any, host: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Resultado de falha se a senha estiver vazia ou fora do formato do provedor do host, ou None
+        """
+        if not isinstance(password, str) or not password:
+            return _result('empty_password', 'Senha não informada', ['Informe a senha da conta'])
+        if host and self.rules:
+            verdict = get_registry().lookup_host(host)
+            rule = self.rules.get(verdict['provider']) if verdict else None
+            if rule is not None and not rule.pattern.match(password):
+                return _result('password_format', rule.instructions, [rule.instructions])
+        return None
+
+    def check(self, email: Any, password: Any, host: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Verifica email e senha; retorna o primeiro resultado de falha, ou None
+        """
+        return self.check_email(email) or self.check_password(password, host)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pool assíncrono de resolução DNS
+
+Substitui as chamadas bloqueantes a dns.resolver.resolve por um resolvedor
+baseado no dns.asyncresolver do dnspython, com um conjunto configurável de
+servidores de nomes (DNS_NAMESERVERS), acompanhamento de saúde e latência por
+servidor e consultas A/AAAA/MX disparadas em paralelo. O loop de eventos roda
+em uma thread própria do processo, e a fachada síncrona permite usá-lo a
+partir das rotas Flask. O dnspython só é importado na primeira consulta.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from latency_sketch import record_sample
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.dns-resolver-pool')
+
+# Configurações
+# Lista separada por vírgulas de "ip" ou "ip:porta"; vazio usa /etc/resolv.conf
+DNS_NAMESERVERS = os.environ.get('DNS_NAMESERVERS', '')
+DNS_QUERY_TIMEOUT = float(os.environ.get('DNS_QUERY_TIMEOUT', '2'))  # segundos por servidor
+DNS_MAX_ATTEMPTS = int(os.environ.get('DNS_MAX_ATTEMPTS', '3'))
+DNS_FAILURE_THRESHOLD = int(os.environ.get('DNS_FAILURE_THRESHOLD', '3'))
+DNS_FAILURE_BACKOFF = float(os.environ.get('DNS_FAILURE_BACKOFF', '30'))  # segundos
+
+
+def parse_nameservers(spec: str) -> List[Tuple[str, int]]:
+    """
+    Converte "1.1.1.1,8.8.8.8:53,[::1]:5353" em [(endereço, porta), ...]
+    """
+    nameservers = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if item.startswith('['):
+            addr, _, port = item[1:].partition(']:')
+            addr = addr.rstrip(']')
+        elif item.count(':') == 1:
+            addr, _, port = item.partition(':')
+        else:
+            addr, port = item, ''
+        nameservers.append((addr, int(port) if port else 53))
+    return nameservers
+
+
+def system_nameservers() -> List[Tuple[str, int]]:
+    """
+    Servidores de nomes configurados no sistema (/etc/resolv.conf)
+    """
+    import dns.resolver
+    try:
+        return [(addr, 53) for addr in dns.resolver.Resolver().nameservers]
+    except Exception as e:
+        logger.warning(f"Não foi possível ler a configuração DNS do sistema: {e}")
+        return [('8.8.8.8', 53), ('1.1.1.1', 53)]
+
+
+class NameserverState:
+    """
+    Saúde e latência observadas de um servidor de nomes
+    """
+
+    def __init__(self, address: str, port: int, timeout: float):
+        import dns.asyncresolver
+        self.address = address
+        self.port = port
+        self.resolver = dns.asyncresolver.Resolver(configure=False)
+        self.resolver.nameservers = [address]
+        self.resolver.port = port
+        self.resolver.timeout = timeout
+        self.resolver.lifetime = timeout
+        self.ewma_ms: Optional[float] = None
+        self.queries = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+    def record_success(self, latency_ms: float) -> None:
+        record_sample(self.address, 'dns', latency_ms, provider='dns')
+        self.queries += 1
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        if self.ewma_ms is None:
+            self.ewma_ms = latency_ms
+        else:
+            self.ewma_ms = 0.8 * self.ewma_ms + 0.2 * latency_ms
+
+    def record_failure(self, now: float) -> None:
+        self.queries += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= DNS_FAILURE_THRESHOLD:
+            self.down_until = now + DNS_FAILURE_BACKOFF
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            'nameserver': f'{self.address}:{self.port}',
+            'healthy': self.healthy(now),
+            'latency_ewma_ms': round(self.ewma_ms, 2) if self.ewma_ms is not None else None,
+            'queries': self.queries,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures
+        }
+
+
+class AsyncResolverPool:
+    """
+    Resolve consultas escolhendo o servidor saudável de menor latência e
+    passando para o próximo em caso de timeout ou falha do servidor
+    """
+
+    def __init__(self, nameservers: Sequence[Tuple[str, int]],
+                 timeout: float = DNS_QUERY_TIMEOUT, max_attempts: int = DNS_MAX_ATTEMPTS):
+        self.nameservers = [NameserverState(addr, port, timeout) for addr, port in nameservers]
+        self.max_attempts = max(1, max_attempts)
+
+    def _ranked(self) -> List[NameserverState]:
+        now = time.time()
+        healthy = [ns for ns in self.nameservers if ns.healthy(now)]
+        # Falhas recentes pesam primeiro; servidores sem histórico vêm antes para serem medidos
+        healthy.sort(key=lambda ns: (ns.consecutive_failures,
+                                     ns.ewma_ms if ns.ewma_ms is not None else -1.0))
+        unhealthy = [ns for ns in self.nameservers if not ns.healthy(now)]
+        return (healthy + unhealthy)[:self.max_attempts]
+
+    async def resolve(self, name: str, rdtype: str) -> Any:
+        import dns.exception
+        import dns.resolver
+        # Respostas definitivas: o servidor funcionou, o nome é que não existe
+        definitive_errors = (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.YXDOMAIN)
+        last_error: Optional[Exception] = None
+        for ns in self._ranked():
+            start_time = time.time()
+            try:
+                answer = await ns.resolver.resolve(name, rdtype)
+                ns.record_success((time.time() - start_time) * 1000)
+                return answer
+            except definitive_errors:
+                ns.record_success((time.time() - start_time) * 1000)
+                raise
+            except (dns.exception.Timeout, dns.resolver.NoNameservers, OSError) as e:
+                ns.record_failure(time.time())
+                last_error = e
+                logger.debug(f"Servidor DNS {ns.address}:{ns.port} falhou para {name}/{rdtype}: {e}")
+        raise last_error or dns.resolver.NoNameservers()
+
+    async def resolve_many(self, name: str, rdtypes: Sequence[str]) -> Dict[str, Any]:
+        """
+        Dispara as consultas em paralelo; cada tipo recebe a resposta ou a exceção
+        """
+        results = await asyncio.gather(*(self.resolve(name, rdtype) for rdtype in rdtypes),
+                                       return_exceptions=True)
+        return dict(zip(rdtypes, results))
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return [ns.snapshot(now) for ns in self.nameservers]
+
+
+# Estado por processo (recriado após fork do gunicorn)
+_state_lock = threading.Lock()
+_state: Dict[str, Any] = {'pid': None, 'loop': None, 'pool': None}
+
+
+def _ensure_started() -> Tuple[asyncio.AbstractEventLoop, AsyncResolverPool]:
+    with _state_lock:
+        if _state['pid'] != os.getpid():
+            nameservers = parse_nameservers(DNS_NAMESERVERS) or system_nameservers()
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='dns-resolver-pool', daemon=True)
+            thread.start()
+            _state.update(pid=os.getpid(), loop=loop, pool=AsyncResolverPool(nameservers))
+            logger.info(f"Pool DNS iniciado com {len(nameservers)} servidores: "
+                        f"{', '.join(f'{a}:{p}' for a, p in nameservers)}")
+        return _state['loop'], _state['pool']
+
+
+def configure_nameservers(nameservers: Sequence[Tuple[str, int]]) -> None:
+    """
+    Substitui o conjunto de servidores de nomes do processo (usado por testes e benchmarks)
+    """
+    _ensure_started()
+    with _state_lock:
+        _state['pool'] = AsyncResolverPool(nameservers)
+
+
+def _run(coro_factory) -> Any:
+    loop, pool = _ensure_started()
+    future = asyncio.run_coroutine_threadsafe(coro_factory(pool), loop)
+    return future.result(timeout=DNS_QUERY_TIMEOUT * DNS_MAX_ATTEMPTS + 1)
+
+
+def resolve(name: str, rdtype: str) -> Any:
+    """
+    Resolve um nome (interface compatível com dns.resolver.resolve)
+    """
+    return _run(lambda pool: pool.resolve(name, rdtype))
+
+
+def resolve_many(name: str, rdtypes: Sequence[str]) -> Dict[str, Any]:
+    """
+    Resolve vários tipos de registro do mesmo nome em paralelo
+    """
+    return _run(lambda pool: pool.resolve_many(name, rdtypes))
+
+
+def get_resolver_stats() -> List[Dict[str, Any]]:
+    """
+    Saúde e latência de cada servidor de nomes do pool
+    """
+    _, pool = _ensure_started()
+    return pool.stats()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Contexto de resolução de domínio por requisição
+
+Agrupa tudo o que uma requisição precisa saber sobre o domínio de um email
+(registros MX, registros A, veredito do provedor e tempos de cada etapa).
+Cada informação é calculada uma única vez, sob demanda, e o mesmo contexto
+é compartilhado por detect_provider_config, identificar_provedor e pelos
+construtores de resposta.
+"""
+
+import os
+import time
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+
+import dns_resolver_pool
+from cache_backend import MISS, get_cache
+from provider_registry import get_registry
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.domain-resolution')
+
+# Configurações
+CACHE_MX_TTL = int(os.environ.get('CACHE_MX_TTL', '300'))  # segundos
+CACHE_MX_NEGATIVE_TTL = int(os.environ.get('CACHE_MX_NEGATIVE_TTL', '60'))  # segundos
+
+# Marcador para valores ainda não calculados
+_PENDING = object()
+
+
+class DomainResolution:
+    """
+    Resultado memoizado da resolução de um domínio de email
+    """
+
+    def __init__(self, domain: str):
+        self.domain = domain.strip().lower().rstrip('.')
+        self.timings: Dict[str, float] = {}
+        self.mx_error: Optional[str] = None
+        self._mx_records: Any = _PENDING
+        self._a_records: Any = _PENDING
+        self._verdict: Any = _PENDING
+
+    def _timed(self, stage: str, start_time: float) -> None:
+        self.timings[f'{stage}_ms'] = round((time.time() - start_time) * 1000, 2)
+
+    def _load_cached_mx(self) -> None:
+        """
+        Reaproveita os registros MX do cache compartilhado, se houver
+        """
+        if self._mx_records is not _PENDING:
+            return
+        entry = get_cache().get('mx', self.domain)
+        if entry is not MISS:
+            self._mx_records = entry['records']
+            self.mx_error = entry['error']
+            self.timings['mx_ms'] = 0.0
+
+    def _store_mx(self, answers: Any) -> None:
+        if isinstance(answers, Exception):
+            self.mx_error = str(answers)
+            logger.warning(f"Erro ao resolver registros MX para {self.domain}: {answers}")
+            self._mx_records = []
+        else:
+            self._mx_records = [{
+                'preference': rec.preference,
+                'exchange': str(rec.exchange)
+            } for rec in sorted(answers, key=lambda r: r.preference)]
+            logger.info(f"Encontrados {len(self._mx_records)} registros MX para {self.domain}")
+        get_cache().set('mx', self.domain, {'records': self._mx_records, 'error': self.mx_error},
+                        CACHE_MX_TTL if self._mx_records else CACHE_MX_NEGATIVE_TTL)
+
+    def _store_a(self, answers: Any) -> None:
+        if isinstance(answers, Exception):
+            logger.debug(f"Sem registros A para {self.domain}: {answers}")
+            self._a_records = []
+            return
+        self._a_records = [str(addr) for addr in answers]
+
+    def prefetch(self, rdtypes: Sequence[str] = ('MX', 'A')) -> None:
+        """
+        Resolve em paralelo os tipos de registro ainda pendentes
+        """
+        self._load_cached_mx()
+        stores = {'MX': ('_mx_records', self._store_mx), 'A': ('_a_records', self._store_a)}
+        pending = [t for t in rdtypes if t in stores and getattr(self, stores[t][0]) is _PENDING]
+        if not pending:
+            return
+        start_time = time.time()
+        try:
+            results = dns_resolver_pool.resolve_many(self.domain, pending)
+        except Exception as e:
+            results = {rdtype: e for rdtype in pending}
+        for rdtype in pending:
+            stores[rdtype][1](results[rdtype])
+            self._timed(rdtype.lower(), start_time)
+
+    @property
+    def mx_records(self) -> List[Dict[str, Any]]:
+        """
+        Registros MX ordenados por preferência, no formato da API
+        """
+        self._load_cached_mx()
+        if self._mx_records is _PENDING:
+            start_time = time.time()
+            try:
+                self._store_mx(dns_resolver_pool.resolve(self.domain, 'MX'))
+            except Exception as e:
+                self._store_mx(e)
+            self._timed('mx', start_time)
+        return self._mx_records
+
+    @property
+    def has_mx(self) -> bool:
+        return len(self.mx_records) > 0
+
+    @property
+    def mx_hosts(self) -> List[str]:
+        return [rec['exchange'] for rec in self.mx_records]
+
+    @property
+    def a_records(self) -> List[str]:
+        """
+        Endereços IPv4 do próprio domínio
+        """
+        if self._a_records is _PENDING:
+            start_time = time.time()
+            try:
+                self._store_a(dns_resolver_pool.resolve(self.domain, 'A'))
+            except Exception as e:
+                self._store_a(e)
+            self._timed('a', start_time)
+        return self._a_records
+
+    @property
+    def verdict(self) -> Optional[Dict[str, Any]]:
+        """
+        Veredito do registro de provedores: pelo domínio e, se necessário, pelos MX
+        """
+        if self._verdict is _PENDING:
+            registry = get_registry()
+            verdict = registry.lookup_domain(self.domain)
+            if verdict is None:
+                verdict = registry.lookup_mx(self.mx_hosts)
+            self._verdict = verdict
+        return self._verdict
+
+    @property
+    def provider_name(self) -> str:
+        return self.verdict['name'] if self.verdict else "Desconhecido"
+
+
+def resolve_domain(domain: str) -> DomainResolution:
+    """
+    Cria o contexto de resolução para um domínio (as consultas são feitas sob demanda)
+    """
+    return DomainResolution(domain)
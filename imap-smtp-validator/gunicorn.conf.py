@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração do gunicorn
+
+A aplicação é carregada no processo mestre (preload_app) junto com os módulos
+pesados e o registro de provedores; os workers herdam essa memória por
+copy-on-write e só recriam o que não sobrevive ao fork (pools de threads).
+
+Os workers são gthread: cada um atende várias requisições em threads, e o
+controle de admissão (admission_control.py) limita quantas sondagens rodam ao
+mesmo tempo e quantas esperam. Há threads para as vagas, para a fila e para
+os endpoints isentos, de modo que uma requisição excedente seja recusada na
+hora com 503 em vez de ficar parada no backlog do socket.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+worker_class = 'gthread'
+threads = int(os.environ.get(
+    'GUNICORN_THREADS',
+    int(os.environ.get('ADMISSION_MAX_CONCURRENT', '8')) + int(os.environ.get('ADMISSION_MAX_QUEUE', '16')) + 4))
+preload_app = True
+
+
+def when_ready(server):
+    import app
+    app.preload_shared_state()
+    # Move os objetos já criados para a geração permanente, para que o coletor
+    # dos workers não toque (e copie) as páginas herdadas do mestre
+    gc.freeze()
+    server.log.info("Estado compartilhado pré-carregado no processo mestre")
+
+
+def post_fork(server, worker):
+    import app
+    app.reset_worker_state()
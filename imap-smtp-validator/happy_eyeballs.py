@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Conexão TCP dual-stack no estilo Happy Eyeballs (RFC 8305)
+
+Recebe todos os endereços resolvidos de um host (AAAA e A), intercala as
+famílias começando por IPv6 e inicia as tentativas de conexão de forma
+escalonada: uma nova tentativa começa quando a anterior falha ou quando se
+passa o atraso entre tentativas, sem esperar o timeout completo. O primeiro
+socket que completar a conexão é usado e os demais são fechados.
+"""
+
+import os
+import time
+import errno
+import socket
+import logging
+import selectors
+import ipaddress
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.happy-eyeballs')
+
+# Configurações
+# Atraso entre o início de tentativas (RFC 8305 recomenda 250 ms, mínimo de 100 ms)
+HE_ATTEMPT_DELAY = float(os.environ.get('HE_ATTEMPT_DELAY', '0.25'))  # segundos
+HE_MIN_ATTEMPT_DELAY = 0.1
+
+# Códigos de connect_ex que indicam conexão em andamento
+_IN_PROGRESS = {0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, errno.EALREADY}
+
+
+class HappyEyeballsError(OSError):
+    """
+    Nenhum endereço aceitou a conexão; attempts lista o resultado de cada tentativa
+    """
+
+    def __init__(self, code: int, message: str, attempts: List[Dict[str, Any]]):
+        super().__init__(code, message)
+        self.attempts = attempts
+
+
+def address_family(address: str) -> int:
+    return socket.AF_INET6 if ipaddress.ip_address(address).version == 6 else socket.AF_INET
+
+
+def family_name(family: int) -> str:
+    return 'ipv6' if family == socket.AF_INET6 else 'ipv4'
+
+
+def interleave_addresses(addresses: Sequence[str]) -> List[str]:
+    """
+    Ordena os endereços alternando as famílias, começando por IPv6 (RFC 8305, seção 4)
+    """
+    unique = list(dict.fromkeys(addresses))
+    ipv6 = [a for a in unique if address_family(a) == socket.AF_INET6]
+    ipv4 = [a for a in unique if address_family(a) == socket.AF_INET]
+    ordered = []
+    for i in range(max(len(ipv6), len(ipv4))):
+        if i < len(ipv6):
+            ordered.append(ipv6[i])
+        if i < len(ipv4):
+            ordered.append(ipv4[i])
+    return ordered
+
+
+def _start_attempt(address: str, port: int) -> socket.socket:
+    sock = socket.socket(address_family(address), socket.SOCK_STREAM)
+    try:
+        sock.setblocking(False)
+        code = sock.connect_ex((address, port))
+        if code not in _IN_PROGRESS:
+            raise OSError(code, os.strerror(code))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def connect_happy_eyeballs(addresses: Sequence[str], port: int, timeout: float,
+                           attempt_delay: float = HE_ATTEMPT_DELAY
+                           ) -> Tuple[socket.socket, str, List[Dict[str, Any]]]:
+    """
+    Conecta ao primeiro endereço que responder
+
+    Args:
+        addresses: Endereços IPv4/IPv6 já resolvidos
+        port: Porta TCP
+        timeout: Tempo total máximo (segundos) para todas as tentativas
+        attempt_delay: Atraso antes de iniciar a próxima tentativa em paralelo
+
+    Returns:
+        (socket conectado em modo bloqueante, endereço escolhido, tentativas)
+
+    Raises:
+        HappyEyeballsError: se nenhuma tentativa conectar dentro do prazo
+    """
+    candidates = interleave_addresses(addresses)
+    if not candidates:
+        raise HappyEyeballsError(errno.EADDRNOTAVAIL, 'Nenhum endereço para conectar', [])
+
+    attempt_delay = max(HE_MIN_ATTEMPT_DELAY, attempt_delay)
+    deadline = time.monotonic() + timeout
+    selector = selectors.DefaultSelector()
+    pending: Dict[socket.socket, Tuple[str, float]] = {}
+    attempts: List[Dict[str, Any]] = []
+    next_index = 0
+    next_start = 0.0
+    last_error: Optional[OSError] = None
+
+    def record(address: str, started: float, error: Optional[BaseException]) -> None:
+        attempts.append({
+            'address': address,
+            'family': family_name(address_family(address)),
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 2),
+            'error': str(error) if error else None
+        })
+
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                for address, started in pending.values():
+                    record(address, started, socket.timeout('timed out'))
+                raise HappyEyeballsError(errno.ETIMEDOUT, 'Tempo limite excedido', attempts)
+
+            # Iniciar a próxima tentativa se nenhuma estiver em andamento ou se o atraso venceu
+            if next_index < len(candidates) and (not pending or now >= next_start):
+                address = candidates[next_index]
+                next_index += 1
+                try:
+                    sock = _start_attempt(address, port)
+                except OSError as e:
+                    record(address, now, e)
+                    last_error = e
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE)
+                pending[sock] = (address, now)
+                next_start = now + attempt_delay
+
+            if not pending:
+                code = last_error.errno if last_error and last_error.errno else errno.EHOSTUNREACH
+                raise HappyEyeballsError(code, f'Todas as tentativas falharam: {last_error}', attempts)
+
+            wait = deadline - now
+            if next_index < len(candidates):
+                wait = min(wait, max(0.0, next_start - now))
+
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                address, started = pending.pop(sock)
+                selector.unregister(sock)
+                code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if code == 0:
+                    record(address, started, None)
+                    sock.setblocking(True)
+                    return sock, address, attempts
+                last_error = OSError(code, os.strerror(code))
+                record(address, started, last_error)
+                sock.close()
+                # Falha imediata libera a próxima tentativa sem esperar o atraso
+                next_start = 0.0
+    finally:
+        for sock in pending:
+            try:
+                sock.close()
+            except Exception:
+                pass
+        selector.close()
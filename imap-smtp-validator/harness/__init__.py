@@ -0,0 +1,3 @@
+"""
+Servidores locais usados para testes e benchmarks sem acesso à rede
+"""
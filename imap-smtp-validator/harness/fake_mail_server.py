@@ -0,0 +1,624 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor IMAP4rev1 + ESMTP local com comportamento programável
+
+Atende IMAP com TLS implícito (porta "993") e em texto puro com STARTTLS
+("143"), e SMTP com TLS implícito ("465") e com STARTTLS ("587"), usando um
+certificado emitido por uma CA autoassinada gerada na hora. Suporta
+CAPABILITY, LOGIN, AUTHENTICATE PLAIN/LOGIN, LIST, SELECT, NOOP e LOGOUT no
+IMAP, e EHLO, STARTTLS, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA e QUIT no SMTP.
+
+Cada conta ou host (pelo SNI; '*' para todos) pode receber um comportamento:
+latência por resposta, atraso da saudação, falha de autenticação, resposta
+"Too many simultaneous connections" e reset (RST) logo após um comando. Com
+o StubDNSServer apontando os hosts dos provedores para o servidor, o código
+de app.py roda de ponta a ponta sem rede.
+
+Uso:
+    with StubDNSServer() as dns_server, FakeMailServer(['imap.gmail.com', 'smtp.gmail.com']) as mail:
+        mail.add_account('user@gmail.com', 'abcd efgh ijkl mnop')
+        mail.script('smtp.gmail.com', banner_delay=2.0)
+        mail.script('user@gmail.com', reset_after='SELECT')
+        mail.install_dns(dns_server)
+        dns_resolver_pool.configure_nameservers([(dns_server.host, dns_server.port)])
+        body = dict(mail.connection_settings('imap.gmail.com', 'smtp.gmail.com'),
+                    email='user@gmail.com', password='abcd efgh ijkl mnop')
+"""
+
+import os
+import re
+import ssl
+import base64
+import socket
+import struct
+import asyncio
+import datetime
+import ipaddress
+import logging
+import tempfile
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.fake-mail-server')
+
+ANY_HOST = '*'
+
+IMAP_AUTH_FAILURE = '[AUTHENTICATIONFAILED] Invalid credentials (Failure)'
+IMAP_TOO_MANY = '[ALERT] Too many simultaneous connections. (Failure)'
+SMTP_AUTH_FAILURE = '535 5.7.8 Username and Password not accepted'
+SMTP_TOO_MANY = '421 4.7.0 Too many simultaneous connections, closing connection'
+
+# Comando especial de reset_after: derruba a conexão antes da saudação
+RESET_ON_CONNECT = 'CONNECT'
+
+_IMAP_ARG_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|(\S+)')
+_SMTP_REPLY_RE = re.compile(r'^\d{3}[ -]')  # código no início de uma falha programada
+
+
+class TestCA:
+    """
+    CA autoassinada e certificado de servidor para os hosts informados
+    (arquivos PEM em um diretório temporário)
+    """
+
+    def __init__(self, hostnames: Iterable[str], directory: Optional[str] = None):
+        self.hostnames = sorted({name.lower() for name in hostnames} | {'localhost'})
+        self.directory = directory or tempfile.mkdtemp(prefix='emailmax-fake-ca-')
+        self.ca_file = os.path.join(self.directory, 'ca.pem')
+        self.cert_file = os.path.join(self.directory, 'server.pem')
+        self.key_file = os.path.join(self.directory, 'server.key')
+        self._generate()
+
+    def _generate(self) -> None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        ca_key = ec.generate_private_key(ec.SECP256R1())
+        ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'EmailMax Test CA')])
+        ca_cert = (x509.CertificateBuilder()
+                   .subject_name(ca_name).issuer_name(ca_name)
+                   .public_key(ca_key.public_key())
+                   .serial_number(x509.random_serial_number())
+                   .not_valid_before(now - datetime.timedelta(days=1))
+                   .not_valid_after(now + datetime.timedelta(days=30))
+                   .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+                   .sign(ca_key, hashes.SHA256()))
+
+        key = ec.generate_private_key(ec.SECP256R1())
+        names: List[x509.GeneralName] = [x509.DNSName(name) for name in self.hostnames]
+        names.append(x509.IPAddress(ipaddress.ip_address('127.0.0.1')))
+        cert = (x509.CertificateBuilder()
+                .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, self.hostnames[0])]))
+                .issuer_name(ca_name)
+                .public_key(key.public_key())
+                .serial_number(x509.random_serial_number())
+                .not_valid_before(now - datetime.timedelta(days=1))
+                .not_valid_after(now + datetime.timedelta(days=30))
+                .add_extension(x509.SubjectAlternativeName(names), critical=False)
+                .sign(ca_key, hashes.SHA256()))
+
+        with open(self.ca_file, 'wb') as f:
+            f.write(ca_cert.public_bytes(serialization.Encoding.PEM))
+        with open(self.cert_file, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        with open(self.key_file, 'wb') as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+
+    def server_context(self) -> ssl.SSLContext:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.cert_file, self.key_file)
+        return context
+
+    def client_context(self) -> ssl.SSLContext:
+        """
+        Contexto de cliente que confia apenas nesta CA
+        """
+        return ssl.create_default_context(cafile=self.ca_file)
+
+    def install(self) -> None:
+        """
+        Faz ssl.create_default_context() confiar nesta CA (ex.: descoberta com DISCOVERY_VERIFY_TLS)
+        """
+        os.environ['SSL_CERT_FILE'] = self.ca_file
+
+
+class Behavior:
+    """
+    Comportamento programado para uma conta ou host
+
+    Args:
+        latency: Segundos de espera antes de cada resposta
+        banner_delay: Segundos de espera antes da saudação (apenas por host)
+        auth_failure: Recusa o login mesmo com a senha certa; True usa a
+            mensagem padrão, texto usa a mensagem informada (no SMTP, pode
+            começar pelo código, ex.: '534 5.7.9 Application-specific password required')
+        too_many_connections: Responde "Too many simultaneous connections" ao login
+        max_connections: Sessões autenticadas simultâneas permitidas por conta (0 = sem limite)
+        reset_after: Comando (ex.: 'LOGIN', 'SELECT', 'EHLO', 'AUTH' ou
+            'CONNECT') depois do qual a conexão é derrubada com RST
+    """
+
+    __slots__ = ('latency', 'banner_delay', 'auth_failure', 'too_many_connections',
+                 'max_connections', 'reset_after')
+
+    def __init__(self, latency: float = 0.0, banner_delay: float = 0.0, auth_failure: Any = None,
+                 too_many_connections: bool = False, max_connections: int = 0,
+                 reset_after: Optional[str] = None):
+        self.latency = latency
+        self.banner_delay = banner_delay
+        self.auth_failure = auth_failure
+        self.too_many_connections = too_many_connections
+        self.max_connections = max_connections
+        self.reset_after = reset_after.upper() if reset_after else None
+
+
+class _ConnectionReset(Exception):
+    pass
+
+
+class _Session:
+    """
+    Conexão de um cliente; as subclasses implementam o protocolo
+    """
+
+    protocol = ''
+
+    def __init__(self, server: 'FakeMailServer', reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter, tls: bool):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.tls = tls
+        self.hostname = self._sni() if tls else None
+        self.account: Optional[str] = None
+        self.authenticated = False
+
+    def _sni(self) -> Optional[str]:
+        ssl_object = self.writer.get_extra_info('ssl_object')
+        return self.server._sni.pop(id(ssl_object), None) if ssl_object is not None else None
+
+    @property
+    def behavior(self) -> Behavior:
+        return self.server.behavior_for(self.hostname, self.account)
+
+    async def readline(self) -> str:
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionResetError('cliente fechou a conexão')
+        return line.decode('utf-8', 'replace').rstrip('\r\n')
+
+    async def send(self, *lines: str, delay: bool = True) -> None:
+        if delay and self.behavior.latency > 0:
+            await asyncio.sleep(self.behavior.latency)
+        self.writer.write(''.join(f'{line}\r\n' for line in lines).encode('utf-8'))
+        await self.writer.drain()
+
+    def check_reset(self, command: str) -> None:
+        if self.behavior.reset_after == command:
+            self.reset()
+
+    def reset(self) -> None:
+        """
+        Derruba a conexão com RST (SO_LINGER 0), como um balanceador que perdeu a sessão
+        """
+        self.server._count(self.protocol, 'resets')
+        sock = self.writer.get_extra_info('socket')
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        except OSError:
+            pass
+        self.writer.transport.abort()
+        raise _ConnectionReset()
+
+    async def start_tls(self) -> None:
+        await self.writer.start_tls(self.server.ssl_context)
+        self.tls = True
+        self.hostname = self._sni() or self.hostname
+
+    def login(self, user: str, password: str) -> Optional[str]:
+        """
+        Verifica as credenciais; retorna None se aceitas ou 'auth_failure' / 'too_many'
+        """
+        self.account = user.strip().lower()
+        behavior = self.behavior
+        if behavior.too_many_connections or (
+                behavior.max_connections and self.server._sessions(self.account) >= behavior.max_connections):
+            self.server._count(self.protocol, 'too_many')
+            return 'too_many'
+        if behavior.auth_failure or self.server.accounts.get(self.account) != password:
+            self.server._count(self.protocol, 'logins_failed')
+            return 'auth_failure'
+        self.authenticated = True
+        self.server._open_session(self.account)
+        self.server._count(self.protocol, 'logins_ok')
+        return None
+
+    def failure_text(self, default: str) -> str:
+        failure = self.behavior.auth_failure
+        return failure if isinstance(failure, str) else default
+
+    def failure_reply(self, default: str) -> str:
+        """
+        Falha programada como resposta SMTP de linha única (código 535 se não houver)
+        """
+        failure = self.failure_text(default)
+        if _SMTP_REPLY_RE.match(failure):
+            return f'{failure[:3]} {failure[4:]}'
+        return f'535 5.7.8 {failure}'
+
+    async def run(self) -> None:
+        raise NotImplementedError
+
+    async def serve(self) -> None:
+        self.server._count(self.protocol, 'connections')
+        try:
+            host_behavior = self.server.behavior_for(self.hostname, None)
+            if host_behavior.reset_after == RESET_ON_CONNECT:
+                self.reset()
+            if host_behavior.banner_delay > 0:
+                await asyncio.sleep(host_behavior.banner_delay)
+            await self.run()
+        except (_ConnectionReset, ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            if self.authenticated:
+                self.server._close_session(self.account)
+            if not self.writer.transport.is_closing():
+                self.writer.close()
+
+
+class _IMAPSession(_Session):
+
+    protocol = 'imap'
+
+    def capabilities(self) -> str:
+        caps = ['IMAP4rev1', 'LITERAL+', 'SASL-IR', 'IDLE', 'ID', 'NAMESPACE', 'UIDPLUS']
+        if not self.tls:
+            caps.append('STARTTLS')
+        if not self.authenticated:
+            caps += ['AUTH=PLAIN', 'AUTH=LOGIN']
+        return ' '.join(caps)
+
+    async def login_reply(self, tag: str, user: str, password: str) -> None:
+        verdict = self.login(user, password)
+        if verdict == 'too_many':
+            await self.send(f'{tag} NO {IMAP_TOO_MANY}')
+        elif verdict == 'auth_failure':
+            await self.send(f'{tag} NO {_SMTP_REPLY_RE.sub("", self.failure_text(IMAP_AUTH_FAILURE))}')
+        else:
+            await self.send(f'{tag} OK [CAPABILITY {self.capabilities()}] {user} authenticated (Success)')
+
+    async def authenticate(self, tag: str, args: List[str]) -> None:
+        mechanism = args[0].upper() if args else ''
+        if mechanism == 'PLAIN':
+            response = args[1] if len(args) > 1 else None
+            if response is None:
+                await self.send('+ ')
+                response = await self.readline()
+            try:
+                _, user, password = base64.b64decode(response).decode('utf-8').split('\0')
+            except ValueError:
+                await self.send(f'{tag} BAD Invalid SASL response')
+                return
+        elif mechanism == 'LOGIN':
+            await self.send('+ ' + base64.b64encode(b'Username:').decode())
+            user = base64.b64decode(await self.readline()).decode('utf-8')
+            await self.send('+ ' + base64.b64encode(b'Password:').decode())
+            password = base64.b64decode(await self.readline()).decode('utf-8')
+        else:
+            await self.send(f'{tag} NO Unsupported authentication mechanism')
+            return
+        self.check_reset('AUTHENTICATE')
+        await self.login_reply(tag, user, password)
+
+    async def run(self) -> None:
+        await self.send(f'* OK [CAPABILITY {self.capabilities()}] Fake IMAP4rev1 ready', delay=False)
+        while True:
+            line = await self.readline()
+            tag, _, rest = line.partition(' ')
+            command, _, arguments = rest.partition(' ')
+            command = command.upper()
+            args = [quoted if quoted is not None else atom
+                    for quoted, atom in ((m.group(1), m.group(2)) for m in _IMAP_ARG_RE.finditer(arguments))]
+            args = [re.sub(r'\\(.)', r'\1', arg) for arg in args]
+            self.check_reset(command)
+
+            if command == 'CAPABILITY':
+                await self.send(f'* CAPABILITY {self.capabilities()}', f'{tag} OK CAPABILITY completed')
+            elif command == 'NOOP':
+                await self.send(f'{tag} OK NOOP completed')
+            elif command == 'ID':
+                await self.send('* ID ("name" "fake-imap")', f'{tag} OK ID completed')
+            elif command == 'STARTTLS' and not self.tls:
+                await self.send(f'{tag} OK Begin TLS negotiation now')
+                await self.start_tls()
+            elif command == 'LOGIN' and not self.authenticated and len(args) == 2:
+                await self.login_reply(tag, args[0], args[1])
+            elif command == 'AUTHENTICATE' and not self.authenticated:
+                await self.authenticate(tag, args)
+            elif command in ('LIST', 'LSUB') and self.authenticated:
+                mailboxes = self.server.mailboxes.get(self.account, [])
+                await self.send(*[f'* {command} (\\HasNoChildren) "." "{name}"' for name in mailboxes],
+                                f'{tag} OK {command} completed')
+            elif command in ('SELECT', 'EXAMINE') and self.authenticated:
+                if args and args[0] in self.server.mailboxes.get(self.account, []):
+                    await self.send('* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)',
+                                    '* 0 EXISTS', '* 0 RECENT', '* OK [UIDVALIDITY 1] UIDs valid',
+                                    f'{tag} OK [READ-WRITE] {command} completed')
+                else:
+                    await self.send(f'{tag} NO [NONEXISTENT] Unknown Mailbox')
+            elif command == 'LOGOUT':
+                await self.send('* BYE LOGOUT Requested', f'{tag} OK LOGOUT completed')
+                return
+            else:
+                await self.send(f'{tag} BAD Unknown command or invalid state')
+
+
+class _SMTPSession(_Session):
+
+    protocol = 'smtp'
+
+    def extensions(self) -> List[str]:
+        extensions = ['SIZE 35882577', '8BITMIME', 'PIPELINING', 'ENHANCEDSTATUSCODES', 'SMTPUTF8']
+        if not self.tls:
+            extensions.append('STARTTLS')
+        else:
+            # Como nos provedores reais, AUTH só é anunciado com TLS
+            extensions.append('AUTH PLAIN LOGIN')
+        return extensions
+
+    async def auth_reply(self, user: str, password: str) -> None:
+        verdict = self.login(user, password)
+        if verdict == 'too_many':
+            await self.send(SMTP_TOO_MANY)
+            raise _ConnectionReset()
+        if verdict == 'auth_failure':
+            await self.send(self.failure_reply(SMTP_AUTH_FAILURE))
+        else:
+            await self.send('235 2.7.0 Accepted')
+
+    async def auth(self, args: List[str]) -> None:
+        mechanism = args[0].upper() if args else ''
+        if not self.tls:
+            await self.send('530 5.7.0 Must issue a STARTTLS command first')
+            return
+        if mechanism == 'PLAIN':
+            response = args[1] if len(args) > 1 else None
+            if response is None:
+                await self.send('334 ')
+                response = await self.readline()
+            try:
+                _, user, password = base64.b64decode(response).decode('utf-8').split('\0')
+            except ValueError:
+                await self.send('501 5.5.2 Cannot decode response')
+                return
+        elif mechanism == 'LOGIN':
+            if len(args) > 1:
+                user = base64.b64decode(args[1]).decode('utf-8')
+            else:
+                await self.send('334 ' + base64.b64encode(b'Username:').decode())
+                user = base64.b64decode(await self.readline()).decode('utf-8')
+            await self.send('334 ' + base64.b64encode(b'Password:').decode())
+            password = base64.b64decode(await self.readline()).decode('utf-8')
+        else:
+            await self.send('504 5.7.4 Unrecognized authentication type')
+            return
+        await self.auth_reply(user, password)
+
+    async def run(self) -> None:
+        name = self.hostname or 'fake-smtp'
+        await self.send(f'220 {name} ESMTP Fake ready', delay=False)
+        while True:
+            line = await self.readline()
+            command, _, arguments = line.partition(' ')
+            command = command.upper()
+            self.check_reset(command)
+
+            if command == 'EHLO':
+                lines = [name] + self.extensions()
+                await self.send(*[f'250-{line}' for line in lines[:-1]], f'250 {lines[-1]}')
+            elif command == 'HELO':
+                await self.send(f'250 {name}')
+            elif command == 'STARTTLS' and not self.tls:
+                await self.send('220 2.0.0 Ready to start TLS')
+                await self.start_tls()
+            elif command == 'AUTH' and not self.authenticated:
+                await self.auth(arguments.split())
+            elif command == 'MAIL':
+                await self.send('250 2.1.0 OK')
+            elif command == 'RCPT':
+                await self.send('250 2.1.5 OK')
+            elif command == 'DATA':
+                await self.send('354 Go ahead')
+                while await self.readline() != '.':
+                    pass
+                await self.send('250 2.0.0 OK queued')
+            elif command in ('RSET', 'NOOP'):
+                await self.send('250 2.0.0 OK')
+            elif command == 'QUIT':
+                await self.send('221 2.0.0 closing connection')
+                return
+            else:
+                await self.send('502 5.5.1 Unrecognized command')
+
+
+class FakeMailServer:
+    """
+    Servidor IMAP/SMTP de teste que roda em uma thread própria
+
+    As portas são efêmeras por padrão; com imap_ssl_port=993 etc. (e
+    permissão para portas baixas) os provedores podem ser sondados nas portas
+    reais, inclusive pela autodetecção. bind_host permite um endereço de
+    loopback por provedor (ex.: 127.0.0.2), para scripts por host também sem TLS.
+    """
+
+    def __init__(self, hostnames: Iterable[str], bind_host: str = '127.0.0.1',
+                 imap_ssl_port: int = 0, imap_port: int = 0, smtp_ssl_port: int = 0, smtp_port: int = 0,
+                 ca: Optional[TestCA] = None):
+        self.hostnames = [name.lower() for name in hostnames]
+        self.bind_host = bind_host
+        self.ports = {'imap_ssl': imap_ssl_port, 'imap': imap_port, 'smtp_ssl': smtp_ssl_port, 'smtp': smtp_port}
+        self.ca = ca or TestCA(self.hostnames)
+        self.ssl_context = self.ca.server_context()
+        self.ssl_context.sni_callback = self._record_sni
+        self.accounts: Dict[str, str] = {}
+        self.mailboxes: Dict[str, List[str]] = {}
+        self.behaviors: Dict[str, Behavior] = {}
+        self.default_behavior = Behavior()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._sni: Dict[int, str] = {}
+        self._active_sessions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._servers: List[asyncio.AbstractServer] = []
+        self._writers: set = set()
+        self._thread: Optional[threading.Thread] = None
+
+    def _record_sni(self, ssl_object, server_name: Optional[str], context) -> None:
+        if server_name:
+            self._sni[id(ssl_object)] = server_name.lower()
+
+    def add_account(self, email: str, password: str,
+                    mailboxes: Iterable[str] = ('INBOX', 'Sent', 'Drafts', 'Trash')) -> None:
+        email = email.strip().lower()
+        self.accounts[email] = password
+        self.mailboxes[email] = list(mailboxes)
+
+    def script(self, target: str, **behavior: Any) -> Behavior:
+        """
+        Programa o comportamento de uma conta (email), de um host (SNI) ou de todos ('*')
+        """
+        scripted = Behavior(**behavior)
+        if target == ANY_HOST:
+            self.default_behavior = scripted
+        else:
+            self.behaviors[target.strip().lower()] = scripted
+        return scripted
+
+    def behavior_for(self, hostname: Optional[str], account: Optional[str]) -> Behavior:
+        # Conta tem precedência sobre host, que tem precedência sobre o padrão
+        if account and account in self.behaviors:
+            return self.behaviors[account]
+        if hostname and hostname in self.behaviors:
+            return self.behaviors[hostname]
+        return self.default_behavior
+
+    def _count(self, protocol: str, counter: str) -> None:
+        with self._lock:
+            counters = self.stats.setdefault(protocol, {})
+            counters[counter] = counters.get(counter, 0) + 1
+
+    def _sessions(self, account: str) -> int:
+        with self._lock:
+            return self._active_sessions.get(account, 0)
+
+    def _open_session(self, account: str) -> None:
+        with self._lock:
+            self._active_sessions[account] = self._active_sessions.get(account, 0) + 1
+
+    def _close_session(self, account: str) -> None:
+        with self._lock:
+            self._active_sessions[account] -= 1
+
+    def _handler(self, session_class, tls: bool):
+        async def handle(reader, writer):
+            self._writers.add(writer)
+            try:
+                await session_class(self, reader, writer, tls).serve()
+            finally:
+                self._writers.discard(writer)
+        return handle
+
+    async def _listen(self) -> None:
+        listeners = {
+            'imap_ssl': (_IMAPSession, True),
+            'imap': (_IMAPSession, False),
+            'smtp_ssl': (_SMTPSession, True),
+            'smtp': (_SMTPSession, False),
+        }
+        for name, (session_class, tls) in listeners.items():
+            server = await asyncio.start_server(
+                self._handler(session_class, tls), self.bind_host, self.ports[name],
+                ssl=self.ssl_context if tls else None)
+            self.ports[name] = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+
+    def start(self) -> Dict[str, int]:
+        """
+        Inicia o servidor e retorna as portas efetivas
+        """
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._listen())
+            ready.set()
+            self._loop.run_forever()
+            for server in self._servers:
+                server.close()
+            # Derruba as sessões que o cliente deixou abertas e espera que terminem
+            for writer in list(self._writers):
+                writer.transport.abort()
+            tasks = asyncio.all_tasks(self._loop)
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='fake-mail-server', daemon=True)
+        self._thread.start()
+        ready.wait()
+        logger.info(f"Servidor IMAP/SMTP de teste ouvindo em {self.bind_host}: {self.ports}")
+        return dict(self.ports)
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._loop = None
+        self._thread = None
+        self._servers = []
+
+    def __enter__(self) -> 'FakeMailServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def install_dns(self, dns_server) -> None:
+        """
+        Aponta os hosts deste servidor para bind_host no StubDNSServer
+        """
+        for hostname in self.hostnames:
+            dns_server.add_records(hostname, 'A', [self.bind_host])
+
+    def connection_settings(self, imap_host: str, smtp_host: str) -> Dict[str, Any]:
+        """
+        Campos de /api/test-connection que apontam para as portas deste servidor
+        (IMAP com TLS implícito, SMTP com STARTTLS)
+        """
+        return {
+            'imapHost': imap_host, 'imapPort': self.ports['imap_ssl'], 'imapSecure': True,
+            'smtpHost': smtp_host, 'smtpPort': self.ports['smtp'], 'smtpSecure': False,
+            'smtpStartTLS': True, 'autodetect': False
+        }
+
+
+def provider_hosts(domain: str) -> Tuple[str, str]:
+    """
+    Hosts IMAP e SMTP de um domínio no registro offline (ex.: 'gmail.com')
+    """
+    from provider_registry import get_registry
+    registry = get_registry()
+    verdict = registry.lookup_domain(domain)
+    settings = registry.settings_for(verdict['provider']) if verdict else None
+    if settings is None:
+        raise KeyError(f'Domínio sem provedor conhecido: {domain}')
+    return settings['imap']['host'], settings['smtp']['host']
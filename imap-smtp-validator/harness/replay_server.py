@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor que reproduz transcrições IMAP/SMTP gravadas (probe_transcripts)
+
+Cada transcrição ganha uma porta própria e é reproduzida do início a cada
+conexão: as linhas do servidor são enviadas com os intervalos gravados
+(divididos por speed; speed=0 envia sem esperar), e cada linha do cliente
+gravada corresponde a uma linha lida do cliente real, cujo conteúdo é
+ignorado. No IMAP, as tags gravadas são trocadas pelas tags que o cliente
+usou; eventos 'tls' fazem o STARTTLS, e transcrições com TLS implícito são
+servidas com o certificado da CA de teste (harness/fake_mail_server.py).
+
+Como o servidor não interpreta comandos, a transcrição deve ser reproduzida
+para o mesmo caminho de código que a gravou (ex.: test_imap_connection).
+
+Uso:
+    with StubDNSServer() as dns_server, ReplayServer([load_transcript(path)], speed=0) as replay:
+        replay.install_dns(dns_server)
+        host, port, secure = replay.endpoint(0)
+"""
+
+import ssl
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from harness.fake_mail_server import TestCA
+from probe_transcripts import CLIENT, EOF, REDACTED, SERVER, TLS
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.replay-server')
+
+CLIENT_READ_TIMEOUT = 30.0  # segundos esperando uma linha do cliente
+
+
+class ReplayServer:
+    """
+    Reprodutor de transcrições que roda em uma thread própria
+    """
+
+    def __init__(self, transcripts: Iterable[Dict[str, Any]], speed: float = 1.0,
+                 bind_host: str = '127.0.0.1', ca: Optional[TestCA] = None):
+        self.transcripts = list(transcripts)
+        self.speed = speed
+        self.bind_host = bind_host
+        self.ca = ca or TestCA({t['host'] for t in self.transcripts})
+        self.ssl_context = self.ca.server_context()
+        self.ports: List[int] = []
+        self.stats = {'connections': 0, 'completed': 0, 'diverged': 0}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._servers: List[asyncio.AbstractServer] = []
+        self._writers: set = set()
+        self._thread: Optional[threading.Thread] = None
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self.stats[counter] += 1
+
+    def _delay(self, seconds: float) -> float:
+        return seconds / self.speed if self.speed > 0 else 0.0
+
+    async def _replay(self, transcript: Dict[str, Any], reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> bool:
+        """
+        Reproduz uma transcrição; retorna False se o cliente saiu do roteiro
+        """
+        imap = transcript['protocol'] == 'imap'
+        tags: Dict[str, str] = {}
+        previous_t = 0.0
+        for event in transcript['events']:
+            direction = event['dir']
+            delay = self._delay(event['t'] - previous_t)
+            previous_t = event['t']
+
+            if direction == SERVER:
+                # O intervalo desde o evento anterior é o tempo de resposta gravado
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                data = event['data']
+                if imap:
+                    tag, space, rest = data.partition(' ')
+                    if space and tag in tags:
+                        data = f'{tags[tag]} {rest}'
+                writer.write(data.encode('latin-1'))
+                await writer.drain()
+            elif direction == CLIENT:
+                line = await asyncio.wait_for(reader.readline(), CLIENT_READ_TIMEOUT)
+                if not line:
+                    return False
+                recorded = event['data'].split(None, 1)
+                actual = line.decode('latin-1').split(None, 1)
+                if imap and recorded and actual and recorded[0] != REDACTED:
+                    tags[recorded[0]] = actual[0]
+            elif direction == TLS:
+                await writer.start_tls(self.ssl_context)
+            elif direction == EOF:
+                break
+        return True
+
+    def _handler(self, transcript: Dict[str, Any]):
+        async def handle(reader, writer):
+            self._count('connections')
+            self._writers.add(writer)
+            try:
+                completed = await self._replay(transcript, reader, writer)
+            except (ConnectionError, asyncio.TimeoutError, ssl.SSLError) as e:
+                logger.debug(f"Reprodução de {transcript['host']} interrompida: {e}")
+                completed = False
+            finally:
+                self._writers.discard(writer)
+            self._count('completed' if completed else 'diverged')
+            if not writer.transport.is_closing():
+                writer.close()
+        return handle
+
+    async def _listen(self) -> None:
+        for transcript in self.transcripts:
+            tls = self.ssl_context if transcript['tls'] == 'implicit' else None
+            server = await asyncio.start_server(self._handler(transcript), self.bind_host, 0, ssl=tls)
+            self.ports.append(server.sockets[0].getsockname()[1])
+            self._servers.append(server)
+
+    def start(self) -> List[int]:
+        """
+        Inicia o servidor e retorna a porta de cada transcrição, na ordem recebida
+        """
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._listen())
+            ready.set()
+            self._loop.run_forever()
+            for server in self._servers:
+                server.close()
+            # Derruba as sessões que o cliente deixou abertas e espera que terminem
+            for writer in list(self._writers):
+                writer.transport.abort()
+            tasks = asyncio.all_tasks(self._loop)
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='replay-server', daemon=True)
+        self._thread.start()
+        ready.wait()
+        logger.info(f"Reproduzindo {len(self.transcripts)} transcrições em {self.bind_host} "
+                    f"(velocidade {self.speed or 'sem espera'})")
+        return list(self.ports)
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._loop = None
+        self._thread = None
+        self._servers = []
+
+    def __enter__(self) -> 'ReplayServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def install_dns(self, dns_server) -> None:
+        """
+        Aponta os hosts gravados para bind_host no StubDNSServer
+        """
+        for host in {t['host'] for t in self.transcripts}:
+            dns_server.add_records(host, 'A', [self.bind_host])
+
+    def endpoint(self, index: int) -> Tuple[str, int, bool]:
+        """
+        Host gravado, porta local e se a conexão começa com TLS, da transcrição de índice index
+        """
+        transcript = self.transcripts[index]
+        return transcript['host'], self.ports[index], transcript['tls'] == 'implicit'
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor DNS local (UDP) com zona estática
+
+Responde consultas A, AAAA, MX, SRV e TXT a partir de um dicionário em memória,
+com latência artificial opcional, para que o pool de resolução possa ser
+testado e medido sem rede. Nomes desconhecidos recebem NXDOMAIN; nomes
+conhecidos sem o tipo pedido recebem uma resposta vazia (NoAnswer).
+
+Uso:
+    server = StubDNSServer({'example.com': {'MX': ['10 mx.example.com.'],
+                                            'A': ['192.0.2.10']}})
+    host, port = server.start()
+    ...
+    server.stop()
+"""
+
+import asyncio
+import logging
+import threading
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+from typing import Dict, Any, List, Optional, Tuple
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.stub-dns')
+
+# Zona: nome -> tipo -> lista de valores em formato texto
+Zone = Dict[str, Dict[str, List[str]]]
+
+
+def _normalize(name: str) -> str:
+    return name.strip().lower().rstrip('.')
+
+
+class _StubDNSProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, server: 'StubDNSServer'):
+        self.server = server
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        try:
+            query = dns.message.from_wire(data)
+        except Exception as e:
+            logger.debug(f"Consulta DNS inválida de {addr}: {e}")
+            return
+        response = self.server.answer(query)
+        if self.server.latency > 0:
+            asyncio.get_running_loop().call_later(
+                self.server.latency, self._send, response.to_wire(), addr)
+        else:
+            self._send(response.to_wire(), addr)
+
+    def _send(self, wire: bytes, addr: Tuple[str, int]):
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(wire, addr)
+
+
+class StubDNSServer:
+    """
+    Servidor DNS de teste que roda em uma thread própria
+    """
+
+    def __init__(self, zone: Optional[Zone] = None, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, ttl: int = 300):
+        self.zone: Zone = {}
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.ttl = ttl
+        self.queries = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._thread: Optional[threading.Thread] = None
+        for name, records in (zone or {}).items():
+            for rdtype, values in records.items():
+                self.add_records(name, rdtype, values)
+
+    def add_records(self, name: str, rdtype: str, values: List[str]) -> None:
+        """
+        Adiciona registros à zona (ex.: ('example.com', 'MX', ['10 mx.example.com.']))
+        """
+        self.zone.setdefault(_normalize(name), {}).setdefault(rdtype.upper(), []).extend(values)
+
+    def answer(self, query: dns.message.Message) -> dns.message.Message:
+        """
+        Monta a resposta para uma consulta
+        """
+        self.queries += 1
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+        for question in query.question:
+            name = _normalize(question.name.to_text())
+            records = self.zone.get(name)
+            if records is None:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+                continue
+            rdtype = dns.rdatatype.to_text(question.rdtype)
+            values = records.get(rdtype)
+            if values:
+                response.answer.append(
+                    dns.rrset.from_text_list(question.name, self.ttl, 'IN', rdtype, values))
+        return response
+
+    def start(self) -> Tuple[str, int]:
+        """
+        Inicia o servidor e retorna o endereço efetivo (host, porta)
+        """
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            transport, _ = self._loop.run_until_complete(
+                self._loop.create_datagram_endpoint(
+                    lambda: _StubDNSProtocol(self), local_addr=(self.host, self.port)))
+            self._transport = transport
+            self.port = transport.get_extra_info('sockname')[1]
+            ready.set()
+            self._loop.run_forever()
+            transport.close()
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='stub-dns', daemon=True)
+        self._thread.start()
+        ready.wait()
+        logger.info(f"Servidor DNS de teste ouvindo em {self.host}:{self.port}")
+        return self.host, self.port
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._loop = None
+        self._thread = None
+
+    def __enter__(self) -> 'StubDNSServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+def synthetic_zone(domains: int, suffix: str = 'bench.test') -> Zone:
+    """
+    Gera uma zona com N domínios, cada um com MX, A e AAAA
+    """
+    zone: Zone = {}
+    for i in range(domains):
+        name = f'd{i}.{suffix}'
+        zone[name] = {
+            'MX': [f'10 mx.{name}.'],
+            'A': [f'192.0.2.{i % 254 + 1}'],
+            'AAAA': [f'2001:db8::{i % 65535 + 1:x}']
+        }
+        zone[f'mx.{name}'] = {'A': [f'198.51.100.{i % 254 + 1}']}
+    return zone
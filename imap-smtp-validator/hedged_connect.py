@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estabelecimento de conexão com tentativas extras (hedging)
+
+A conexão TCP usa Happy Eyeballs com o atraso entre tentativas derivado do
+p95 de connect do host. Cada etapa é cronometrada contra o próprio p95: se o
+connect (ou, com TLS direto, o handshake a partir do seu início) passar dele,
+uma segunda tentativa começa por outro endereço resolvido (ou o mesmo, se só
+houver um) e vence a que terminar primeiro. Vale também para conexões sem
+TLS (STARTTLS e texto puro), em que só há o connect. Só essa tentativa extra
+consome o orçamento de hedges: o escalonamento do Happy Eyeballs nunca espera
+por ele. Login nunca é repetido.
+"""
+
+import os
+import ssl
+import time
+import errno
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict, Any, List, Optional, Sequence
+
+from adaptive_timeouts import stage_timeout
+from happy_eyeballs import (
+    HE_ATTEMPT_DELAY,
+    HE_MIN_ATTEMPT_DELAY,
+    HappyEyeballsError,
+    connect_happy_eyeballs,
+    family_name,
+    interleave_addresses,
+)
+from latency_stats import hedge_budget, hedge_delay, record_latency
+from probe_context import resource_tracker
+from probe_watchdog import abort_socket
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.hedged-connect')
+
+# Configurações
+HEDGE_MAX_WORKERS = int(os.environ.get('HEDGE_MAX_WORKERS', '32'))
+HEDGE_MAX_ATTEMPT_DELAY = 2.0  # segundos; limite para o atraso derivado do p95
+
+_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='hedge')
+_client_context: Optional[ssl.SSLContext] = None
+
+
+def client_tls_context() -> ssl.SSLContext:
+    """
+    Contexto TLS equivalente ao padrão de imaplib/smtplib (sem verificação de
+    certificado), para que um socket negociado antecipadamente se comporte como um novo
+
+    Criado uma vez e compartilhado: sem verificação não há motivo para
+    carregar o repositório de CAs do sistema (~45ms de CPU) a cada conexão.
+    """
+    global _client_context
+    if _client_context is None:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        _client_context = context
+    return _client_context
+
+
+def reset_after_fork() -> None:
+    """
+    Recria o pool de threads, que não sobrevive ao fork (chamado após o fork)
+    """
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='hedge')
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.monotonic() - start) * 1000, 2)
+
+
+class _AttemptGroup:
+    """
+    Sockets TLS das tentativas de um mesmo establish_connection
+
+    Cada socket é registrado na sondagem da requisição (cancelamento e vigia)
+    antes do handshake, que roda numa thread do pool. Escolhida a vencedora,
+    os sockets das demais são derrubados: o handshake delas termina na hora em
+    vez de prender a thread até o timeout.
+    """
+
+    __slots__ = ('_track', '_sockets', '_settled', '_lock')
+
+    def __init__(self, track: Callable[[Any], None]):
+        self._track = track
+        self._sockets: List[socket.socket] = []
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def register(self, sock: socket.socket) -> None:
+        self._track(sock)
+        with self._lock:
+            self._sockets.append(sock)
+            settled = self._settled
+        if settled:
+            abort_socket(sock)
+
+    @property
+    def settled(self) -> bool:
+        return self._settled
+
+    def settle(self, winner: Optional[socket.socket]) -> None:
+        with self._lock:
+            self._settled = True
+            losers = [sock for sock in self._sockets if sock is not winner]
+        for sock in losers:
+            abort_socket(sock)
+
+
+def _attempt(host: str, port: int, addresses: List[str], deadline: float,
+             timeouts: Dict[str, float], group: Optional[_AttemptGroup] = None,
+             handshake_started: Optional[Future] = None) -> Dict[str, Any]:
+    """
+    Uma tentativa completa: Happy Eyeballs e, se for o caso, handshake TLS
+    (com o socket registrado em group antes de negociar e o instante de início
+    do handshake publicado em handshake_started)
+    """
+    delay = hedge_delay(host, 'connect')
+    attempt_delay = HE_ATTEMPT_DELAY if delay is None else \
+        min(HEDGE_MAX_ATTEMPT_DELAY, max(HE_MIN_ATTEMPT_DELAY, delay))
+
+    start = time.monotonic()
+    try:
+        sock, address, attempts = connect_happy_eyeballs(
+            addresses, port, max(0.0, min(deadline - start, timeouts['connect'])), attempt_delay)
+    except OSError:
+        # Falhas e timeouts também entram no histórico: só com os sucessos, o
+        # p99 de um host que vive estourando o prazo nunca subiria
+        record_latency(host, 'connect', _elapsed_ms(start))
+        raise
+    connect_ms = _elapsed_ms(start)
+    record_latency(host, 'connect', connect_ms)
+
+    result = {
+        'socket': sock,
+        'address': address,
+        'family': family_name(sock.family),
+        'attempts': attempts,
+        'connect_ms': connect_ms,
+        'timeouts': timeouts
+    }
+    if 'handshake' in timeouts:
+        start = time.monotonic()
+        try:
+            sock.settimeout(max(0.001, min(deadline - start, timeouts['handshake'])))
+            tls_sock = client_tls_context().wrap_socket(sock, server_hostname=host,
+                                                        do_handshake_on_connect=False)
+        except Exception:
+            sock.close()
+            raise
+        try:
+            if group is not None:
+                group.register(tls_sock)
+            if handshake_started is not None:
+                handshake_started.set_result(start)
+            tls_sock.do_handshake()
+        except Exception:
+            tls_sock.close()
+            # Uma tentativa derrubada por ter perdido não diz nada sobre o host
+            if group is None or not group.settled:
+                record_latency(host, 'handshake', _elapsed_ms(start))
+            raise
+        result['socket'] = tls_sock
+        result['handshake_ms'] = _elapsed_ms(start)
+        record_latency(host, 'handshake', result['handshake_ms'])
+    return result
+
+
+def _stage_overdue(primary: Future, handshake_started: Optional[Future], connect_due: Optional[float],
+                   handshake_p95: Optional[float], deadline: float) -> bool:
+    """
+    Espera a tentativa principal até a etapa em andamento passar do seu p95
+
+    O connect é cronometrado desde o início (connect_due); quando o handshake
+    começa, o cronômetro passa a ser o p95 do handshake a partir desse instante.
+
+    Returns:
+        True se a etapa em andamento passou do p95; False se a tentativa
+        terminou antes, se não há p95 para a etapa ou se o prazo acabou
+    """
+    while True:
+        if handshake_started is not None and handshake_started.done():
+            due = handshake_started.result() + handshake_p95 if handshake_p95 is not None else None
+            watched = [primary]
+        else:
+            due = connect_due
+            watched = [primary] + ([handshake_started] if handshake_started is not None else [])
+        if due is None and len(watched) == 1:
+            return False
+        limit = deadline if due is None else min(due, deadline)
+        done, _ = wait(watched, timeout=max(0.0, limit - time.monotonic()), return_when=FIRST_COMPLETED)
+        if primary in done:
+            return False
+        if not done:
+            return due is not None and due <= deadline
+        # O handshake começou antes do p95 do connect: troca de cronômetro
+
+
+def _discard(future: Future) -> None:
+    """
+    Fecha o socket de uma tentativa que terminou depois da vencedora
+    """
+    if not future.cancelled() and future.exception() is None:
+        try:
+            future.result()['socket'].close()
+        except Exception:
+            pass
+
+
+def establish_connection(host: str, port: int, addresses: Sequence[str],
+                         timeout: Optional[float] = None, tls: bool = False) -> Dict[str, Any]:
+    """
+    Conecta ao host (e negocia TLS direto, se tls=True) com hedging
+
+    Os timeouts de connect e handshake são adaptativos (adaptive_timeouts);
+    timeout, se informado, limita cada etapa e o total.
+
+    Returns:
+        Dicionário com o socket conectado, endereço, família, tentativas,
+        tempos de cada etapa e se a tentativa vencedora foi um hedge
+
+    Raises:
+        HappyEyeballsError, ssl.SSLError ou socket.timeout da tentativa que falhou
+    """
+    hedge_budget.record_attempt()
+    timeouts = {'connect': stage_timeout(host, 'connect', timeout)}
+    if tls:
+        timeouts['handshake'] = stage_timeout(host, 'handshake', timeout)
+    budget = sum(timeouts.values()) if timeout is None else min(timeout, sum(timeouts.values()))
+    deadline = time.monotonic() + budget
+    ordered = interleave_addresses(addresses)
+
+    connect_p95 = hedge_delay(host, 'connect')
+    handshake_p95 = hedge_delay(host, 'handshake') if tls else None
+    # Sinaliza o fim do connect da tentativa principal (e o início do handshake)
+    handshake_started = Future() if tls else None
+    connect_due = time.monotonic() + connect_p95 if connect_p95 is not None else None
+
+    group = _AttemptGroup(resource_tracker())
+    primary = _executor.submit(_attempt, host, port, ordered, deadline, timeouts, group, handshake_started)
+    futures = [primary]
+
+    if _stage_overdue(primary, handshake_started, connect_due, handshake_p95, deadline) \
+            and hedge_budget.try_acquire():
+        stage = 'handshake' if handshake_started is not None and handshake_started.done() else 'connect'
+        logger.debug(f"Etapa {stage} com {host}:{port} passou do p95, iniciando hedge")
+        # Outro endereço primeiro, quando houver
+        futures.append(_executor.submit(_attempt, host, port, ordered[1:] + ordered[:1],
+                                        deadline, timeouts, group))
+
+    winner = None
+    error = None
+    pending = set(futures)
+    while pending and winner is None:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                             return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if winner is None:
+                winner = result
+                winner['hedged'] = future is not primary
+            else:
+                result['socket'].close()
+
+    group.settle(winner['socket'] if winner is not None else None)
+    for future in pending:
+        future.add_done_callback(_discard)
+
+    if winner is None:
+        if error is not None:
+            raise error
+        raise HappyEyeballsError(errno.ETIMEDOUT, 'Tempo limite excedido', [])
+
+    if winner['hedged']:
+        hedge_budget.record_win()
+    winner['hedge_issued'] = len(futures) > 1
+    return winner
+
@@ -7,14 +7,17 @@ de conexão IMAP, fornecendo informações mais detalhadas e orientações espec
 from flask import Blueprint, request, jsonify
 from typing import Dict, Any
 
-import imaplib
-import ssl
-import socket
 import logging
 import time
+import os
+
+from admission_control import admission_controlled
+from rate_limit import rate_limited
+from cache_backend import MISS, get_cache
+from probe_context import probe_stage, track_resource
+from probe_watchdog import PROBE_WATCHDOG_MAX, watch_probe, watchdog_result
 
 from imap_error_diagnostic import (
-    diagnosticar_erro_imap,
     identificar_provedor,
     classificar_erro_imap,
     sanitizar_erro_imap
@@ -26,6 +29,11 @@ imap_diagnostic_bp = Blueprint('imap_diagnostic', __name__)
 # Configurar logger
 logger = logging.getLogger('emailmax-validator.imap-diagnostic-endpoints')
 
+# Capabilities mudam raramente; o resultado é compartilhado entre os workers
+CACHE_CAPABILITIES_TTL = int(os.environ.get('CACHE_CAPABILITIES_TTL', '3600'))  # segundos
+# Prazo total do teste detalhado (conexão, login e listagem de pastas)
+DIAGNOSTIC_PROBE_BUDGET = float(os.environ.get('DIAGNOSTIC_PROBE_BUDGET', str(PROBE_WATCHDOG_MAX)))  # segundos
+
 # Função auxiliar para realizar testes específicos de IMAP
 def teste_imap_especifico(email: str, password: str, host: str, port: int, 
                          secure: bool = True, test_type: str = 'login') -> Dict[str, Any]:
@@ -55,15 +63,17 @@ def teste_imap_especifico(email: str, password: str, host: str, port: int,
         }
     }
     
+    from probe_clients import open_imap_client
+
     try:
         # Medir tempo de resposta inicial
         start_time = time.time()
         
-        # Inicializar conexão IMAP com medição de tempo
-        if secure:
-            imap = imaplib.IMAP4_SSL(host, port=port, timeout=30)
-        else:
-            imap = imaplib.IMAP4(host, port=port, timeout=30)
+        # Inicializar conexão IMAP com medição de tempo (o socket fica registrado no vigia)
+        probe_stage('connect')
+        imap = open_imap_client(host, port, secure, 30)
+        track_resource(imap)
+        probe_stage('login')
             
         # Medir tempo de handshake
         handshake_time = time.time() - start_time
@@ -155,8 +165,7 @@ def teste_imap_especifico(email: str, password: str, host: str, port: int,
         total_time = time.time() - start_time
         result['connection_info']['total_time_ms'] = round(total_time * 1000, 2)
         
-        # Diagnóstico detalhado em caso de erro
-        diagnostico = diagnosticar_erro_imap(e, host, email)
+        # Diagnóstico detalhado em caso de erro (sanitizar_erro_imap já diagnostica)
         result['diagnostics'] = sanitizar_erro_imap(e, host, email)
         result['message'] = result['diagnostics']['message']
         
@@ -164,6 +173,8 @@ def teste_imap_especifico(email: str, password: str, host: str, port: int,
 
 # Endpoint para diagnóstico detalhado de IMAP
 @imap_diagnostic_bp.route('/api/imap-diagnostic', methods=['POST'])
+@rate_limited(per_account=True)
+@admission_controlled()
 def imap_diagnostic():
     """
     Endpoint para diagnóstico detalhado de conexões IMAP.
@@ -197,10 +208,14 @@ def imap_diagnostic():
         # Converter port para inteiro
         port = int(port)
         
-        # Executar teste específico
-        result = teste_imap_especifico(
-            email, password, host, port, secure, test_type
-        )
+        # Executar teste específico (vigiado: um servidor que trava não prende o worker)
+        with watch_probe('imap-diagnostic', host, port, DIAGNOSTIC_PROBE_BUDGET) as watch:
+            result = teste_imap_especifico(
+                email, password, host, port, secure, test_type
+            )
+        if watch is not None and watch.forced:
+            result['diagnostics'] = watchdog_result(watch)
+            result['message'] = result['diagnostics']['message']
         
         # Adicionar informações gerais ao resultado
         result['email'] = email
@@ -248,6 +263,8 @@ def imap_diagnostic():
 
 # Endpoint para verificar recursos específicos de um servidor
 @imap_diagnostic_bp.route('/api/imap-server-capabilities', methods=['POST'])
+@rate_limited()
+@admission_controlled()
 def imap_server_capabilities():
     """
     Verifica recursos/capabilities suportados por um servidor IMAP
@@ -266,6 +283,11 @@ def imap_server_capabilities():
         host = data['host']
         port = int(data.get('port', 993))
         secure = data.get('secure', True)
+
+        cache_key = f"{host.lower()}:{port}:{'ssl' if secure else 'plain'}"
+        cached = get_cache().get('capabilities', cache_key)
+        if cached is not MISS:
+            return jsonify(dict(cached, cached=True))
         
         result = {
             'success': False,
@@ -280,6 +302,7 @@ def imap_server_capabilities():
         # Medir tempo de resposta
         start_time = time.time()
         
+        import imaplib
         try:
             # Conectar ao servidor
             if secure:
@@ -327,6 +350,9 @@ def imap_server_capabilities():
             
         # Calcular tempo total
         result['connection_time_ms'] = round((time.time() - start_time) * 1000, 2)
+
+        if result['success']:
+            get_cache().set('capabilities', cache_key, result, CACHE_CAPABILITIES_TTL)
             
         return jsonify(result)
         
@@ -339,5 +365,8 @@ def imap_server_capabilities():
 
 # Função para registrar os blueprints no app Flask
 def register_diagnostic_endpoints(app):
+    # Evita registro duplicado se a fábrica for chamada de novo para o mesmo app
+    if imap_diagnostic_bp.name in app.blueprints:
+        return
     app.register_blueprint(imap_diagnostic_bp)
     logger.info("Endpoints de diagnóstico IMAP registrados")
\ No newline at end of file
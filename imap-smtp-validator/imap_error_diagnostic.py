@@ -7,15 +7,21 @@ Este módulo fornece ferramentas para diagnóstico detalhado de erros IMAP,
 oferecendo mensagens mais amigáveis e soluções específicas para cada tipo de erro.
 """
 
+import os
 import re
 import logging
-import imaplib
 import socket
 import ssl
+from functools import lru_cache
+
+from provider_registry import get_registry
 
 # Configurar logger
 logger = logging.getLogger('emailmax-validator.imap-diagnostic')
 
+# Configurações
+IMAP_DIAGNOSTIC_CACHE_SIZE = int(os.environ.get('IMAP_DIAGNOSTIC_CACHE_SIZE', '4096'))
+
 # Catálogo de erros IMAP comuns por provedor
 GMAIL_ERRORS = {
     "AUTHENTICATE failed": {
@@ -226,47 +232,113 @@ ERROR_PATTERNS = [
     (r"(?i)banned", "banned")
 ]
 
-def identificar_provedor(host, email):
+# Provedores com catálogo de erros específico
+PROVEDORES_COM_CATALOGO = ("gmail", "outlook", "yahoo")
+
+# Diagnóstico usado quando nenhum catálogo reconhece o erro
+DIAGNOSTICO_NAO_CLASSIFICADO = {
+    "causa": "Erro IMAP não classificado",
+    "solucao": [
+        "Verifique se as credenciais estão corretas",
+        "Confirme as configurações do servidor IMAP (host, porta, SSL/TLS)",
+        "Verifique sua conexão com a internet"
+    ]
+}
+
+_DIGITOS_RE = re.compile(r'\d+')
+
+# Função para compilar um padrão de ERROR_PATTERNS para o texto já em minúsculas
+def _compilar_padrao(pattern):
+    """
+    Padrões sem escapes são só literais e alternativas: em minúsculas e sem
+    IGNORECASE, o re usa a busca rápida por literal, bem mais barata que a
+    comparação sem distinção de caixa. Os demais mantêm IGNORECASE.
+    """
+    padrao = pattern.replace('(?i)', '', 1)
+    if '\\' in padrao:
+        return re.compile(padrao, re.IGNORECASE)
+    return re.compile(padrao.lower())
+
+# Tabela de padrões compilada uma única vez, na ordem (vence o primeiro que ocorre)
+_PADROES_ERRO_COMPILADOS = tuple(
+    (_compilar_padrao(pattern), error_type) for pattern, error_type in ERROR_PATTERNS)
+
+# Chaves de cada catálogo em minúsculas, seguidas das do genérico, na ordem de
+# busca do diagnóstico (a primeira que aparece como substring vence)
+_CATALOGOS_COMPILADOS = {}
+for _provedor, _catalogo in (("gmail", GMAIL_ERRORS), ("outlook", OUTLOOK_ERRORS),
+                             ("yahoo", YAHOO_ERRORS), ("generic", GENERIC_ERRORS)):
+    _entradas = list(_catalogo.items())
+    if _provedor != "generic":
+        _entradas += list(GENERIC_ERRORS.items())
+    _CATALOGOS_COMPILADOS[_provedor] = tuple((chave.lower(), info) for chave, info in _entradas)
+
+# Se nenhum padrão ou chave de catálogo contém dígitos, trocar sequências de
+# dígitos (portas, IPs, códigos) por '0' não muda a classificação e deixa o cache
+# reaproveitar mensagens que só diferem nesses valores
+_NORMALIZAR_DIGITOS = not any(
+    any(c.isdigit() for c in texto)
+    for texto in [pattern for pattern, _ in ERROR_PATTERNS] +
+    [chave for catalogo in (GMAIL_ERRORS, OUTLOOK_ERRORS, YAHOO_ERRORS, GENERIC_ERRORS) for chave in catalogo]
+)
+
+# Função para normalizar a mensagem de erro usada como chave do cache
+def _normalizar_mensagem(erro_str):
+    mensagem = erro_str.lower()
+    return _DIGITOS_RE.sub('0', mensagem) if _NORMALIZAR_DIGITOS else mensagem
+
+def identificar_provedor(host, email, resolucao=None):
     """
     Identifica o provedor de email com base no host ou endereço de email
+
+    Se houver um contexto de resolução do domínio (DomainResolution), seu
+    veredito é reaproveitado em vez de uma nova consulta.
     """
-    host = host.lower()
+    registro = get_registry()
     domain = email.split('@')[-1].lower() if email else ""
-    
-    if "gmail" in host or "google" in host or "gmail" in domain:
-        return "gmail"
-    elif "outlook" in host or "office365" in host or "hotmail" in host or "live" in host or any(d in domain for d in ["outlook.com", "hotmail.com", "live.com", "office365.com", "microsoft.com"]):
-        return "outlook"
-    elif "yahoo" in host or "yahoo" in domain:
-        return "yahoo"
-    
+
+    veredito = registro.lookup_host(host) if host else None
+    if not veredito and resolucao is not None:
+        veredito = resolucao.verdict
+    elif not veredito and domain:
+        veredito = registro.lookup_domain(domain)
+
+    if veredito and veredito["provider"] in PROVEDORES_COM_CATALOGO:
+        return veredito["provider"]
+
     return "generic"
 
-def classificar_erro_imap(erro, host=None, email=None):
+@lru_cache(maxsize=IMAP_DIAGNOSTIC_CACHE_SIZE)
+def _tipo_erro(classe_erro, mensagem):
     """
-    Classifica um erro IMAP e retorna o tipo de erro
+    Tipo de erro para a classe do erro e a mensagem normalizada
     """
-    erro_str = str(erro).lower()
-    
     # Verifica padrões de erro conhecidos
-    for pattern, error_type in ERROR_PATTERNS:
-        if re.search(pattern, erro_str, re.IGNORECASE):
+    for regex, error_type in _PADROES_ERRO_COMPILADOS:
+        if regex.search(mensagem):
             return error_type
     
     # Se nenhum padrão específico for encontrado
-    if isinstance(erro, imaplib.IMAP4.error):
+    import imaplib
+    if issubclass(classe_erro, imaplib.IMAP4.error):
         return "imap_protocol"
-    elif isinstance(erro, ssl.SSLError):
+    elif issubclass(classe_erro, ssl.SSLError):
         return "ssl_error"
-    elif isinstance(erro, socket.timeout):
+    elif issubclass(classe_erro, socket.timeout):
         return "timeout"
-    elif isinstance(erro, socket.error):
+    elif issubclass(classe_erro, socket.error):
         return "socket_error"
-    elif isinstance(erro, ConnectionRefusedError):
+    elif issubclass(classe_erro, ConnectionRefusedError):
         return "connection_refused"
     
     return "unknown"
 
+def classificar_erro_imap(erro, host=None, email=None):
+    """
+    Classifica um erro IMAP e retorna o tipo de erro
+    """
+    return _tipo_erro(erro.__class__, _normalizar_mensagem(str(erro)))
+
 def obter_catalogo_provedor(provedor):
     """
     Retorna o catálogo de erros para um provedor específico
@@ -280,7 +352,34 @@ def obter_catalogo_provedor(provedor):
     
     return GENERIC_ERRORS
 
-def diagnosticar_erro_imap(erro, host=None, email=None):
+@lru_cache(maxsize=IMAP_DIAGNOSTIC_CACHE_SIZE)
+def _entrada_catalogo(mensagem, provedor):
+    """
+    Entrada do catálogo do provedor (ou, na falta, do genérico) para a mensagem normalizada
+    """
+    for chave, info in _CATALOGOS_COMPILADOS[provedor]:
+        if chave in mensagem:
+            return info
+    return DIAGNOSTICO_NAO_CLASSIFICADO
+
+def get_diagnostic_cache_stats():
+    """
+    Retorna estatísticas dos caches de classificação de erros IMAP
+    """
+    stats = {}
+    for nome, funcao in (('classificacao', _tipo_erro), ('catalogo', _entrada_catalogo)):
+        info = funcao.cache_info()
+        total = info.hits + info.misses
+        stats[nome] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'max_size': info.maxsize,
+            'hit_rate': round(info.hits / total, 4) if total else 0.0
+        }
+    return stats
+
+def diagnosticar_erro_imap(erro, host=None, email=None, resolucao=None):
     """
     Diagnostica um erro IMAP e retorna informações detalhadas e soluções
     
@@ -288,45 +387,22 @@ def diagnosticar_erro_imap(erro, host=None, email=None):
         erro (Exception): O erro IMAP capturado
         host (str, optional): O host do servidor IMAP
         email (str, optional): O endereço de email
+        resolucao (DomainResolution, optional): Contexto de resolução do domínio
         
     Returns:
         dict: Diagnóstico detalhado com causa e soluções
     """
     erro_str = str(erro)
-    erro_type = classificar_erro_imap(erro, host, email)
-    provedor = identificar_provedor(host, email) if host or email else "generic"
-    catalogo = obter_catalogo_provedor(provedor)
+    mensagem = _normalizar_mensagem(erro_str)
+    provedor = identificar_provedor(host, email, resolucao) if host or email else "generic"
     
-    # Logging para debug
-    logger.debug(f"Diagnosticando erro IMAP: {erro_str}")
-    logger.debug(f"Tipo de erro classificado: {erro_type}")
-    logger.debug(f"Provedor identificado: {provedor}")
+    # Classificação e busca no catálogo do provedor (e no genérico), ambas em cache
+    erro_type = _tipo_erro(erro.__class__, mensagem)
+    diagnostico = _entrada_catalogo(mensagem, provedor)
     
-    # Procurar correspondência no catálogo de erros
-    diagnostico = None
-    for pattern, info in catalogo.items():
-        if pattern.lower() in erro_str.lower():
-            diagnostico = info
-            break
-    
-    # Se não encontrou específico, usa o genérico
-    if not diagnostico and provedor != "generic":
-        catalogo = GENERIC_ERRORS
-        for pattern, info in catalogo.items():
-            if pattern.lower() in erro_str.lower():
-                diagnostico = info
-                break
-    
-    # Se ainda não encontrou, cria um diagnóstico genérico
-    if not diagnostico:
-        diagnostico = {
-            "causa": "Erro IMAP não classificado",
-            "solucao": [
-                "Verifique se as credenciais estão corretas",
-                "Confirme as configurações do servidor IMAP (host, porta, SSL/TLS)",
-                "Verifique sua conexão com a internet"
-            ]
-        }
+    # Logging para debug
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Diagnosticando erro IMAP: {erro_str} (tipo: {erro_type}, provedor: {provedor})")
     
     # Adicionar detalhes técnicos para diagnóstico
     resultado = {
@@ -343,12 +419,12 @@ def diagnosticar_erro_imap(erro, host=None, email=None):
     # Adicionar detalhes específicos por tipo de erro
     if erro_type == "authentication":
         resultado["authentication_details"] = {
-            "requer_senha_app": "app_password" in erro_str.lower() or provedor == "gmail",
+            "requer_senha_app": "app_password" in mensagem or provedor == "gmail",
             "verificar_2fa": True
         }
     elif erro_type == "ssl_error":
         resultado["ssl_details"] = {
-            "verificar_certificado": "certificate" in erro_str.lower(),
+            "verificar_certificado": "certificate" in mensagem,
             "verificar_porta_ssl": True
         }
     elif erro_type == "connection_refused":
@@ -445,7 +521,7 @@ def gerar_mensagem_amigavel(diagnostico):
                "Verifique as configurações e tente novamente."
 
 # Função para sanitizar e formatar erros IMAP para o cliente
-def sanitizar_erro_imap(erro, host=None, email=None):
+def sanitizar_erro_imap(erro, host=None, email=None, resolucao=None):
     """
     Sanitiza erros IMAP para retornar mensagens amigáveis ao usuário.
     Remove informações sensíveis e fornece sugestões úteis.
@@ -454,12 +530,13 @@ def sanitizar_erro_imap(erro, host=None, email=None):
         erro (Exception): O erro IMAP original
         host (str, optional): O host do servidor IMAP
         email (str, optional): O endereço de email
+        resolucao (DomainResolution, optional): Contexto de resolução do domínio
         
     Returns:
         dict: Erro formatado com mensagem amigável
     """
     # Gera diagnóstico detalhado
-    diagnostico = diagnosticar_erro_imap(erro, host, email)
+    diagnostico = diagnosticar_erro_imap(erro, host, email, resolucao)
     
     # Verifica se é um problema comum com solução específica
     erro_comum = verificar_erro_comum(host, str(erro))
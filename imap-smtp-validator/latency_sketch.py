@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento de sketches de latência por provedor, host e etapa
+
+Cada série guarda histogramas logarítmicos (estilo HDR/DDSketch, erro relativo
+de ~1%) em fatias de tempo, o que permite consultar p50/p95/p99 em janelas
+deslizantes com memória fixa. Os sketches são mergeáveis: cada worker do
+gunicorn grava periodicamente o seu em LATENCY_SKETCH_DIR/sketch-<pid>.json,
+numa thread própria (fora das sondagens que registram as amostras), e a
+consulta soma os arquivos de todos os workers vivos.
+"""
+
+import os
+import json
+import math
+import time
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.latency-sketch')
+
+# Configurações
+LATENCY_SKETCH_DIR = os.environ.get(
+    'LATENCY_SKETCH_DIR', os.path.join(tempfile.gettempdir(), 'emailmax-latency'))
+LATENCY_SKETCH_ACCURACY = float(os.environ.get('LATENCY_SKETCH_ACCURACY', '0.01'))
+LATENCY_SKETCH_SLICE = int(os.environ.get('LATENCY_SKETCH_SLICE', '60'))  # segundos por fatia
+LATENCY_SKETCH_SLICES = int(os.environ.get('LATENCY_SKETCH_SLICES', '60'))  # fatias mantidas (1h)
+LATENCY_SKETCH_MAX_SERIES = int(os.environ.get('LATENCY_SKETCH_MAX_SERIES', '2048'))
+LATENCY_SKETCH_FLUSH_INTERVAL = float(os.environ.get('LATENCY_SKETCH_FLUSH_INTERVAL', '10'))
+
+# Janelas padrão da consulta (segundos)
+DEFAULT_WINDOWS = (60, 300, 3600)
+
+# Limites do histograma (ms); valores fora são saturados
+MIN_VALUE_MS = 0.01
+MAX_VALUE_MS = 600000.0
+
+_GAMMA = (1 + LATENCY_SKETCH_ACCURACY) / (1 - LATENCY_SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+SeriesKey = Tuple[str, str, str]  # (provedor, host, etapa)
+
+
+def _bucket(value_ms: float) -> int:
+    value_ms = min(MAX_VALUE_MS, max(MIN_VALUE_MS, value_ms))
+    return int(math.ceil(math.log(value_ms) / _LOG_GAMMA))
+
+
+def _bucket_value(index: int) -> float:
+    # Ponto médio (relativo) do bucket, que garante o erro relativo configurado
+    return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+
+class LogHistogram:
+    """
+    Histograma com buckets logarítmicos esparsos; soma de dois histogramas é o merge
+    """
+
+    __slots__ = ('counts', 'total')
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = dict(counts or {})
+        self.total = sum(self.counts.values())
+
+    def add(self, value_ms: float, count: int = 1) -> None:
+        index = _bucket(value_ms)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+
+    def merge(self, other: 'LogHistogram') -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.total == 0:
+            return None
+        rank = q * (self.total - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                return round(_bucket_value(index), 2)
+        return round(_bucket_value(max(self.counts)), 2)
+
+
+class SlicedSketch:
+    """
+    Histogramas por fatia de tempo; fatias mais antigas que a retenção são descartadas
+    """
+
+    __slots__ = ('slices',)
+
+    def __init__(self):
+        self.slices: Dict[int, LogHistogram] = {}
+
+    def add(self, value_ms: float, now: float) -> None:
+        slice_id = int(now // LATENCY_SKETCH_SLICE)
+        histogram = self.slices.get(slice_id)
+        if histogram is None:
+            histogram = self.slices[slice_id] = LogHistogram()
+            oldest = slice_id - LATENCY_SKETCH_SLICES
+            for stale in [s for s in self.slices if s <= oldest]:
+                del self.slices[stale]
+        histogram.add(value_ms)
+
+    def window(self, seconds: int, now: float) -> LogHistogram:
+        first = int((now - seconds) // LATENCY_SKETCH_SLICE) + 1
+        merged = LogHistogram()
+        for slice_id, histogram in self.slices.items():
+            if slice_id >= first:
+                merged.merge(histogram)
+        return merged
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        return {str(slice_id): {str(i): c for i, c in h.counts.items()}
+                for slice_id, h in self.slices.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Dict[str, int]]) -> 'SlicedSketch':
+        sketch = cls()
+        for slice_id, counts in data.items():
+            sketch.slices[int(slice_id)] = LogHistogram({int(i): c for i, c in counts.items()})
+        return sketch
+
+
+class LatencySketchStore:
+    """
+    Séries (provedor, host, etapa) limitadas a LATENCY_SKETCH_MAX_SERIES, descartando
+    a menos recentemente atualizada
+    """
+
+    def __init__(self, max_series: int = LATENCY_SKETCH_MAX_SERIES,
+                 directory: str = LATENCY_SKETCH_DIR):
+        self.max_series = max_series
+        self.directory = directory
+        self._series: "OrderedDict[SeriesKey, SlicedSketch]" = OrderedDict()
+        self._providers: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._dirty = False
+
+    def _provider_for(self, host: str) -> str:
+        provider = self._providers.get(host)
+        if provider is None:
+            from provider_registry import get_registry
+            verdict = get_registry().lookup_host(host)
+            provider = verdict['provider'] if verdict else 'unknown'
+            if len(self._providers) >= self.max_series:
+                self._providers.clear()
+            self._providers[host] = provider
+        return provider
+
+    def _ensure_started(self) -> None:
+        # Uma thread de gravação por processo (também depois do fork do gunicorn)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='latency-sketch-flush', daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(LATENCY_SKETCH_FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+
+    def record(self, host: str, stage: str, value_ms: float, provider: Optional[str] = None) -> None:
+        self._ensure_started()
+        host = host.lower()
+        now = time.time()
+        with self._lock:
+            key = (provider or self._provider_for(host), host, stage)
+            sketch = self._series.get(key)
+            if sketch is None:
+                sketch = self._series[key] = SlicedSketch()
+                while len(self._series) > self.max_series:
+                    self._series.popitem(last=False)
+            else:
+                self._series.move_to_end(key)
+            sketch.add(value_ms, now)
+            self._dirty = True
+
+    def _dump(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'written_at': time.time(),
+                'series': [{'provider': p, 'host': h, 'stage': s, 'slices': sketch.to_dict()}
+                           for (p, h, s), sketch in self._series.items()]
+            }
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'sketch-{pid}.json')
+
+    def flush(self) -> None:
+        """
+        Grava o sketch deste worker para que os demais possam somá-lo
+        """
+        self._dirty = False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(os.getpid())
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._dump(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self._dirty = True
+            logger.debug(f"Não foi possível gravar o sketch de latência: {e}")
+
+    def _peer_dumps(self) -> Iterable[Dict[str, Any]]:
+        """
+        Sketches gravados pelos outros workers ainda vivos
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        dumps = []
+        max_age = LATENCY_SKETCH_SLICE * LATENCY_SKETCH_SLICES
+        for name in names:
+            if not (name.startswith('sketch-') and name.endswith('.json')):
+                continue
+            try:
+                pid = int(name[len('sketch-'):-len('.json')])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if time.time() - os.path.getmtime(path) > max_age:
+                    continue
+                os.kill(pid, 0)
+                with open(path, 'r', encoding='utf-8') as f:
+                    dumps.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return dumps
+
+    def merged(self) -> Tuple[Dict[SeriesKey, SlicedSketch], int]:
+        """
+        Sketches deste worker somados aos dos demais; retorna também o número de workers
+        """
+        merged: Dict[SeriesKey, SlicedSketch] = {}
+        dumps = [self._dump()] + list(self._peer_dumps())
+        for dump in dumps:
+            for entry in dump.get('series', []):
+                key = (entry['provider'], entry['host'], entry['stage'])
+                incoming = SlicedSketch.from_dict(entry['slices'])
+                target = merged.setdefault(key, SlicedSketch())
+                for slice_id, histogram in incoming.slices.items():
+                    if slice_id in target.slices:
+                        target.slices[slice_id].merge(histogram)
+                    else:
+                        target.slices[slice_id] = histogram
+        return merged, len(dumps)
+
+    def query(self, windows: Iterable[int] = DEFAULT_WINDOWS, provider: Optional[str] = None,
+              host: Optional[str] = None, stage: Optional[str] = None) -> Dict[str, Any]:
+        """
+        p50/p95/p99 de cada série filtrada, para cada janela pedida
+        """
+        now = time.time()
+        merged, workers = self.merged()
+        series: List[Dict[str, Any]] = []
+        for (p, h, s), sketch in sorted(merged.items()):
+            if (provider and p != provider) or (host and h != host.lower()) or (stage and s != stage):
+                continue
+            result = {}
+            for seconds in windows:
+                histogram = sketch.window(seconds, now)
+                if histogram.total == 0:
+                    continue
+                result[str(seconds)] = {
+                    'count': histogram.total,
+                    'p50_ms': histogram.quantile(0.50),
+                    'p95_ms': histogram.quantile(0.95),
+                    'p99_ms': histogram.quantile(0.99)
+                }
+            if result:
+                series.append({'provider': p, 'host': h, 'stage': s, 'windows': result})
+        return {'workers': workers, 'series': series}
+
+
+sketch_store = LatencySketchStore()
+
+
+def record_sample(host: str, stage: str, value_ms: float, provider: Optional[str] = None) -> None:
+    """
+    Registra uma amostra de latência (ms) no sketch do processo
+    """
+    try:
+        sketch_store.record(host, stage, value_ms, provider)
+    except Exception as e:
+        logger.debug(f"Falha ao registrar latência de {host}/{stage}: {e}")
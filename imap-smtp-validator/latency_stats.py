@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Percentis de latência por host e etapa, e orçamento de tentativas extras
+
+Cada sondagem registra quanto tempo levou cada etapa (connect, handshake, ...)
+em uma janela circular por (host, etapa). Os percentis dessa janela decidem
+quando vale a pena disparar uma tentativa extra (hedge), e o orçamento de
+hedges limita a carga adicional gerada nos provedores.
+"""
+
+import os
+import math
+import threading
+from collections import deque
+from typing import Dict, Any, Deque, Optional, Tuple
+
+from latency_sketch import record_sample
+
+# Configurações
+LATENCY_WINDOW = int(os.environ.get('LATENCY_WINDOW', '256'))  # amostras por (host, etapa)
+LATENCY_MIN_SAMPLES = int(os.environ.get('LATENCY_MIN_SAMPLES', '20'))
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'true').lower() == 'true'
+HEDGE_BUDGET_RATIO = float(os.environ.get('HEDGE_BUDGET_RATIO', '0.05'))  # hedges por tentativa
+HEDGE_BUDGET_BURST = float(os.environ.get('HEDGE_BUDGET_BURST', '5'))
+
+LatencyKey = Tuple[str, str]
+
+# Host agregado: toda amostra também entra na série global da etapa
+GLOBAL_HOST = '*'
+
+
+class RollingLatency:
+    """
+    Últimas N amostras de latência (ms) de uma etapa
+    """
+
+    __slots__ = ('_samples',)
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, value_ms: float) -> None:
+        self._samples.append(value_ms)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+        return ordered[rank]
+
+
+class LatencyTracker:
+    """
+    Janelas de latência indexadas por (host, etapa)
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = LATENCY_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._series: Dict[LatencyKey, RollingLatency] = {}
+        self._lock = threading.Lock()
+
+    def record(self, host: str, stage: str, value_ms: float) -> None:
+        key = (host.lower(), stage)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = RollingLatency(self.window)
+            series.add(value_ms)
+
+    def percentile(self, host: str, stage: str, pct: float) -> Optional[float]:
+        """
+        Percentil em ms, ou None enquanto não houver amostras suficientes
+        """
+        with self._lock:
+            series = self._series.get((host.lower(), stage))
+            if series is None or len(series) < self.min_samples:
+                return None
+            return series.percentile(pct)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                f'{host}/{stage}': {
+                    'samples': len(series),
+                    'p50_ms': series.percentile(50),
+                    'p95_ms': series.percentile(95),
+                    'p99_ms': series.percentile(99)
+                }
+                for (host, stage), series in self._series.items()
+            }
+
+
+class HedgeBudget:
+    """
+    Orçamento de hedges: cada tentativa primária rende HEDGE_BUDGET_RATIO fichas
+    (até HEDGE_BUDGET_BURST) e cada hedge consome uma ficha
+    """
+
+    def __init__(self, ratio: float = HEDGE_BUDGET_RATIO, burst: float = HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+        self.stats = {'attempts': 0, 'hedges': 0, 'denied': 0, 'hedge_wins': 0}
+
+    def record_attempt(self) -> None:
+        with self._lock:
+            self.stats['attempts'] += 1
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if not HEDGE_ENABLED or self._tokens < 1:
+                self.stats['denied'] += 1
+                return False
+            self._tokens -= 1
+            self.stats['hedges'] += 1
+            return True
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.stats['hedge_wins'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, tokens=round(self._tokens, 2), enabled=HEDGE_ENABLED)
+
+
+latency_tracker = LatencyTracker()
+hedge_budget = HedgeBudget()
+
+
+def record_latency(host: str, stage: str, value_ms: float) -> None:
+    latency_tracker.record(host, stage, value_ms)
+    latency_tracker.record(GLOBAL_HOST, stage, value_ms)
+    record_sample(host, stage, value_ms)
+
+
+def hedge_delay(host: str, stage: str) -> Optional[float]:
+    """
+    Tempo (segundos) após o qual uma etapa está mais lenta que o p95 do host
+    """
+    p95 = latency_tracker.percentile(host, stage, 95)
+    return p95 / 1000 if p95 is not None else None
+
+
+def get_latency_stats() -> Dict[str, Any]:
+    return {
+        'series': latency_tracker.snapshot(),
+        'hedging': hedge_budget.snapshot()
+    }
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Clientes IMAP/SMTP que aceitam um socket já conectado
+
+Permitem que as sondagens reaproveitem conexões abertas antecipadamente
+(TCP ou TCP+TLS), pulando as etapas de DNS, conexão e handshake. Com
+PROBE_CAPTURE=true, cada sessão é gravada (probe_transcripts) para ser
+reproduzida depois por harness/replay_server.py.
+"""
+
+import ssl
+import socket
+import logging
+import imaplib
+import smtplib
+import weakref
+from typing import Optional, Union
+
+from probe_context import track_resource
+from probe_transcripts import new_recorder
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.probe-clients')
+
+
+def _fresh(sock: socket.socket) -> socket.socket:
+    """
+    Registra um socket aberto pela própria biblioteca antes da saudação do servidor
+    """
+    track_resource(sock)
+    return sock
+
+
+def _adopt(sock: socket.socket, timeout: Optional[float]) -> socket.socket:
+    """
+    Ajusta o timeout do socket recebido antes de entregá-lo à biblioteca
+    """
+    sock.settimeout(timeout)
+    return sock
+
+
+class _CaptureMixin:
+    """
+    Grava o que o cliente envia; a gravação é salva no fechamento ou na coleta do cliente
+    """
+
+    _recorder = None
+
+    def _start_capture(self, protocol: str, host: str, port: int, tls: str) -> None:
+        self._recorder = new_recorder(protocol, host, port, tls)
+        if self._recorder is not None:
+            weakref.finalize(self, self._recorder.save)
+
+    def send(self, data):
+        if self._recorder is not None:
+            self._recorder.client(data if isinstance(data, bytes) else data.encode('ascii'))
+        return super().send(data)
+
+
+class _IMAPCaptureMixin(_CaptureMixin):
+
+    def open(self, host='', port=imaplib.IMAP4_PORT, timeout=None):
+        super().open(host, port, timeout)
+        if self._recorder is not None:
+            self.file = self._recorder.wrap_file(self.file)
+
+    def starttls(self, ssl_context=None):
+        result = super().starttls(ssl_context)
+        if self._recorder is not None:
+            self._recorder.tls_mode = 'starttls'
+            self._recorder.tls()
+            self.file = self._recorder.wrap_file(self.file)
+        return result
+
+    def shutdown(self):
+        super().shutdown()
+        if self._recorder is not None:
+            self._recorder.save()
+
+
+class _SMTPCaptureMixin(_CaptureMixin):
+
+    def getreply(self):
+        # smtplib recria o arquivo de leitura depois do STARTTLS
+        if self._recorder is not None and self.file is None and self.sock is not None:
+            self.file = self._recorder.wrap_file(self.sock.makefile('rb'))
+        return super().getreply()
+
+    def starttls(self, *args, **kwargs):
+        result = super().starttls(*args, **kwargs)
+        if self._recorder is not None:
+            self._recorder.tls_mode = 'starttls'
+            self._recorder.tls()
+        return result
+
+    def close(self):
+        super().close()
+        if self._recorder is not None:
+            self._recorder.save()
+
+
+class _SMTPReplyMixin:
+    """
+    Guarda a última resposta de erro (4xx/5xx) do servidor, que o smtplib
+    perde quando a conexão cai em seguida (ex.: 421 no AUTH PLAIN, depois o
+    AUTH LOGIN na conexão fechada vira SMTPServerDisconnected)
+    """
+
+    last_error_reply = None
+
+    def getreply(self):
+        code, message = super().getreply()
+        if code >= 400:
+            self.last_error_reply = (code, message)
+        return code, message
+
+
+class PreconnectedIMAP4(_IMAPCaptureMixin, imaplib.IMAP4):
+    """
+    IMAP4 sem SSL sobre um socket TCP já conectado
+    """
+
+    def __init__(self, host: str, port: int, sock: Optional[socket.socket] = None,
+                 timeout: Optional[float] = None):
+        self._preconnected_sock = sock
+        self._start_capture('imap', host, port, 'none')
+        super().__init__(host, port, timeout=timeout)
+
+    def _create_socket(self, timeout):
+        sock, self._preconnected_sock = self._preconnected_sock, None
+        if sock is None:
+            return _fresh(super()._create_socket(timeout))
+        return _adopt(sock, timeout)
+
+
+class PreconnectedIMAP4_SSL(_IMAPCaptureMixin, imaplib.IMAP4_SSL):
+    """
+    IMAP4 sobre SSL que aceita um socket TCP (o handshake é feito aqui)
+    ou um socket TLS já negociado
+    """
+
+    def __init__(self, host: str, port: int, sock: Optional[socket.socket] = None,
+                 timeout: Optional[float] = None, ssl_context: Optional[ssl.SSLContext] = None):
+        self._preconnected_sock = sock
+        self._start_capture('imap', host, port, 'implicit')
+        super().__init__(host, port, ssl_context=ssl_context, timeout=timeout)
+
+    def _create_socket(self, timeout):
+        sock, self._preconnected_sock = self._preconnected_sock, None
+        if sock is None:
+            return _fresh(super()._create_socket(timeout))
+        sock = _adopt(sock, timeout)
+        if isinstance(sock, ssl.SSLSocket):
+            return sock
+        return self.ssl_context.wrap_socket(sock, server_hostname=self.host)
+
+
+class PreconnectedSMTP(_SMTPReplyMixin, _SMTPCaptureMixin, smtplib.SMTP):
+    """
+    SMTP (com ou sem STARTTLS posterior) sobre um socket TCP já conectado
+    """
+
+    def __init__(self, host: str, port: int, sock: Optional[socket.socket] = None,
+                 timeout: Optional[float] = None):
+        self._preconnected_sock = sock
+        self._start_capture('smtp', host, port, 'none')
+        super().__init__(host, port, timeout=timeout)
+
+    def _get_socket(self, host, port, timeout):
+        sock, self._preconnected_sock = self._preconnected_sock, None
+        if sock is None:
+            return _fresh(super()._get_socket(host, port, timeout))
+        return _adopt(sock, timeout)
+
+
+class PreconnectedSMTP_SSL(_SMTPReplyMixin, _SMTPCaptureMixin, smtplib.SMTP_SSL):
+    """
+    SMTP sobre SSL que aceita um socket TCP ou um socket TLS já negociado
+    """
+
+    def __init__(self, host: str, port: int, sock: Optional[socket.socket] = None,
+                 timeout: Optional[float] = None,
+                 context: Optional[ssl.SSLContext] = None):
+        self._preconnected_sock = sock
+        self._start_capture('smtp', host, port, 'implicit')
+        super().__init__(host, port, timeout=timeout, context=context)
+
+    def _get_socket(self, host, port, timeout):
+        sock, self._preconnected_sock = self._preconnected_sock, None
+        if sock is None:
+            return _fresh(super()._get_socket(host, port, timeout))
+        sock = _adopt(sock, timeout)
+        if isinstance(sock, ssl.SSLSocket):
+            return sock
+        return self.context.wrap_socket(sock, server_hostname=host)
+
+
+def open_imap_client(host: str, port: int, secure: bool, timeout: float,
+                     sock: Optional[socket.socket] = None) -> Union[imaplib.IMAP4, imaplib.IMAP4_SSL]:
+    """
+    Abre um cliente IMAP, reaproveitando o socket informado quando possível.
+
+    Se o socket reaproveitado estiver morto (ex.: fechado pelo servidor enquanto
+    estava estacionado), a conexão é refeita do zero.
+    """
+    client_class = PreconnectedIMAP4_SSL if secure else PreconnectedIMAP4
+    if sock is not None:
+        try:
+            return client_class(host, port, sock=sock, timeout=timeout)
+        except (ConnectionError, EOFError, imaplib.IMAP4.abort) as e:
+            logger.debug(f"Socket reaproveitado para {host}:{port} inutilizável, reconectando: {e}")
+            try:
+                sock.close()
+            except Exception:
+                pass
+    return client_class(host, port, timeout=timeout)
+
+
+def open_smtp_client(host: str, port: int, secure: bool, timeout: float,
+                     sock: Optional[socket.socket] = None) -> Union[smtplib.SMTP, smtplib.SMTP_SSL]:
+    """
+    Abre um cliente SMTP, reaproveitando o socket informado quando possível
+    """
+    client_class = PreconnectedSMTP_SSL if secure else PreconnectedSMTP
+    if sock is not None:
+        try:
+            return client_class(host, port, sock=sock, timeout=timeout)
+        except (ConnectionError, smtplib.SMTPServerDisconnected) as e:
+            logger.debug(f"Socket reaproveitado para {host}:{port} inutilizável, reconectando: {e}")
+            try:
+                sock.close()
+            except Exception:
+                pass
+    return client_class(host, port, timeout=timeout)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cancelamento de sondagens cujo cliente desistiu
+
+Cada requisição de sondagem ganha um ProbeContext com a etapa atual e os
+recursos abertos (sockets e clientes IMAP/SMTP). Uma thread por worker
+verifica periodicamente o socket do cliente HTTP (gunicorn.socket ou
+werkzeug.socket no environ): se o cliente fechou a conexão (ex.: o
+AbortController do proxy Next.js disparou) ou se o prazo informado em
+X-Request-Timeout passou, o contexto é cancelado, os sockets da sondagem são
+derrubados com shutdown() e a etapa bloqueada termina na hora, liberando a
+vaga do controle de admissão. As próximas etapas nem começam.
+"""
+
+import os
+import time
+import socket
+import logging
+import threading
+from functools import wraps
+from typing import Callable, Dict, Any, List, Optional
+
+from flask import jsonify, request
+
+from probe_watchdog import abort_socket, current_watch, probe_watchdog, watch_resource, watch_stage
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.probe-context')
+
+# Configurações
+PROBE_CANCELLATION_ENABLED = os.environ.get('PROBE_CANCELLATION_ENABLED', 'true').lower() == 'true'
+PROBE_DISCONNECT_POLL = float(os.environ.get('PROBE_DISCONNECT_POLL', '0.25'))  # segundos
+REQUEST_TIMEOUT_HEADER = 'X-Request-Timeout'  # segundos que o cliente ainda vai esperar
+
+# Status usado (como no nginx) quando o cliente fechou a conexão antes da resposta
+CLIENT_CLOSED_REQUEST = 499
+
+REASON_DISCONNECTED = 'client_disconnected'
+REASON_DEADLINE = 'deadline_exceeded'
+
+
+class ProbeCancelled(Exception):
+    """
+    A sondagem foi cancelada; não vale a pena continuar
+    """
+
+    def __init__(self, reason: str, stage: Optional[str]):
+        super().__init__(f'Sondagem cancelada ({reason}) na etapa {stage}')
+        self.reason = reason
+        self.stage = stage
+
+
+class ProbeContext:
+    """
+    Estado de cancelamento de uma requisição de sondagem
+    """
+
+    def __init__(self, endpoint: str, client_socket: Optional[socket.socket] = None,
+                 deadline: Optional[float] = None):
+        self.endpoint = endpoint
+        self.client_socket = client_socket
+        self.deadline = deadline  # time.monotonic()
+        self.started_at = time.monotonic()
+        self.stage: Optional[str] = None
+        self.reason: Optional[str] = None
+        self._resources: List[Any] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str) -> None:
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            resources = list(self._resources)
+        logger.info(f"Cancelando sondagem {self.endpoint} na etapa {self.stage}: {reason}")
+        for resource in resources:
+            abort_socket(resource)
+
+    def check(self) -> None:
+        """
+        Raises:
+            ProbeCancelled: se o cliente desistiu ou o prazo passou
+        """
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(REASON_DEADLINE)
+        if self.reason is not None:
+            raise ProbeCancelled(self.reason, self.stage)
+
+    def enter_stage(self, stage: str) -> None:
+        self.check()
+        self.stage = stage
+
+    def register(self, resource: Any) -> None:
+        """
+        Passa a derrubar o recurso (socket ou cliente IMAP/SMTP) em caso de cancelamento
+        """
+        with self._lock:
+            self._resources.append(resource)
+            cancelled = self.reason is not None
+        if cancelled:
+            abort_socket(resource)
+
+
+def _client_disconnected(sock: socket.socket) -> bool:
+    """
+    True se o cliente HTTP fechou a conexão (FIN ou RST) sem consumir a leitura
+    """
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+    except BlockingIOError:
+        return False
+    except (ConnectionResetError, BrokenPipeError):
+        return True
+    except (OSError, ValueError):
+        # Socket TLS ou já fechado pelo servidor: não há como saber
+        return False
+
+
+class ProbeMonitor:
+    """
+    Contextos ativos deste worker, vigiados por uma thread de fundo
+    """
+
+    def __init__(self, poll_interval: float = PROBE_DISCONNECT_POLL):
+        self.poll_interval = poll_interval
+        self._active: Dict[int, ProbeContext] = {}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self.stats: Dict[str, Any] = {'started': 0, 'completed': 0, 'cancelled': 0,
+                                      'by_reason': {}, 'by_stage': {}, 'wasted_ms': 0.0}
+
+    def _ensure_started(self) -> None:
+        # Uma thread por processo (também depois do fork do gunicorn)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._active = {}
+            threading.Thread(target=self._run, name='probe-monitor', daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                contexts = list(self._active.values())
+            now = time.monotonic()
+            for context in contexts:
+                if context.cancelled:
+                    continue
+                if context.deadline is not None and now >= context.deadline:
+                    context.cancel(REASON_DEADLINE)
+                elif context.client_socket is not None and _client_disconnected(context.client_socket):
+                    context.cancel(REASON_DISCONNECTED)
+
+    def start(self, context: ProbeContext) -> None:
+        self._ensure_started()
+        with self._lock:
+            self._active[id(context)] = context
+            self.stats['started'] += 1
+
+    def finish(self, context: ProbeContext) -> None:
+        with self._lock:
+            self._active.pop(id(context), None)
+            if context.cancelled:
+                self.stats['cancelled'] += 1
+                by_reason = self.stats['by_reason']
+                by_reason[context.reason] = by_reason.get(context.reason, 0) + 1
+                stage = context.stage or 'start'
+                self.stats['by_stage'][stage] = self.stats['by_stage'].get(stage, 0) + 1
+                # Tempo gasto em sondagens cujo resultado ninguém leu
+                self.stats['wasted_ms'] = round(
+                    self.stats['wasted_ms'] + (time.monotonic() - context.started_at) * 1000, 2)
+            else:
+                self.stats['completed'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, by_reason=dict(self.stats['by_reason']),
+                        by_stage=dict(self.stats['by_stage']), active=len(self._active),
+                        enabled=PROBE_CANCELLATION_ENABLED)
+
+
+probe_monitor = ProbeMonitor()
+_local = threading.local()
+
+
+def current_probe_context() -> Optional[ProbeContext]:
+    """
+    Contexto da sondagem atendida por esta thread, se houver
+    """
+    return getattr(_local, 'context', None)
+
+
+def probe_stage(stage: str) -> None:
+    """
+    Marca o início de uma etapa; levanta ProbeCancelled se a sondagem foi cancelada
+    """
+    watch_stage(stage)
+    context = current_probe_context()
+    if context is not None:
+        context.enter_stage(stage)
+
+
+def track_resource(resource: Any) -> None:
+    """
+    Registra um socket ou cliente IMAP/SMTP para ser derrubado em caso de
+    cancelamento ou de estouro do prazo da sondagem (probe_watchdog)
+    """
+    watch_resource(resource)
+    context = current_probe_context()
+    if context is not None:
+        context.register(resource)
+
+
+def resource_tracker() -> Callable[[Any], None]:
+    """
+    track_resource preso à sondagem desta thread, para registrar recursos
+    abertos em outras threads (tentativas do pool de hedged_connect)
+    """
+    context = current_probe_context()
+    watch = current_watch()
+
+    def track(resource: Any) -> None:
+        if watch is not None:
+            probe_watchdog.register(watch, resource)
+        if context is not None:
+            context.register(resource)
+    return track
+
+
+def _request_deadline() -> Optional[float]:
+    value = request.headers.get(REQUEST_TIMEOUT_HEADER)
+    if not value:
+        return None
+    try:
+        return time.monotonic() + max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def cancellable_probe(f):
+    """
+    Decorator para endpoints de sondagem: cria o contexto de cancelamento da
+    requisição e responde 499 se o cliente desistiu no meio
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not PROBE_CANCELLATION_ENABLED:
+            return f(*args, **kwargs)
+
+        client_socket = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+        context = ProbeContext(request.path, client_socket, _request_deadline())
+        probe_monitor.start(context)
+        _local.context = context
+        try:
+            try:
+                response = f(*args, **kwargs)
+            except ProbeCancelled:
+                response = None
+            if context.cancelled:
+                # Ninguém vai ler a resposta; o corpo só registra o motivo
+                return jsonify({
+                    'success': False,
+                    'message': 'Sondagem cancelada: cliente desistiu da requisição',
+                    'stage': context.stage,
+                    'reason': context.reason
+                }), CLIENT_CLOSED_REQUEST
+            return response
+        finally:
+            _local.context = None
+            probe_monitor.finish(context)
+    return decorated_function
+
+
+def get_probe_cancellation_stats() -> Dict[str, Any]:
+    """
+    Estatísticas de sondagens canceladas deste worker
+    """
+    return probe_monitor.snapshot()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gravação de transcrições das sessões IMAP/SMTP das sondagens
+
+Com PROBE_CAPTURE=true, cada cliente aberto por probe_clients grava o que foi
+enviado e recebido, linha a linha, com o instante de cada linha em relação à
+abertura do cliente (a saudação atrasada, as respostas multilinha e a demora
+de uma falha de AUTHENTICATE ficam registradas). As transcrições vão para
+PROBE_CAPTURE_DIR em JSON e podem ser reproduzidas por
+harness/replay_server.py, sem credenciais e sem rede.
+
+Credenciais nunca são gravadas: os argumentos de LOGIN, AUTHENTICATE e AUTH e
+as respostas SASL do cliente viram '<redacted>', e endereços de email em
+qualquer linha viram user@example.invalid. O conteúdo é o da camada de
+aplicação (depois do TLS); a negociação STARTTLS é marcada com um evento 'tls'.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.probe-transcripts')
+
+# Configurações
+PROBE_CAPTURE = os.environ.get('PROBE_CAPTURE', 'false').lower() == 'true'
+PROBE_CAPTURE_DIR = os.environ.get(
+    'PROBE_CAPTURE_DIR', os.path.join(tempfile.gettempdir(), 'emailmax-transcripts'))
+
+TRANSCRIPT_VERSION = 1
+REDACTED = '<redacted>'
+REDACTED_EMAIL = 'user@example.invalid'
+
+# Direções dos eventos
+CLIENT = 'c'
+SERVER = 's'
+TLS = 'tls'  # STARTTLS concluído
+EOF = 'eof'  # servidor fechou a conexão
+
+_EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+_IMAP_LOGIN_RE = re.compile(r'^(\S+ LOGIN) .*$', re.IGNORECASE | re.DOTALL)
+_IMAP_AUTHENTICATE_RE = re.compile(r'^(\S+ AUTHENTICATE \S+)(?: .*)?$', re.IGNORECASE | re.DOTALL)
+_SMTP_AUTH_RE = re.compile(r'^(AUTH \S+)(?: .*)?$', re.IGNORECASE | re.DOTALL)
+
+
+def _decode(data: bytes) -> str:
+    # latin-1 preserva qualquer byte na ida e na volta
+    return data.decode('latin-1')
+
+
+class TranscriptRecorder:
+    """
+    Eventos de uma sessão (direção, instante e dados), com as credenciais removidas
+    """
+
+    def __init__(self, protocol: str, host: str, port: int, tls: str):
+        self.protocol = protocol
+        self.host = host
+        self.port = port
+        self.tls_mode = tls  # 'implicit', 'starttls' ou 'none'
+        self.started_at = time.monotonic()
+        self.recorded_at = time.time()
+        self.events: List[Dict[str, Any]] = []
+        self._in_sasl = False
+        self._saved = False
+        self._lock = threading.Lock()
+
+    def _add(self, direction: str, data: Optional[str] = None) -> None:
+        event: Dict[str, Any] = {'t': round(time.monotonic() - self.started_at, 6), 'dir': direction}
+        if data is not None:
+            event['data'] = data
+        with self._lock:
+            self.events.append(event)
+
+    def _redact_client(self, line: str) -> str:
+        if self._in_sasl:
+            # Resposta a um desafio SASL (usuário, senha ou token em base64)
+            return REDACTED + '\r\n'
+        if self.protocol == 'imap':
+            match = _IMAP_LOGIN_RE.match(line)
+            if match:
+                return f'{match.group(1)} {REDACTED} {REDACTED}\r\n'
+            match = _IMAP_AUTHENTICATE_RE.match(line)
+        else:
+            match = _SMTP_AUTH_RE.match(line)
+        if match:
+            self._in_sasl = True
+            redacted = match.group(1)
+            if match.group(0).rstrip('\r\n') != redacted:
+                redacted += f' {REDACTED}'
+            return redacted + '\r\n'
+        return _EMAIL_RE.sub(REDACTED_EMAIL, line)
+
+    def client(self, data: bytes) -> None:
+        for line in _decode(data).splitlines(keepends=True):
+            self._add(CLIENT, self._redact_client(line))
+
+    def server(self, data: bytes) -> None:
+        if not data:
+            self._add(EOF)
+            return
+        line = _decode(data)
+        # A troca SASL termina na primeira resposta que não é um desafio
+        if self._in_sasl and not line.startswith('+' if self.protocol == 'imap' else '334'):
+            self._in_sasl = False
+        self._add(SERVER, _EMAIL_RE.sub(REDACTED_EMAIL, line))
+
+    def tls(self) -> None:
+        self._add(TLS)
+
+    def wrap_file(self, file) -> '_RecordingFile':
+        return _RecordingFile(file, self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            events = list(self.events)
+        return {
+            'version': TRANSCRIPT_VERSION,
+            'protocol': self.protocol,
+            'host': self.host,
+            'port': self.port,
+            'tls': self.tls_mode,
+            'recorded_at': round(self.recorded_at, 3),
+            'events': events
+        }
+
+    def save(self, directory: str = PROBE_CAPTURE_DIR) -> Optional[str]:
+        """
+        Grava a transcrição uma única vez (no fechamento do cliente ou na coleta do objeto)
+        """
+        if self._saved or not self.events:
+            return None
+        self._saved = True
+        name = f'{self.protocol}-{self.host}-{self.port}-{int(self.recorded_at)}-{uuid.uuid4().hex[:8]}.json'
+        path = os.path.join(directory, name)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, indent=1)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar a transcrição de {self.host}:{self.port}: {e}")
+            return None
+        logger.debug(f"Transcrição gravada em {path}")
+        return path
+
+
+class _RecordingFile:
+    """
+    Arquivo de leitura do socket (makefile) que registra cada linha recebida
+    """
+
+    def __init__(self, file, recorder: TranscriptRecorder):
+        self._file = file
+        self._recorder = recorder
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self._file.readline(size)
+        self._recorder.server(data)
+        return data
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._file.read(size)
+        self._recorder.server(data)
+        return data
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._file, name)
+
+
+def new_recorder(protocol: str, host: str, port: int, tls: str) -> Optional[TranscriptRecorder]:
+    """
+    Gravador para um cliente novo, ou None se a captura estiver desligada
+    """
+    if not PROBE_CAPTURE:
+        return None
+    return TranscriptRecorder(protocol, host, port, tls)
+
+
+def load_transcript(path: str) -> Dict[str, Any]:
+    """
+    Lê uma transcrição gravada; rejeita versões desconhecidas
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        transcript = json.load(f)
+    if transcript.get('version') != TRANSCRIPT_VERSION:
+        raise ValueError(f'Versão de transcrição não suportada em {path}: {transcript.get("version")}')
+    return transcript
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vigia de sondagens travadas
+
+Os timeouts de socket valem por operação: um servidor que manda um byte a
+cada poucos segundos (ou um TLS que nunca termina de negociar) renova o
+timeout a cada leitura e prende a thread do worker indefinidamente. Cada
+sondagem IMAP/SMTP é registrada aqui com um prazo absoluto (soma dos
+timeouts das etapas, limitada por PROBE_WATCHDOG_MAX) e com os sockets que
+abriu; uma thread por worker derruba com shutdown() os sockets das sondagens
+que passaram do prazo e registra a etapa em que estavam presas.
+
+Cada worker grava periodicamente um retrato das sondagens ativas (etapa,
+idade, prazo e o quadro da pilha em que a thread está esperando) em
+PROBE_DUMP_DIR, para que /api/debug/probes mostre o que todos os workers
+estão esperando, não só o que atendeu a requisição.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import tempfile
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.probe-watchdog')
+
+# Configurações
+PROBE_WATCHDOG_ENABLED = os.environ.get('PROBE_WATCHDOG_ENABLED', 'true').lower() == 'true'
+PROBE_WATCHDOG_INTERVAL = float(os.environ.get('PROBE_WATCHDOG_INTERVAL', '0.5'))  # segundos
+# Prazo máximo de uma sondagem; abaixo do timeout do gunicorn para a resposta ainda sair
+PROBE_WATCHDOG_MAX = float(os.environ.get('PROBE_WATCHDOG_MAX', '45'))  # segundos
+PROBE_WATCHDOG_GRACE = float(os.environ.get('PROBE_WATCHDOG_GRACE', '2'))  # segundos
+# Ida e volta do login em diante (saudação, LOGIN, LIST, SELECT, LOGOUT), cada uma com o timeout de login
+PROBE_WATCHDOG_LOGIN_ROUNDS = int(os.environ.get('PROBE_WATCHDOG_LOGIN_ROUNDS', '4'))
+PROBE_DUMP_DIR = os.environ.get('PROBE_DUMP_DIR', os.path.join(tempfile.gettempdir(), 'emailmax-probes'))
+PROBE_DUMP_INTERVAL = float(os.environ.get('PROBE_DUMP_INTERVAL', '2'))  # segundos
+PROBE_WATCHDOG_HISTORY = 20  # derrubadas recentes guardadas para o dump
+
+STACK_DEPTH = 4  # quadros mostrados em 'waiting_on'
+
+
+def abort_socket(resource: Any) -> bool:
+    """
+    Derruba o socket de um recurso sem fechá-lo (quem o abriu continua responsável pelo close)
+
+    Clientes imaplib/smtplib trocam o socket ao negociar TLS, então o socket é
+    lido no momento da derrubada. Retorna True se havia um socket para derrubar.
+    """
+    sock = resource if isinstance(resource, socket.socket) else getattr(resource, 'sock', None)
+    if sock is None:
+        return False
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def probe_budget(connect: float, handshake: float, login: float, dns: float = 0.0) -> float:
+    """
+    Prazo total (segundos) de uma sondagem a partir dos timeouts das etapas
+    """
+    budget = dns + connect + handshake + login * PROBE_WATCHDOG_LOGIN_ROUNDS + PROBE_WATCHDOG_GRACE
+    return min(PROBE_WATCHDOG_MAX, budget)
+
+
+class ProbeWatch:
+    """
+    Sondagem vigiada: destino, etapa atual, prazo absoluto e sockets abertos
+    """
+
+    __slots__ = ('kind', 'host', 'port', 'stage', 'started_at', 'deadline', 'thread_id',
+                 'thread_name', 'resources', 'forced_at', 'forced_stage')
+
+    def __init__(self, kind: str, host: str, port: int, budget: float):
+        self.kind = kind
+        self.host = host
+        self.port = port
+        self.stage: Optional[str] = None
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + budget  # time.monotonic()
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+        self.resources: Dict[int, Any] = {}
+        self.forced_at: Optional[float] = None
+        self.forced_stage: Optional[str] = None
+
+    @property
+    def forced(self) -> bool:
+        return self.forced_at is not None
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            'kind': self.kind,
+            'host': self.host,
+            'port': self.port,
+            'stage': self.stage or 'start',
+            'thread': self.thread_name,
+            'age_s': round(now - self.started_at, 3),
+            'remaining_s': round(self.deadline - now, 3),
+            'sockets': len(self.resources),
+            'forced': self.forced
+        }
+
+
+def _waiting_on(frame) -> List[str]:
+    """
+    Quadros mais internos da pilha de uma thread (onde ela está bloqueada)
+    """
+    stack = traceback.extract_stack(frame)[-STACK_DEPTH:]
+    return [f'{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}' for entry in reversed(stack)]
+
+
+class ProbeWatchdog:
+    """
+    Sondagens ativas deste worker, vigiadas por uma thread de fundo
+    """
+
+    def __init__(self, interval: float = PROBE_WATCHDOG_INTERVAL, directory: str = PROBE_DUMP_DIR):
+        self.interval = interval
+        self.directory = directory
+        self._active: Dict[int, ProbeWatch] = {}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._dirty = False
+        self._last_dump = 0.0
+        self._recent: deque = deque(maxlen=PROBE_WATCHDOG_HISTORY)
+        self.stats: Dict[str, Any] = {'watched': 0, 'finished': 0, 'forced_closes': 0,
+                                      'forced_by_stage': {}}
+
+    def _ensure_started(self) -> None:
+        # Uma thread por processo (também depois do fork do gunicorn)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._active = {}
+            threading.Thread(target=self._run, name='probe-watchdog', daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            with self._lock:
+                overdue = [w for w in self._active.values() if not w.forced and now >= w.deadline]
+            for watch in overdue:
+                self._force_close(watch, now)
+            if self._dirty or (self._active and now - self._last_dump >= PROBE_DUMP_INTERVAL):
+                self.flush()
+
+    def _force_close(self, watch: ProbeWatch, now: float) -> None:
+        stage = watch.stage or 'start'
+        with self._lock:
+            watch.forced_at = now
+            watch.forced_stage = stage
+            resources = list(watch.resources.values())
+            self.stats['forced_closes'] += 1
+            self.stats['forced_by_stage'][stage] = self.stats['forced_by_stage'].get(stage, 0) + 1
+            self._recent.append({
+                'kind': watch.kind, 'host': watch.host, 'port': watch.port, 'stage': stage,
+                'age_s': round(now - watch.started_at, 3), 'at': round(time.time(), 3)
+            })
+            self._dirty = True
+        closed = sum(abort_socket(resource) for resource in resources)
+        logger.warning(f"Sondagem {watch.kind} em {watch.host}:{watch.port} presa na etapa {stage} "
+                       f"há {now - watch.started_at:.1f}s: {closed} socket(s) derrubado(s)")
+
+    def start(self, kind: str, host: str, port: int, budget: float) -> ProbeWatch:
+        self._ensure_started()
+        watch = ProbeWatch(kind, host, port, budget)
+        with self._lock:
+            self._active[id(watch)] = watch
+            self.stats['watched'] += 1
+            self._dirty = True
+        return watch
+
+    def finish(self, watch: ProbeWatch) -> None:
+        with self._lock:
+            self._active.pop(id(watch), None)
+            self.stats['finished'] += 1
+            self._dirty = True
+
+    def set_stage(self, watch: ProbeWatch, stage: str) -> None:
+        watch.stage = stage
+        self._dirty = True
+
+    def register(self, watch: ProbeWatch, resource: Any) -> None:
+        """
+        Passa a derrubar o recurso (socket ou cliente IMAP/SMTP) se a sondagem estourar o prazo
+        """
+        with self._lock:
+            watch.resources[id(resource)] = resource
+            forced = watch.forced
+        if forced:
+            abort_socket(resource)
+
+    def _dump(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        frames = sys._current_frames()
+        with self._lock:
+            watches = list(self._active.values())
+            recent = list(self._recent)
+        probes = []
+        for watch in watches:
+            entry = watch.to_dict(now)
+            frame = frames.get(watch.thread_id)
+            entry['waiting_on'] = _waiting_on(frame) if frame is not None else []
+            probes.append(entry)
+        return {
+            'pid': os.getpid(),
+            'written_at': round(time.time(), 3),
+            'probes': probes,
+            'recent_forced': recent
+        }
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'probes-{pid}.json')
+
+    def flush(self) -> None:
+        """
+        Grava o retrato das sondagens deste worker para o endpoint de dump dos demais
+        """
+        self._dirty = False
+        self._last_dump = time.monotonic()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(os.getpid())
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._dump(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"Não foi possível gravar o retrato das sondagens: {e}")
+
+    def _peer_dumps(self) -> List[Dict[str, Any]]:
+        """
+        Retratos gravados pelos outros workers ainda vivos
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        dumps = []
+        for name in names:
+            if not (name.startswith('probes-') and name.endswith('.json')):
+                continue
+            try:
+                pid = int(name[len('probes-'):-len('.json')])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+                with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                    dumps.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return dumps
+
+    def workers(self) -> List[Dict[str, Any]]:
+        """
+        Sondagens ativas deste worker (retrato atual) e dos demais (último retrato gravado)
+        """
+        own = dict(self._dump(), current=True)
+        return [own] + sorted(self._peer_dumps(), key=lambda d: d.get('pid', 0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, forced_by_stage=dict(self.stats['forced_by_stage']),
+                        active=len(self._active), enabled=PROBE_WATCHDOG_ENABLED,
+                        max_s=PROBE_WATCHDOG_MAX)
+
+
+probe_watchdog = ProbeWatchdog()
+_local = threading.local()
+
+
+def current_watch() -> Optional[ProbeWatch]:
+    """
+    Sondagem vigiada executada por esta thread, se houver
+    """
+    return getattr(_local, 'watch', None)
+
+
+@contextmanager
+def watch_probe(kind: str, host: str, port: int, budget: float) -> Iterator[Optional[ProbeWatch]]:
+    """
+    Vigia a sondagem executada dentro do bloco; produz None se o vigia estiver desligado
+    """
+    if not PROBE_WATCHDOG_ENABLED:
+        yield None
+        return
+    watch = probe_watchdog.start(kind, host, port, budget)
+    previous = current_watch()
+    _local.watch = watch
+    try:
+        yield watch
+    finally:
+        _local.watch = previous
+        probe_watchdog.finish(watch)
+
+
+def watch_stage(stage: str) -> None:
+    """
+    Marca a etapa em que a sondagem vigiada desta thread está
+    """
+    watch = current_watch()
+    if watch is not None:
+        probe_watchdog.set_stage(watch, stage)
+
+
+def watch_resource(resource: Any) -> None:
+    """
+    Registra um socket ou cliente IMAP/SMTP da sondagem vigiada desta thread
+    """
+    watch = current_watch()
+    if watch is not None:
+        probe_watchdog.register(watch, resource)
+
+
+def watchdog_result(watch: ProbeWatch) -> Dict[str, Any]:
+    """
+    Resultado de uma sondagem cujos sockets foram derrubados pelo vigia
+    """
+    elapsed = watch.forced_at - watch.started_at
+    return {
+        'success': False,
+        'message': f'O servidor {watch.host}:{watch.port} parou de responder na etapa '
+                   f'{watch.forced_stage}; conexão encerrada após {elapsed:.1f}s',
+        'stage': watch.forced_stage,
+        'error_type': 'stalled',
+        'solutions': [
+            'O servidor aceitou a conexão mas não concluiu a etapa dentro do prazo',
+            'Tente novamente em alguns minutos ou verifique se a porta e o tipo de segurança estão corretos'
+        ]
+    }
+
+
+def get_probe_dump(include_threads: bool = False) -> Dict[str, Any]:
+    """
+    O que cada worker está esperando; com include_threads, também a pilha de
+    todas as threads deste worker
+    """
+    dump: Dict[str, Any] = {'workers': probe_watchdog.workers(), 'watchdog': probe_watchdog.snapshot()}
+    if include_threads:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        dump['threads'] = [
+            {'thread': names.get(ident, str(ident)), 'waiting_on': _waiting_on(frame)}
+            for ident, frame in sys._current_frames().items()
+        ]
+    return dump
+
+
+def get_watchdog_stats() -> Dict[str, Any]:
+    """
+    Estatísticas do vigia de sondagens deste worker
+    """
+    return probe_watchdog.snapshot()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro offline de provedores de email
+
+Carrega sob demanda o arquivo data/providers.json (domínio -> configurações
+IMAP/SMTP, no estilo do ISPDB do Thunderbird, e regras de sufixo MX -> provedor)
+e responde às consultas através de tries de rótulos invertidos. Cada consulta
+custa O(número de rótulos) e não depende de rede.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, Any, Iterable, Optional
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.provider-registry')
+
+# Caminho do banco de dados de provedores
+PROVIDER_DB_PATH = os.environ.get(
+    'PROVIDER_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'providers.json')
+)
+
+
+def _normalize(name: str) -> str:
+    """
+    Normaliza um nome de domínio/host para consulta
+    """
+    return name.strip().lower().rstrip('.')
+
+
+class _LabelTrie:
+    """
+    Trie indexada pelos rótulos do domínio em ordem invertida (com -> gmail -> imap)
+    """
+
+    __slots__ = ('_root',)
+
+    def __init__(self):
+        self._root: Dict[Optional[str], Any] = {}
+
+    def insert(self, name: str, value: Any) -> None:
+        node = self._root
+        for label in reversed(_normalize(name).split('.')):
+            node = node.setdefault(label, {})
+        # A chave None guarda o valor do nó (rótulos nunca são None)
+        node[None] = value
+
+    def exact(self, name: str) -> Optional[Any]:
+        node = self._root
+        for label in reversed(_normalize(name).split('.')):
+            node = node.get(label)
+            if node is None:
+                return None
+        return node.get(None)
+
+    def longest_suffix(self, name: str) -> Optional[Any]:
+        node = self._root
+        found = None
+        for label in reversed(_normalize(name).split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+
+class ProviderRegistry:
+    """
+    Registro único de provedores usado pela detecção de configurações,
+    pelo diagnóstico de erros e pela verificação de domínio
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self._providers: Dict[str, Dict[str, Any]] = data.get('providers', {})
+        self._domains = _LabelTrie()
+        self._mx_rules = _LabelTrie()
+        self._hosts = _LabelTrie()
+
+        for provider_id, entry in self._providers.items():
+            for domain in entry.get('domains', []):
+                self._domains.insert(domain, provider_id)
+            for suffix in entry.get('host_suffixes', []):
+                self._hosts.insert(suffix, provider_id)
+
+        # Servidores compartilhados (ex.: Rogers usa o Yahoo) ficam com o primeiro dono
+        for provider_id, entry in self._providers.items():
+            for protocol in ('imap', 'smtp'):
+                server = entry.get(protocol)
+                if server and self._hosts.exact(server['host']) is None:
+                    self._hosts.insert(server['host'], provider_id)
+
+        for rule in data.get('mx_rules', []):
+            self._mx_rules.insert(rule['suffix'], rule)
+            if self._hosts.exact(rule['suffix']) is None:
+                self._hosts.insert(rule['suffix'], rule['provider'])
+
+    def __len__(self) -> int:
+        return len(self._providers)
+
+    def _verdict(self, provider_id: str, source: str, name: Optional[str] = None) -> Dict[str, Any]:
+        entry = self._providers.get(provider_id, {})
+        return {
+            'provider': provider_id,
+            'name': name or entry.get('name', provider_id),
+            'source': source
+        }
+
+    def get(self, provider_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna a entrada completa de um provedor
+        """
+        return self._providers.get(provider_id)
+
+    def settings_for(self, provider_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna as configurações IMAP/SMTP de um provedor, se conhecidas
+        """
+        entry = self._providers.get(provider_id)
+        if not entry or not entry.get('imap') or not entry.get('smtp'):
+            return None
+        return {'imap': entry['imap'], 'smtp': entry['smtp']}
+
+    def lookup_domain(self, domain: str) -> Optional[Dict[str, Any]]:
+        """
+        Identifica o provedor pelo domínio exato do email
+        """
+        if not domain:
+            return None
+        provider_id = self._domains.exact(domain)
+        return self._verdict(provider_id, 'domain') if provider_id else None
+
+    def lookup_mx(self, mx_hosts: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """
+        Identifica o provedor pelo primeiro host MX que casar com uma regra de sufixo
+        """
+        for mx_host in mx_hosts:
+            rule = self._mx_rules.longest_suffix(str(mx_host))
+            if rule:
+                return self._verdict(rule['provider'], 'mx', rule.get('name'))
+        return None
+
+    def lookup_host(self, host: str) -> Optional[Dict[str, Any]]:
+        """
+        Identifica o provedor pelo hostname de um servidor IMAP/SMTP
+        """
+        if not host:
+            return None
+        provider_id = self._hosts.longest_suffix(host)
+        return self._verdict(provider_id, 'host') if provider_id else None
+
+
+_registry: Optional[ProviderRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def load_registry(path: str = PROVIDER_DB_PATH) -> ProviderRegistry:
+    """
+    Carrega o registro a partir do arquivo de dados
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.error(f"Erro ao carregar banco de provedores {path}: {e}")
+        data = {}
+    registry = ProviderRegistry(data)
+    logger.info(f"Registro de provedores carregado com {len(registry)} provedores")
+    return registry
+
+
+def get_registry() -> ProviderRegistry:
+    """
+    Retorna o registro global, carregando-o na primeira utilização
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load_registry()
+    return _registry
+
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Limite de requisições da API por cliente, por rota e por conta testada
+
+Cada limite é um token bucket ("N/período": capacidade N, reposta
+continuamente ao longo do período). Toda requisição a uma rota limitada
+consome uma ficha do bucket (tenant, rota) e, nas rotas que fazem login, uma
+do bucket da conta testada, para que um cliente em loop não dispare logins
+repetidos contra o mesmo provedor a partir do nosso IP. O estado fica em um
+arquivo SQLite (WAL) compartilhado por todos os workers do host.
+
+As respostas trazem RateLimit-Limit, RateLimit-Remaining, RateLimit-Reset e
+RateLimit-Policy (draft IETF) e, ao estourar o limite, 429 com Retry-After.
+"""
+
+import os
+import math
+import time
+import json
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+from functools import wraps
+from typing import Dict, Any, List, Optional, Tuple
+
+from flask import g, jsonify, make_response, request
+
+from tenants import ANONYMOUS_TENANT
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.rate-limit')
+
+# Configurações
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite').lower()  # 'sqlite' ou 'memory'
+RATE_LIMIT_SQLITE_PATH = os.environ.get(
+    'RATE_LIMIT_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'emailmax-ratelimit.sqlite3'))
+RATE_LIMIT_DEFAULT = os.environ.get('RATE_LIMIT_DEFAULT', '120/60')  # por tenant e rota
+RATE_LIMIT_ACCOUNT = os.environ.get('RATE_LIMIT_ACCOUNT', '10/300')  # por conta testada
+# Limites específicos por rota (JSON), somados aos padrões abaixo
+RATE_LIMIT_ROUTES = os.environ.get('RATE_LIMIT_ROUTES', '')
+RATE_LIMIT_MAINTENANCE_INTERVAL = 256  # escritas entre limpezas dos buckets parados
+
+DEFAULT_ROUTE_LIMITS = {
+    '/api/test-connection': '30/60',
+    '/api/imap-diagnostic': '30/60',
+    '/api/verify-email-domain/bulk': '10/60',
+}
+
+
+class RateLimit:
+    """
+    Limite no formato "N/período" (N requisições a cada período em segundos)
+    """
+
+    __slots__ = ('capacity', 'period')
+
+    def __init__(self, capacity: int, period: float):
+        if capacity <= 0 or period <= 0:
+            raise ValueError('Limite deve ter capacidade e período positivos')
+        self.capacity = capacity
+        self.period = period
+
+    @classmethod
+    def parse(cls, spec: str) -> 'RateLimit':
+        capacity, _, period = spec.partition('/')
+        return cls(int(capacity), float(period or 60))
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    def policy(self) -> str:
+        return f'{self.capacity};w={int(self.period)}'
+
+
+class BucketResult:
+    """
+    Resultado da consulta a um bucket: permitido, fichas restantes e tempos de espera
+    """
+
+    __slots__ = ('limit', 'allowed', 'remaining', 'retry_after', 'reset')
+
+    def __init__(self, limit: RateLimit, allowed: bool, tokens: float):
+        self.limit = limit
+        self.allowed = allowed
+        self.remaining = max(0, int(tokens))
+        # Segundos até haver uma ficha inteira e até o bucket encher de novo
+        self.retry_after = 0 if allowed else max(1, math.ceil((1 - tokens) / limit.rate))
+        self.reset = max(0, math.ceil((limit.capacity - tokens) / limit.rate))
+
+
+def _refill(limit: RateLimit, tokens: float, updated_at: float, now: float) -> float:
+    return min(limit.capacity, tokens + max(0.0, now - updated_at) * limit.rate)
+
+
+class MemoryBucketStore:
+    """
+    Buckets em memória (apenas este processo)
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def consume(self, buckets: List[Tuple[str, RateLimit]]) -> List[BucketResult]:
+        now = time.time()
+        with self._lock:
+            levels = [_refill(limit, *self._buckets.get(key, (limit.capacity, now)), now)
+                      for key, limit in buckets]
+            allowed = all(tokens >= 1 for tokens in levels)
+            results = []
+            for (key, limit), tokens in zip(buckets, levels):
+                if allowed:
+                    tokens -= 1
+                self._buckets[key] = (tokens, now)
+                results.append(BucketResult(limit, allowed, tokens))
+            return results
+
+
+class SQLiteBucketStore:
+    """
+    Buckets em SQLite (WAL), compartilhados entre os workers; uma conexão por thread e processo
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                ' key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL,'
+                ' full_at REAL NOT NULL)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def consume(self, buckets: List[Tuple[str, RateLimit]]) -> List[BucketResult]:
+        conn = self._connection()
+        now = time.time()
+        # BEGIN IMMEDIATE serializa os workers: leitura e escrita dos buckets são atômicas
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            levels = []
+            for key, limit in buckets:
+                row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+                levels.append(_refill(limit, *(row or (limit.capacity, now)), now))
+            allowed = all(tokens >= 1 for tokens in levels)
+            results = []
+            for (key, limit), tokens in zip(buckets, levels):
+                if allowed:
+                    tokens -= 1
+                full_at = now + (limit.capacity - tokens) / limit.rate
+                conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated_at, full_at) '
+                             'VALUES (?, ?, ?, ?)', (key, tokens, now, full_at))
+                results.append(BucketResult(limit, allowed, tokens))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._writes += 1
+        if self._writes % RATE_LIMIT_MAINTENANCE_INTERVAL == 0:
+            # Bucket cheio equivale a bucket inexistente
+            conn.execute('DELETE FROM buckets WHERE full_at <= ?', (now,))
+        return results
+
+
+def _load_route_limits() -> Dict[str, RateLimit]:
+    specs = dict(DEFAULT_ROUTE_LIMITS)
+    if RATE_LIMIT_ROUTES:
+        try:
+            specs.update(json.loads(RATE_LIMIT_ROUTES))
+        except ValueError as e:
+            logger.error(f"RATE_LIMIT_ROUTES inválido, usando limites padrão: {e}")
+    return {route: RateLimit.parse(spec) for route, spec in specs.items()}
+
+
+class RateLimiter:
+    """
+    Escolhe os buckets de cada requisição e consulta o armazenamento
+    """
+
+    def __init__(self, store=None):
+        self.store = store or (MemoryBucketStore() if RATE_LIMIT_BACKEND == 'memory' else SQLiteBucketStore())
+        self.default_limit = RateLimit.parse(RATE_LIMIT_DEFAULT)
+        self.account_limit = RateLimit.parse(RATE_LIMIT_ACCOUNT)
+        self.route_limits = _load_route_limits()
+        self._lock = threading.Lock()
+        self.stats = {'allowed': 0, 'limited': 0, 'errors': 0}
+
+    def check(self, tenant: str, route: str, account: Optional[str] = None) -> List[BucketResult]:
+        buckets = [(f'route:{tenant}:{route}', self.route_limits.get(route, self.default_limit))]
+        if account:
+            # A conta é guardada apenas como hash
+            digest = hashlib.sha256(account.strip().lower().encode('utf-8')).hexdigest()
+            buckets.append((f'account:{digest}', self.account_limit))
+        results = self.store.consume(buckets)
+        with self._lock:
+            self.stats['allowed' if results[0].allowed else 'limited'] += 1
+        return results
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.stats['errors'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self.stats,
+                enabled=RATE_LIMIT_ENABLED,
+                backend=RATE_LIMIT_BACKEND,
+                default=self.default_limit.policy(),
+                account=self.account_limit.policy(),
+                routes={route: limit.policy() for route, limit in self.route_limits.items()}
+            )
+
+
+rate_limiter = RateLimiter()
+
+
+def _add_rate_limit_headers(response, results: List[BucketResult]) -> None:
+    # O bucket mais apertado é o que o cliente precisa respeitar
+    tightest = min(results, key=lambda r: (r.allowed, r.remaining))
+    response.headers['RateLimit-Limit'] = str(tightest.limit.capacity)
+    response.headers['RateLimit-Remaining'] = str(tightest.remaining)
+    response.headers['RateLimit-Reset'] = str(tightest.reset)
+    response.headers['RateLimit-Policy'] = ', '.join(r.limit.policy() for r in results)
+    if not tightest.allowed:
+        response.headers['Retry-After'] = str(max(r.retry_after for r in results))
+
+
+def rate_limited(per_account: bool = False):
+    """
+    Decorator que aplica o limite do tenant na rota e, com per_account=True,
+    também o limite da conta (campo 'email' do corpo JSON)
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return f(*args, **kwargs)
+
+            tenant = g.get('tenant')
+            account = None
+            if per_account:
+                body = request.get_json(silent=True)
+                account = body.get('email') if isinstance(body, dict) else None
+            try:
+                results = rate_limiter.check(tenant.name if tenant else ANONYMOUS_TENANT,
+                                             request.url_rule.rule,
+                                             account if isinstance(account, str) else None)
+            except sqlite3.Error as e:
+                # Falha no armazenamento não deve derrubar a API
+                logger.warning(f"Limite de requisições indisponível: {e}")
+                rate_limiter.record_error()
+                return f(*args, **kwargs)
+
+            if not results[0].allowed:
+                response = make_response(jsonify({
+                    'success': False,
+                    'message': 'Limite de requisições excedido. Tente novamente em '
+                               f'{max(r.retry_after for r in results)}s'
+                }), 429)
+                _add_rate_limit_headers(response, results)
+                return response
+
+            response = make_response(f(*args, **kwargs))
+            _add_rate_limit_headers(response, results)
+            return response
+        return decorated_function
+    return decorator
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    """
+    Estatísticas do limite de requisições deste worker
+    """
+    return rate_limiter.snapshot()
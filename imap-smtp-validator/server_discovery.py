@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Descoberta paralela de servidores IMAP/SMTP para domínios desconhecidos
+
+Para domínios fora de KNOWN_PROVIDERS, este módulo testa concorrentemente os
+candidatos mais prováveis (registros SRV da RFC 6186, padrões comuns de
+hostname, o host MX e as variantes de porta) e escolhe o primeiro que conclui
+a saudação TLS. O vencedor fica memorizado por domínio.
+"""
+
+import os
+import ssl
+import time
+import socket
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional, Tuple
+
+import dns_resolver_pool
+from cache_backend import MISS, get_cache
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.server-discovery')
+
+# Configurações
+DISCOVERY_TIMEOUT = float(os.environ.get('DISCOVERY_TIMEOUT', '6'))  # segundos
+DISCOVERY_MAX_WORKERS = int(os.environ.get('DISCOVERY_MAX_WORKERS', '16'))
+DISCOVERY_CACHE_TTL = int(os.environ.get('DISCOVERY_CACHE_TTL', '86400'))  # segundos
+DISCOVERY_NEGATIVE_TTL = int(os.environ.get('DISCOVERY_NEGATIVE_TTL', '600'))  # segundos
+DISCOVERY_VERIFY_TLS = os.environ.get('DISCOVERY_VERIFY_TLS', 'true').lower() == 'true'
+
+# Registros SRV (RFC 6186 / RFC 8314): nome do serviço -> (protocolo, modo)
+SRV_SERVICES = [
+    ('_imaps._tcp', 'imap', 'ssl'),
+    ('_imap._tcp', 'imap', 'starttls'),
+    ('_submissions._tcp', 'smtp', 'ssl'),
+    ('_submission._tcp', 'smtp', 'starttls'),
+]
+
+# Prefixos de hostname e variantes de porta testadas por protocolo
+HOSTNAME_PREFIXES = {
+    'imap': ['imap', 'mail'],
+    'smtp': ['smtp', 'mail'],
+}
+PORT_VARIANTS = {
+    'imap': [(993, 'ssl'), (143, 'starttls')],
+    'smtp': [(465, 'ssl'), (587, 'starttls')],
+}
+
+
+def _tls_context() -> ssl.SSLContext:
+    """
+    Contexto TLS usado nas sondagens de descoberta
+    """
+    context = ssl.create_default_context()
+    if not DISCOVERY_VERIFY_TLS:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _read_line(sock: socket.socket) -> bytes:
+    """
+    Lê uma linha terminada em CRLF do socket
+    """
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = sock.recv(1)
+        if not chunk:
+            raise ConnectionError('Conexão encerrada pelo servidor durante a saudação')
+        data += chunk
+        if len(data) > 4096:
+            raise ConnectionError('Resposta do servidor excede o tamanho esperado')
+    return data
+
+
+def _read_smtp_reply(sock: socket.socket) -> bytes:
+    """
+    Lê uma resposta SMTP completa (incluindo respostas multi-linha)
+    """
+    while True:
+        line = _read_line(sock)
+        if len(line) < 4 or line[3:4] != b'-':
+            return line
+
+
+def _probe_candidate(protocol: str, host: str, port: int, mode: str, timeout: float) -> bool:
+    """
+    Conecta ao candidato e conclui a saudação TLS (SSL direto ou via STARTTLS)
+    """
+    context = _tls_context()
+    sock = socket.create_connection((host, port), timeout=timeout)
+    try:
+        sock.settimeout(timeout)
+        if mode == 'ssl':
+            sock = context.wrap_socket(sock, server_hostname=host)
+            greeting = _read_line(sock) if protocol == 'imap' else _read_smtp_reply(sock)
+            if protocol == 'imap':
+                return greeting.startswith(b'* OK') or greeting.startswith(b'* PREAUTH')
+            return greeting.startswith(b'220')
+
+        # STARTTLS: saudação em texto puro seguida da negociação TLS
+        if protocol == 'imap':
+            if not _read_line(sock).startswith(b'* OK'):
+                return False
+            sock.sendall(b'd1 STARTTLS\r\n')
+            line = _read_line(sock)
+            while line.startswith(b'*'):
+                line = _read_line(sock)
+            if not line.startswith(b'd1 OK'):
+                return False
+        else:
+            if not _read_smtp_reply(sock).startswith(b'220'):
+                return False
+            sock.sendall(b'EHLO emailmax-validator\r\n')
+            if not _read_smtp_reply(sock).startswith(b'250'):
+                return False
+            sock.sendall(b'STARTTLS\r\n')
+            if not _read_smtp_reply(sock).startswith(b'220'):
+                return False
+
+        sock = context.wrap_socket(sock, server_hostname=host)
+        return True
+    finally:
+        try:
+            sock.close()
+        except Exception:
+            pass
+
+
+def _lookup_srv(service: str, domain: str) -> List[Tuple[str, int]]:
+    """
+    Consulta um registro SRV e retorna os alvos ordenados por prioridade e peso
+    """
+    try:
+        answers = dns_resolver_pool.resolve(f'{service}.{domain}', 'SRV')
+    except Exception as e:
+        logger.debug(f"Sem registro SRV {service}.{domain}: {e}")
+        return []
+
+    targets = []
+    for rec in sorted(answers, key=lambda r: (r.priority, -r.weight)):
+        target = str(rec.target).rstrip('.').lower()
+        # Alvo "." indica que o serviço não é oferecido (RFC 6186, seção 4)
+        if target:
+            targets.append((target, int(rec.port)))
+    return targets
+
+
+def _pattern_candidates(domain: str, mx_hosts: List[str]) -> List[Tuple[str, str, int, str]]:
+    """
+    Gera candidatos (protocolo, host, porta, modo) a partir de padrões comuns de hostname
+    """
+    candidates = []
+    for protocol, prefixes in HOSTNAME_PREFIXES.items():
+        hosts = [f'{prefix}.{domain}' for prefix in prefixes]
+        hosts += [mx.rstrip('.').lower() for mx in mx_hosts if mx]
+        seen = set()
+        for host in hosts:
+            if host in seen:
+                continue
+            seen.add(host)
+            for port, mode in PORT_VARIANTS[protocol]:
+                candidates.append((protocol, host, port, mode))
+    return candidates
+
+
+def _settings_for(protocol: str, host: str, port: int, mode: str) -> Dict[str, Any]:
+    """
+    Converte um candidato vencedor para o formato de configuração de KNOWN_PROVIDERS
+    """
+    if protocol == 'imap':
+        return {'host': host, 'port': port, 'secure': mode == 'ssl'}
+    return {'host': host, 'port': port, 'secure': mode == 'ssl', 'starttls': mode == 'starttls'}
+
+
+def _cache_get(domain: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    entry = get_cache().get('discovery', domain)
+    if entry is MISS:
+        return False, None
+    return True, entry['result']
+
+
+def _cache_set(domain: str, result: Optional[Dict[str, Any]]) -> None:
+    ttl = DISCOVERY_CACHE_TTL if result else DISCOVERY_NEGATIVE_TTL
+    get_cache().set('discovery', domain, {'result': result}, ttl)
+
+
+def discover_servers(domain: str, mx_hosts: Optional[List[str]] = None,
+                     timeout: float = DISCOVERY_TIMEOUT) -> Optional[Dict[str, Any]]:
+    """
+    Descobre concorrentemente os servidores IMAP e SMTP de um domínio.
+
+    Args:
+        domain: Domínio do email
+        mx_hosts: Hosts MX já resolvidos para o domínio (usados como candidatos)
+        timeout: Tempo máximo total da descoberta em segundos
+
+    Returns:
+        dict com as configurações 'imap' e/ou 'smtp' vencedoras e a origem de
+        cada uma, ou None se nenhum candidato concluiu a saudação TLS
+    """
+    domain = domain.lower().rstrip('.')
+    found, cached = _cache_get(domain)
+    if found:
+        return cached
+
+    start_time = time.time()
+    deadline = start_time + timeout
+    winners: Dict[str, Dict[str, Any]] = {}
+    sources: Dict[str, str] = {}
+    tested = set()
+
+    executor = ThreadPoolExecutor(max_workers=DISCOVERY_MAX_WORKERS,
+                                  thread_name_prefix='discovery')
+    pending = {}
+
+    def submit_probe(protocol, host, port, mode, source):
+        key = (protocol, host, port, mode)
+        if key in tested or protocol in winners:
+            return
+        tested.add(key)
+        remaining = max(deadline - time.time(), 0.1)
+        future = executor.submit(_probe_candidate, protocol, host, port, mode, remaining)
+        pending[future] = ('probe', key, source)
+
+    try:
+        # Consultas SRV e sondagens por padrão de hostname correm em paralelo;
+        # vence o primeiro candidato que concluir a saudação TLS
+        for service, protocol, mode in SRV_SERVICES:
+            future = executor.submit(_lookup_srv, service, domain)
+            pending[future] = ('srv', (protocol, mode), service)
+
+        for protocol, host, port, mode in _pattern_candidates(domain, mx_hosts or []):
+            submit_probe(protocol, host, port, mode, 'pattern')
+
+        while pending and len(winners) < 2:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            done, _ = wait(list(pending), timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, key, source = pending.pop(future)
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    logger.debug(f"Candidato {key} falhou: {e}")
+                    continue
+
+                if kind == 'srv':
+                    protocol, mode = key
+                    for host, port in outcome:
+                        submit_probe(protocol, host, port, mode, f'srv:{source}')
+                elif outcome and key[0] not in winners:
+                    protocol, host, port, mode = key
+                    winners[protocol] = _settings_for(protocol, host, port, mode)
+                    sources[protocol] = source
+                    logger.info(f"Descoberta {protocol.upper()} para {domain}: "
+                                f"{host}:{port} ({mode}, via {source})")
+    finally:
+        # Os perdedores terminam em segundo plano dentro do próprio timeout
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    result = None
+    if winners:
+        result = dict(winners)
+        result['discovery'] = {
+            'sources': sources,
+            'candidates_tested': len(tested),
+            'elapsed_ms': round((time.time() - start_time) * 1000, 2)
+        }
+    else:
+        logger.info(f"Nenhum servidor descoberto para {domain} em {timeout}s")
+
+    _cache_set(domain, result)
+    return result
@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de diagnóstico de erros SMTP
+
+Contraparte SMTP de imap_error_diagnostic.py. Respostas SMTP trazem o código
+básico (RFC 5321) e, na maioria dos provedores, o código de status estendido
+(RFC 3463, ex.: 5.7.8), então a classificação é uma consulta em dicionário,
+nesta ordem: particularidades do provedor por (código, status estendido),
+pares (código, status estendido) genéricos, status estendido, código básico
+e, por fim, a classe do código (4xx temporário, 5xx permanente). Erros sem
+resposta do servidor (TLS, timeout, conexão) são classificados pela classe
+da exceção.
+
+Além da mensagem amigável, o diagnóstico traz a decisão para quem chama:
+se vale tentar de novo (e depois de quanto tempo), se o provedor está
+limitando a taxa e se as credenciais devem entrar no registro de supressão
+(auth_suppression).
+"""
+
+import re
+import errno
+import socket
+import ssl
+import logging
+
+from imap_error_diagnostic import identificar_provedor
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.smtp-diagnostic')
+
+# Status estendido no início do texto da resposta (ex.: "5.7.8 Username and Password not accepted")
+_STATUS_ESTENDIDO_RE = re.compile(r'^\s*([245]\.\d{1,3}\.\d{1,3})\b')
+
+# Decisão por tipo de erro: (tentar novamente, aguardar segundos, limitação de taxa, suprimir credenciais)
+DECISOES_POR_TIPO = {
+    "credentials": (False, None, False, True),
+    "authentication": (False, None, False, True),
+    "app_password": (False, None, False, True),
+    "web_login_required": (False, None, False, True),
+    "smtp_auth_disabled": (False, None, False, True),
+    "password_transition": (False, None, False, True),
+    "auth_required": (False, None, False, False),
+    "auth_mechanism": (False, None, False, False),
+    "auth_not_supported": (False, None, False, False),
+    "encryption_required": (False, None, False, False),
+    "starttls_not_supported": (False, None, False, False),
+    "temporary_auth_failure": (True, 60, False, False),
+    "login_throttled": (True, 900, True, False),
+    "throttled": (True, 300, True, False),
+    "service_unavailable": (True, 60, False, False),
+    "temporary_failure": (True, 30, False, False),
+    "access_denied": (False, None, False, False),
+    "policy_rejected": (False, None, False, False),
+    "protocol_error": (False, None, False, False),
+    "permanent_failure": (False, None, False, False),
+    "ssl_error": (False, None, False, False),
+    "timeout": (True, 30, False, False),
+    "connection_closed": (True, 30, False, False),
+    "connection_refused": (False, None, False, False),
+    "socket_error": (True, 30, False, False),
+    "dns_error": (True, 30, False, False),
+    "unknown": (False, None, False, False),
+}
+
+# Tipos que indicam credenciais (ou a conta) recusadas, e não um problema de rede ou configuração
+TIPOS_AUTENTICACAO = ("credentials", "authentication", "app_password", "web_login_required",
+                      "smtp_auth_disabled", "password_transition")
+
+# Catálogo por código de resposta básico (RFC 5321 e RFC 4954)
+REPLY_CODES = {
+    421: {
+        "tipo": "service_unavailable",
+        "causa": "Serviço SMTP indisponível, o servidor encerrou a conexão",
+        "solucao": [
+            "O servidor pode estar em manutenção ou sobrecarregado",
+            "Tente novamente em alguns minutos"
+        ]
+    },
+    432: {
+        "tipo": "password_transition",
+        "causa": "O servidor exige a troca de senha antes de autenticar",
+        "solucao": [
+            "Acesse a conta pelo webmail e defina uma nova senha",
+            "Depois da troca, teste novamente com a senha nova"
+        ]
+    },
+    450: {
+        "tipo": "temporary_failure",
+        "causa": "Ação não executada: caixa de correio temporariamente indisponível",
+        "solucao": ["Falha temporária do servidor. Tente novamente em alguns minutos"]
+    },
+    451: {
+        "tipo": "temporary_failure",
+        "causa": "Erro local no processamento do servidor SMTP",
+        "solucao": ["Falha temporária do servidor. Tente novamente em alguns minutos"]
+    },
+    452: {
+        "tipo": "temporary_failure",
+        "causa": "Armazenamento insuficiente no servidor SMTP",
+        "solucao": ["Falha temporária do servidor. Tente novamente mais tarde"]
+    },
+    454: {
+        "tipo": "temporary_failure",
+        "causa": "Falha temporária ao iniciar TLS ou ao autenticar",
+        "solucao": [
+            "Tente novamente em alguns minutos",
+            "Se persistir, tente SSL/TLS direto (porta 465) ao invés de STARTTLS"
+        ]
+    },
+    500: {
+        "tipo": "protocol_error",
+        "causa": "Comando SMTP não reconhecido pelo servidor",
+        "solucao": ["Confirme se o host e a porta são de um servidor SMTP"]
+    },
+    501: {
+        "tipo": "protocol_error",
+        "causa": "Erro de sintaxe nos parâmetros do comando SMTP",
+        "solucao": ["Verifique o formato do email informado"]
+    },
+    502: {
+        "tipo": "protocol_error",
+        "causa": "Comando SMTP não implementado pelo servidor",
+        "solucao": ["O servidor pode não aceitar autenticação nesta porta. Tente a porta 587 ou 465"]
+    },
+    503: {
+        "tipo": "protocol_error",
+        "causa": "Sequência de comandos SMTP inválida",
+        "solucao": ["O servidor pode exigir STARTTLS antes da autenticação"]
+    },
+    504: {
+        "tipo": "auth_mechanism",
+        "causa": "Mecanismo de autenticação não suportado pelo servidor",
+        "solucao": ["O servidor não aceita os métodos de autenticação PLAIN/LOGIN nesta conexão"]
+    },
+    530: {
+        "tipo": "auth_required",
+        "causa": "O servidor exige autenticação (ou STARTTLS) antes deste comando",
+        "solucao": [
+            "Ative STARTTLS na porta 587 ou use SSL/TLS direto na porta 465",
+            "Confirme que o servidor SMTP é o de envio autenticado do provedor"
+        ]
+    },
+    534: {
+        "tipo": "auth_mechanism",
+        "causa": "Mecanismo de autenticação considerado fraco pelo servidor",
+        "solucao": ["O provedor pode exigir senha de aplicativo ou OAuth2 para este acesso"]
+    },
+    535: {
+        "tipo": "credentials",
+        "causa": "Credenciais de autenticação SMTP inválidas",
+        "solucao": [
+            "Verifique se o email e senha estão corretos",
+            "Verifique se a conta exige senha de aplicativo (autenticação de dois fatores)"
+        ]
+    },
+    538: {
+        "tipo": "encryption_required",
+        "causa": "O servidor exige conexão criptografada para este método de autenticação",
+        "solucao": ["Ative STARTTLS na porta 587 ou use SSL/TLS direto na porta 465"]
+    },
+    550: {
+        "tipo": "policy_rejected",
+        "causa": "Ação recusada pelo servidor SMTP",
+        "solucao": ["Verifique se a conta tem permissão de envio por SMTP"]
+    },
+    553: {
+        "tipo": "policy_rejected",
+        "causa": "Endereço de email não permitido pelo servidor",
+        "solucao": ["Verifique o formato do email informado"]
+    },
+    554: {
+        "tipo": "access_denied",
+        "causa": "Conexão ou transação recusada pelo servidor SMTP",
+        "solucao": [
+            "O IP de origem pode estar em lista de bloqueio do provedor",
+            "Verifique se a conta não está suspensa"
+        ]
+    },
+    555: {
+        "tipo": "protocol_error",
+        "causa": "Parâmetros de MAIL FROM/RCPT TO não reconhecidos",
+        "solucao": ["Verifique o formato do email informado"]
+    }
+}
+
+# Catálogo por status estendido (RFC 3463, RFC 4954 e RFC 5248)
+ENHANCED_STATUS_CODES = {
+    "5.7.8": {
+        "tipo": "credentials",
+        "causa": "Credenciais de autenticação inválidas",
+        "solucao": [
+            "Verifique se o email e senha estão corretos",
+            "Verifique se a conta exige senha de aplicativo (autenticação de dois fatores)"
+        ]
+    },
+    "5.7.9": {
+        "tipo": "auth_mechanism",
+        "causa": "Mecanismo de autenticação muito fraco para o servidor",
+        "solucao": ["O provedor pode exigir senha de aplicativo ou OAuth2 para este acesso"]
+    },
+    "5.7.11": {
+        "tipo": "encryption_required",
+        "causa": "Criptografia exigida para o mecanismo de autenticação",
+        "solucao": ["Ative STARTTLS na porta 587 ou use SSL/TLS direto na porta 465"]
+    },
+    "4.7.12": {
+        "tipo": "password_transition",
+        "causa": "O servidor exige a troca de senha antes de autenticar",
+        "solucao": ["Acesse a conta pelo webmail e defina uma nova senha"]
+    },
+    "5.7.1": {
+        "tipo": "access_denied",
+        "causa": "Acesso não autorizado pela política do servidor",
+        "solucao": [
+            "A conta pode não ter permissão para envio autenticado por SMTP",
+            "O IP de origem pode estar bloqueado pelo provedor"
+        ]
+    },
+    "4.3.2": {
+        "tipo": "service_unavailable",
+        "causa": "O servidor não está aceitando conexões no momento",
+        "solucao": ["Tente novamente em alguns minutos"]
+    },
+    "4.4.2": {
+        "tipo": "connection_closed",
+        "causa": "Conexão interrompida pelo servidor",
+        "solucao": ["Tente novamente em alguns minutos"]
+    },
+    "5.5.1": {
+        "tipo": "protocol_error",
+        "causa": "Comando SMTP inválido",
+        "solucao": ["Confirme se o host e a porta são de um servidor SMTP"]
+    },
+    "5.5.2": {
+        "tipo": "protocol_error",
+        "causa": "Erro de sintaxe no comando SMTP",
+        "solucao": ["Confirme se o host e a porta são de um servidor SMTP"]
+    },
+    "5.5.4": {
+        "tipo": "protocol_error",
+        "causa": "Parâmetros de comando SMTP inválidos",
+        "solucao": ["O servidor não aceitou o método de autenticação usado"]
+    }
+}
+
+# Combinações em que o status estendido muda de sentido conforme o código básico
+REPLY_ENHANCED_CODES = {
+    (454, "4.7.0"): {
+        "tipo": "temporary_auth_failure",
+        "causa": "Falha temporária de autenticação ou TLS indisponível no servidor",
+        "solucao": ["Tente novamente em alguns minutos"]
+    },
+    (530, "5.7.0"): REPLY_CODES[530],
+    (535, "5.7.0"): {
+        "tipo": "authentication",
+        "causa": "Autenticação SMTP recusada",
+        "solucao": [
+            "Verifique se o email e senha estão corretos",
+            "Verifique as configurações de segurança da conta"
+        ]
+    }
+}
+
+# Particularidades dos provedores, por (código básico, status estendido)
+PROVIDER_OVERLAYS = {
+    "gmail": {
+        (535, "5.7.8"): {
+            "tipo": "credentials",
+            "causa": "Usuário e senha não aceitos pelo Gmail",
+            "solucao": [
+                "Para contas com verificação em duas etapas: use uma senha de aplicativo",
+                "Verifique se o formato da senha de app é correto (16 caracteres em grupos de 4)",
+                "Tente gerar uma nova senha de aplicativo"
+            ]
+        },
+        (534, "5.7.9"): {
+            "tipo": "app_password",
+            "causa": "Senha de aplicativo necessária para o Gmail",
+            "solucao": [
+                "Acesse sua conta Google > Segurança > Senhas de app > Gere uma nova senha",
+                "Use o formato exato fornecido pelo Google (xxxx xxxx xxxx xxxx)",
+                "Para mais informações: https://support.google.com/accounts/answer/185833"
+            ]
+        },
+        (534, "5.7.14"): {
+            "tipo": "web_login_required",
+            "causa": "Login via navegador necessário para o Gmail",
+            "solucao": [
+                "Faça login através de um navegador para confirmar a identidade",
+                "Verifique se há alguma notificação de segurança pendente na sua conta Google",
+                "Após o login no navegador, espere alguns minutos e tente novamente"
+            ]
+        },
+        (454, "4.7.0"): {
+            "tipo": "login_throttled",
+            "causa": "Muitas tentativas de login no Gmail",
+            "solucao": [
+                "O Gmail bloqueou temporariamente novos logins desta origem",
+                "Aguarde pelo menos 15 minutos antes de tentar novamente"
+            ]
+        },
+        (421, "4.7.0"): {
+            "tipo": "throttled",
+            "causa": "O Gmail está limitando conexões desta origem",
+            "solucao": ["Reduza a frequência de testes e tente novamente em alguns minutos"]
+        },
+        (421, "4.7.28"): {
+            "tipo": "throttled",
+            "causa": "O Gmail detectou uma taxa incomum de conexões desta origem",
+            "solucao": ["Reduza a frequência de testes e tente novamente mais tarde"]
+        }
+    },
+    "outlook": {
+        (535, "5.7.3"): {
+            "tipo": "credentials",
+            "causa": "Autenticação recusada pelo Outlook/Office 365",
+            "solucao": [
+                "Verifique se MFA está ativado e use uma senha de aplicativo",
+                "Confirme que o email e senha estão corretos"
+            ]
+        },
+        (535, "5.7.139"): {
+            "tipo": "smtp_auth_disabled",
+            "causa": "Autenticação SMTP (SMTP AUTH) desativada para a conta ou o tenant Office 365",
+            "solucao": [
+                "O administrador precisa habilitar 'SMTP autenticado' para esta caixa no Microsoft 365",
+                "Verifique também se os padrões de segurança do tenant não bloqueiam a autenticação básica"
+            ]
+        },
+        (432, "4.3.2"): {
+            "tipo": "throttled",
+            "causa": "Limite de conexões simultâneas atingido no Outlook/Office 365",
+            "solucao": [
+                "Feche outras aplicações que possam estar enviando com esta conta",
+                "Espere alguns minutos antes de tentar novamente"
+            ]
+        }
+    },
+    "yahoo": {
+        (535, "5.7.0"): {
+            "tipo": "credentials",
+            "causa": "Login recusado pelo Yahoo Mail (muitas tentativas com credenciais inválidas)",
+            "solucao": [
+                "O Yahoo exige senha de aplicativo para SMTP. Gere uma em sua conta",
+                "Aguarde antes de novas tentativas para não bloquear a conta"
+            ]
+        },
+        (554, "5.7.9"): {
+            "tipo": "access_denied",
+            "causa": "Envio bloqueado pela política do Yahoo Mail",
+            "solucao": ["Verifique as configurações de segurança em account.yahoo.com"]
+        }
+    }
+}
+
+# Diagnóstico por classe do código quando o código não está catalogado
+REPLY_CLASSES = {
+    4: {
+        "tipo": "temporary_failure",
+        "causa": "Falha temporária informada pelo servidor SMTP",
+        "solucao": ["Tente novamente em alguns minutos"]
+    },
+    5: {
+        "tipo": "permanent_failure",
+        "causa": "Falha permanente informada pelo servidor SMTP",
+        "solucao": ["Verifique as configurações do servidor SMTP e da conta"]
+    }
+}
+
+# Diagnóstico de erros sem código de resposta, pelo tipo de erro
+ERROS_SEM_CODIGO = {
+    "auth_not_supported": {
+        "causa": "O servidor não oferece autenticação SMTP nesta conexão",
+        "solucao": [
+            "Ative STARTTLS: muitos servidores só anunciam AUTH depois do TLS",
+            "Use a porta de envio autenticado (587 com STARTTLS ou 465 com SSL/TLS)"
+        ]
+    },
+    "starttls_not_supported": {
+        "causa": "O servidor não suporta STARTTLS",
+        "solucao": ["Tente usar uma conexão SSL/TLS direta (porta 465) ao invés de STARTTLS"]
+    },
+    "auth_mechanism": REPLY_CODES[504],
+    "connection_closed": {
+        "causa": "O servidor SMTP encerrou a conexão inesperadamente",
+        "solucao": [
+            "O servidor pode estar limitando conexões desta origem",
+            "Confirme se a porta e o modo de segurança (SSL/TLS ou STARTTLS) estão corretos"
+        ]
+    },
+    "ssl_error": {
+        "causa": "Problema na conexão SSL/TLS",
+        "solucao": [
+            "Verifique se o servidor suporta SSL/TLS na porta configurada",
+            "Porta 465 usa SSL/TLS direto; porta 587 usa STARTTLS"
+        ]
+    },
+    "timeout": {
+        "causa": "Tempo limite excedido na conexão SMTP",
+        "solucao": [
+            "O servidor pode estar com alta carga ou não responder",
+            "Alguns provedores de internet bloqueiam as portas SMTP de saída"
+        ]
+    },
+    "connection_refused": {
+        "causa": "Conexão recusada pelo servidor SMTP",
+        "solucao": [
+            "Verifique se o servidor SMTP está online",
+            "Confirme se o host e porta estão corretos"
+        ]
+    },
+    "socket_error": {
+        "causa": "Erro de conexão de rede",
+        "solucao": [
+            "Verifique sua conexão com a internet",
+            "Confirme se o host e porta do servidor SMTP estão corretos"
+        ]
+    },
+    "dns_error": {
+        "causa": "Não foi possível resolver o nome do servidor SMTP",
+        "solucao": [
+            "Confirme se o host do servidor SMTP está escrito corretamente",
+            "Se o host estiver correto, o DNS pode estar instável: tente novamente em instantes"
+        ]
+    },
+    "protocol_error": {
+        "causa": "Resposta inesperada do servidor SMTP",
+        "solucao": ["Confirme se o host e a porta são de um servidor SMTP"]
+    },
+    "unknown": {
+        "causa": "Erro SMTP não classificado",
+        "solucao": [
+            "Verifique se as credenciais estão corretas",
+            "Confirme as configurações do servidor SMTP (host, porta, SSL/TLS)",
+            "Verifique sua conexão com a internet"
+        ]
+    }
+}
+
+# Função para extrair código, status estendido e texto de uma resposta SMTP
+def extrair_resposta_smtp(erro, resposta=None):
+    """
+    Retorna (código básico, status estendido, texto) de uma exceção do smtplib
+    que carrega a resposta do servidor; nas demais, da resposta (código, texto)
+    informada, se houver (ex.: a última resposta de erro antes da conexão
+    cair), ou (None, None, str(erro))
+    """
+    codigo = getattr(erro, 'smtp_code', None)
+    texto = getattr(erro, 'smtp_error', b'')
+    if (not isinstance(codigo, int) or codigo < 0) and resposta is not None:
+        codigo, texto = resposta
+    if not isinstance(codigo, int) or codigo < 0:
+        return None, None, str(erro)
+    if isinstance(texto, bytes):
+        texto = texto.decode('utf-8', errors='replace')
+    texto = str(texto)
+    match = _STATUS_ESTENDIDO_RE.match(texto)
+    return codigo, match.group(1) if match else None, texto
+
+# Função para classificar erros que não trazem resposta do servidor
+def _tipo_sem_codigo(erro):
+    import smtplib
+    mensagem = str(erro).lower()
+    if isinstance(erro, smtplib.SMTPNotSupportedError):
+        return "starttls_not_supported" if "starttls" in mensagem else "auth_not_supported"
+    elif isinstance(erro, smtplib.SMTPServerDisconnected):
+        return "connection_closed"
+    elif isinstance(erro, smtplib.SMTPException):
+        return "auth_mechanism" if "authentication method" in mensagem else "protocol_error"
+    elif isinstance(erro, ssl.SSLError):
+        return "ssl_error"
+    elif isinstance(erro, socket.gaierror):
+        return "dns_error"
+    # Falhas do Happy Eyeballs chegam como OSError com o errno da última tentativa
+    elif isinstance(erro, socket.timeout) or getattr(erro, 'errno', None) == errno.ETIMEDOUT:
+        return "timeout"
+    elif isinstance(erro, ConnectionRefusedError) or getattr(erro, 'errno', None) == errno.ECONNREFUSED:
+        return "connection_refused"
+    elif isinstance(erro, socket.error):
+        return "socket_error"
+    return "unknown"
+
+# Função para localizar a entrada de catálogo de uma resposta SMTP
+def _entrada_resposta(codigo, status, provedor):
+    overlay = PROVIDER_OVERLAYS.get(provedor)
+    if overlay is not None and (codigo, status) in overlay:
+        return overlay[(codigo, status)]
+    if (codigo, status) in REPLY_ENHANCED_CODES:
+        return REPLY_ENHANCED_CODES[(codigo, status)]
+    if status in ENHANCED_STATUS_CODES:
+        return ENHANCED_STATUS_CODES[status]
+    if codigo in REPLY_CODES:
+        return REPLY_CODES[codigo]
+    return REPLY_CLASSES.get(codigo // 100)
+
+def classificar_erro_smtp(erro, host=None, email=None, resposta=None):
+    """
+    Classifica um erro SMTP e retorna o tipo de erro
+    """
+    codigo, status, _ = extrair_resposta_smtp(erro, resposta)
+    if codigo is not None:
+        provedor = identificar_provedor(host, email) if host or email else "generic"
+        entrada = _entrada_resposta(codigo, status, provedor)
+        if entrada is not None:
+            return entrada["tipo"]
+    return _tipo_sem_codigo(erro)
+
+def decisao_para_tipo(tipo_erro):
+    """
+    Decisão de nova tentativa, limitação de taxa e supressão para um tipo de erro
+    """
+    retry, retry_after, throttle, suppress = DECISOES_POR_TIPO.get(tipo_erro, DECISOES_POR_TIPO["unknown"])
+    return {
+        "retry": retry,
+        "retry_after": retry_after,
+        "throttle": throttle,
+        "suppress": suppress
+    }
+
+def diagnosticar_erro_smtp(erro, host=None, email=None, resolucao=None, resposta=None):
+    """
+    Diagnostica um erro SMTP e retorna informações detalhadas e soluções
+
+    Args:
+        erro (Exception): O erro SMTP capturado
+        host (str, optional): O host do servidor SMTP
+        email (str, optional): O endereço de email
+        resolucao (DomainResolution, optional): Contexto de resolução do domínio
+        resposta (tuple, optional): Última resposta de erro (código, texto) do
+            servidor, usada quando a exceção não traz código
+
+    Returns:
+        dict: Diagnóstico detalhado com causa, soluções e decisão
+    """
+    codigo, status, texto = extrair_resposta_smtp(erro, resposta)
+    provedor = identificar_provedor(host, email, resolucao) if host or email else "generic"
+
+    entrada = _entrada_resposta(codigo, status, provedor) if codigo is not None else None
+    if entrada is not None:
+        erro_type = entrada["tipo"]
+        diagnostico = entrada
+    else:
+        erro_type = _tipo_sem_codigo(erro)
+        diagnostico = ERROS_SEM_CODIGO.get(erro_type, ERROS_SEM_CODIGO["unknown"])
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Diagnosticando erro SMTP: {codigo} {status} (tipo: {erro_type}, provedor: {provedor})")
+
+    return {
+        "erro_original": texto,
+        "tipo_erro": erro_type,
+        "provedor": provedor,
+        "causa": diagnostico["causa"],
+        "solucoes": diagnostico["solucao"],
+        "decisao": decisao_para_tipo(erro_type),
+        "detalhes_tecnicos": {
+            "classe_erro": erro.__class__.__name__,
+            "codigo_resposta": codigo,
+            "status_estendido": status,
+            "temporario": codigo // 100 == 4 if codigo is not None else None
+        }
+    }
+
+def gerar_mensagem_amigavel(diagnostico):
+    """
+    Gera uma mensagem de erro amigável com base no diagnóstico
+    """
+    tipo_erro = diagnostico["tipo_erro"]
+    provedor = diagnostico["provedor"].capitalize()
+    codigo = diagnostico["detalhes_tecnicos"]["codigo_resposta"]
+    sufixo = f" (SMTP {codigo})" if codigo is not None else ""
+
+    if tipo_erro in ("credentials", "authentication"):
+        return f"Credenciais SMTP recusadas por {provedor}{sufixo}. Verifique seu email e senha " + \
+               "e se a conta exige senha de aplicativo."
+    elif tipo_erro == "app_password":
+        return f"É necessário usar uma senha de aplicativo para enviar por {provedor}{sufixo}. " + \
+               "Ative a verificação em duas etapas e crie uma senha de aplicativo específica."
+    elif tipo_erro in ("throttled", "login_throttled"):
+        return f"{provedor} está limitando conexões ou tentativas de login{sufixo}. " + \
+               "Aguarde alguns minutos antes de testar novamente."
+    elif tipo_erro in ("temporary_failure", "temporary_auth_failure", "service_unavailable"):
+        return f"Falha temporária no servidor SMTP de {provedor}{sufixo}. Tente novamente em alguns minutos."
+    elif tipo_erro in ("auth_required", "encryption_required", "auth_not_supported", "starttls_not_supported"):
+        return f"{provedor} exige outra configuração de segurança para autenticar via SMTP{sufixo}. " + \
+               "Verifique a porta e o modo SSL/TLS ou STARTTLS."
+    elif tipo_erro == "timeout":
+        return f"Tempo limite excedido ao conectar com o SMTP de {provedor}. " + \
+               "Verifique sua conexão de internet ou tente novamente mais tarde."
+    else:
+        return f"Erro SMTP com {provedor}{sufixo}: {diagnostico['causa']}. " + \
+               "Verifique as configurações e tente novamente."
+
+# Função para sanitizar e formatar erros SMTP para o cliente
+def sanitizar_erro_smtp(erro, host=None, email=None, resolucao=None, resposta=None):
+    """
+    Sanitiza erros SMTP para retornar mensagens amigáveis ao usuário,
+    com a decisão de nova tentativa, limitação de taxa e supressão
+
+    Args:
+        erro (Exception): O erro SMTP original
+        host (str, optional): O host do servidor SMTP
+        email (str, optional): O endereço de email
+        resolucao (DomainResolution, optional): Contexto de resolução do domínio
+        resposta (tuple, optional): Última resposta de erro (código, texto) do servidor
+
+    Returns:
+        dict: Erro formatado com mensagem amigável
+    """
+    diagnostico = diagnosticar_erro_smtp(erro, host, email, resolucao, resposta)
+    detalhes = diagnostico["detalhes_tecnicos"]
+
+    return {
+        "error_type": diagnostico["tipo_erro"],
+        "message": gerar_mensagem_amigavel(diagnostico),
+        "solutions": diagnostico["solucoes"],
+        "decision": diagnostico["decisao"],
+        "technical_details": {
+            "provider": diagnostico["provedor"],
+            "error_class": detalhes["classe_erro"],
+            "reply_code": detalhes["codigo_resposta"],
+            "enhanced_status": detalhes["status_estendido"]
+        }
+    }
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Identificação de clientes (tenants) pelas chaves de API
+
+Cada tenant tem uma ou mais chaves, um peso na divisão das vagas de sondagem,
+cotas próprias de sondagens simultâneas e em fila e, opcionalmente, a classe
+de prioridade mais urgente que pode pedir acima da padrão de cada endpoint
+(max_priority). A configuração vem de TENANTS (JSON) ou de TENANTS_FILE
+(arquivo JSON), no formato:
+
+    {"acme": {"keys": ["chave-1", "chave-2"], "weight": 2,
+              "max_in_flight": 4, "max_queued": 8, "max_priority": "interactive"}}
+
+A API_KEY única continua valendo como o tenant 'default'. As chaves são
+guardadas apenas como hash SHA-256.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Configurar logger
+logger = logging.getLogger('emailmax-validator.tenants')
+
+# Configurações
+TENANTS_JSON = os.environ.get('TENANTS', '')
+TENANTS_FILE = os.environ.get('TENANTS_FILE', '')
+TENANT_DEFAULT_WEIGHT = float(os.environ.get('TENANT_DEFAULT_WEIGHT', '1'))
+TENANT_DEFAULT_MAX_IN_FLIGHT = int(os.environ.get('TENANT_DEFAULT_MAX_IN_FLIGHT', '0'))  # 0 = sem cota
+TENANT_DEFAULT_MAX_QUEUED = int(os.environ.get('TENANT_DEFAULT_MAX_QUEUED', '0'))  # 0 = sem cota
+
+DEFAULT_TENANT = 'default'
+# Endpoints sem autenticação (diagnóstico IMAP) contam para este tenant
+ANONYMOUS_TENANT = 'anonymous'
+
+# Classes de prioridade do controle de admissão, da mais para a menos urgente
+PRIORITY_CLASSES = ('interactive', 'bulk', 'background')
+
+
+def _key_hash(key: str) -> str:
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class Tenant:
+    """
+    Cliente da API: nome, peso, cotas (0 = sem cota) e a classe de prioridade
+    mais urgente que pode pedir (None = nunca acima da padrão do endpoint)
+    """
+
+    __slots__ = ('name', 'weight', 'max_in_flight', 'max_queued', 'max_priority')
+
+    def __init__(self, name: str, weight: float = TENANT_DEFAULT_WEIGHT,
+                 max_in_flight: int = TENANT_DEFAULT_MAX_IN_FLIGHT,
+                 max_queued: int = TENANT_DEFAULT_MAX_QUEUED,
+                 max_priority: Optional[str] = None):
+        if weight <= 0:
+            raise ValueError(f'Peso do tenant {name} deve ser positivo')
+        if max_priority is not None and max_priority not in PRIORITY_CLASSES:
+            raise ValueError(f'max_priority do tenant {name} deve ser uma de: {", ".join(PRIORITY_CLASSES)}')
+        self.name = name
+        self.weight = float(weight)
+        self.max_in_flight = int(max_in_flight)
+        self.max_queued = int(max_queued)
+        self.max_priority = max_priority
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'weight': self.weight,
+            'max_in_flight': self.max_in_flight or None,
+            'max_queued': self.max_queued or None,
+            'max_priority': self.max_priority
+        }
+
+
+class TenantRegistry:
+    """
+    Mapa hash da chave -> tenant
+    """
+
+    def __init__(self):
+        self._by_key_hash: Dict[str, Tenant] = {}
+        self._tenants: Dict[str, Tenant] = {}
+        self._lock = threading.Lock()
+
+    def add(self, tenant: Tenant, keys: Iterable[str]) -> None:
+        with self._lock:
+            self._tenants[tenant.name] = tenant
+            for key in keys:
+                if key:
+                    self._by_key_hash[_key_hash(key)] = tenant
+
+    def authenticate(self, key: Optional[str]) -> Optional[Tenant]:
+        """
+        Tenant dono da chave, ou None se a chave for desconhecida
+        """
+        if not key:
+            return None
+        # A busca é feita pelo hash, então o tempo não revela nada sobre a chave
+        return self._by_key_hash.get(_key_hash(key))
+
+    def get(self, name: str) -> Optional[Tenant]:
+        return self._tenants.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._tenants)
+
+
+def _load_config() -> Dict[str, Any]:
+    if TENANTS_FILE:
+        with open(TENANTS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    if TENANTS_JSON:
+        return json.loads(TENANTS_JSON)
+    return {}
+
+
+def _build_tenant(name: str, options: Any) -> Tuple[Tenant, List[str]]:
+    """
+    Tenant e chaves de uma entrada da configuração
+
+    Raises:
+        ValueError: se a entrada for inválida
+    """
+    if not isinstance(options, dict):
+        raise ValueError('a entrada deve ser um objeto')
+    keys = options.get('keys', [])
+    if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+        raise ValueError("'keys' deve ser uma lista de strings")
+    try:
+        tenant = Tenant(
+            name,
+            weight=float(options.get('weight', TENANT_DEFAULT_WEIGHT)),
+            max_in_flight=int(options.get('max_in_flight', TENANT_DEFAULT_MAX_IN_FLIGHT)),
+            max_queued=int(options.get('max_queued', TENANT_DEFAULT_MAX_QUEUED)),
+            max_priority=options.get('max_priority')
+        )
+    except TypeError as e:
+        raise ValueError(str(e)) from e
+    return tenant, keys
+
+
+def build_registry(api_key: Optional[str]) -> TenantRegistry:
+    """
+    Monta o registro a partir da configuração; api_key vira o tenant 'default'
+
+    Uma entrada inválida é registrada no log e ignorada, sem impedir que o
+    worker suba com as demais.
+    """
+    registry = TenantRegistry()
+    try:
+        config = _load_config()
+        if not isinstance(config, dict):
+            raise ValueError('esperado um objeto {nome: opções}')
+    except (OSError, ValueError) as e:
+        logger.error(f"Configuração de tenants inválida, usando apenas API_KEY: {e}")
+        config = {}
+
+    for name, options in config.items():
+        try:
+            tenant, keys = _build_tenant(name, options)
+        except ValueError as e:
+            logger.error(f"Tenant {name} ignorado, configuração inválida: {e}")
+            continue
+        registry.add(tenant, keys)
+
+    if api_key:
+        default = registry.get(DEFAULT_TENANT) or Tenant(DEFAULT_TENANT)
+        registry.add(default, [api_key])
+
+    logger.info(f"{len(registry.names())} tenants configurados")
+    return registry
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fixtures dos testes de ponta a ponta da API
+
+A aplicação roda pelo cliente de teste do Flask contra o servidor DNS de
+teste e o servidor IMAP/SMTP de teste (harness/), sem rede. Os módulos leem
+a configuração na importação, então o ambiente é ajustado antes de importar
+app; limite de requisições, supressão de logins e controle de admissão são
+recriados a cada teste para que um não herde o estado do outro.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+_STATE_DIR = tempfile.mkdtemp(prefix='emailmax-tests-')
+
+os.environ.update({
+    'API_KEY': 'test-api-key',
+    'LOG_LEVEL': 'WARNING',
+    'CACHE_BACKEND': 'memory',
+    'RATE_LIMIT_BACKEND': 'memory',
+    'AUTH_SUPPRESSION_BACKEND': 'memory',
+    'AUTH_SUPPRESSION_SECRET': 'test-secret',
+    'PROBE_DUMP_DIR': os.path.join(_STATE_DIR, 'probes'),
+})
+
+import admission_control  # noqa: E402
+import auth_suppression  # noqa: E402
+import dns_resolver_pool  # noqa: E402
+import rate_limit  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from harness.fake_mail_server import FakeMailServer  # noqa: E402
+from harness.stub_dns import StubDNSServer  # noqa: E402
+
+API_KEY = 'test-api-key'
+IMAP_HOST = 'imap.fake.test'
+SMTP_HOST = 'smtp.fake.test'
+
+
+@pytest.fixture(scope='session')
+def dns_server():
+    with StubDNSServer() as server:
+        dns_resolver_pool.configure_nameservers([(server.host, server.port)])
+        yield server
+
+
+@pytest.fixture(scope='session')
+def mail_server(dns_server):
+    with FakeMailServer([IMAP_HOST, SMTP_HOST]) as server:
+        server.install_dns(dns_server)
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'rate_limiter', rate_limit.RateLimiter(rate_limit.MemoryBucketStore()))
+    monkeypatch.setattr(auth_suppression, 'auth_ledger',
+                        auth_suppression.AuthSuppressionLedger(auth_suppression.MemoryLRUCache()))
+    monkeypatch.setattr(admission_control, 'admission_controller', admission_control.AdmissionController())
+
+
+@pytest.fixture
+def client():
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def auth_headers():
+    return {'Authorization': f'Bearer {API_KEY}'}
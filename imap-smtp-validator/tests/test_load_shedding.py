@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Limite de requisições (429), controle de admissão (503) e a vaga de admissão
+mantida pela verificação em lote só enquanto a resposta é transmitida
+"""
+
+import json
+
+import admission_control
+import rate_limit
+
+
+def _invalid_email_body():
+    # Recusado pelo precheck: exercita os decorators sem rede
+    return {'email': 'sem-arroba.example.com', 'password': 'x'}
+
+
+def test_account_rate_limit_returns_429_with_retry_after(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(rate_limit.rate_limiter, 'account_limit', rate_limit.RateLimit.parse('2/300'))
+
+    statuses = [client.post('/api/test-connection', headers=auth_headers,
+                            json=_invalid_email_body()).status_code for _ in range(2)]
+    limited = client.post('/api/test-connection', headers=auth_headers, json=_invalid_email_body())
+
+    assert statuses == [200, 200]
+    assert limited.status_code == 429
+    assert limited.get_json()['success'] is False
+    assert int(limited.headers['Retry-After']) > 0
+    assert limited.headers['RateLimit-Remaining'] == '0'
+
+
+def test_admission_rejects_with_503_when_worker_is_full(client, auth_headers, monkeypatch):
+    controller = admission_control.AdmissionController(max_concurrent=1, max_queue=0,
+                                                       max_queue_wait=0.1, interactive_reserved=0)
+    monkeypatch.setattr(admission_control, 'admission_controller', controller)
+    ticket = controller.acquire()
+
+    rejected = client.post('/api/test-connection', headers=auth_headers, json=_invalid_email_body())
+
+    assert rejected.status_code == 503
+    assert int(rejected.headers['Retry-After']) >= 1
+    assert rejected.get_json()['retryAfter'] == int(rejected.headers['Retry-After'])
+
+    controller.release(ticket)
+    admitted = client.post('/api/test-connection', headers=auth_headers, json=_invalid_email_body())
+    assert admitted.status_code == 200
+    assert controller.counts() == {'in_flight': 0, 'queued': 0}
+
+
+def test_bulk_stream_holds_admission_slot_until_closed(client, auth_headers, dns_server, monkeypatch):
+    controller = admission_control.AdmissionController(max_concurrent=2, max_queue=0,
+                                                       max_queue_wait=0.1, interactive_reserved=0)
+    monkeypatch.setattr(admission_control, 'admission_controller', controller)
+    dns_server.add_records('bulk.fake.test', 'MX', ['10 mx.bulk.fake.test.'])
+    dns_server.add_records('mx.bulk.fake.test', 'A', ['127.0.0.1'])
+    emails = ['a@bulk.fake.test', 'b@bulk.fake.test', 'invalido']
+
+    response = client.post('/api/verify-email-domain/bulk', headers=auth_headers,
+                           json={'emails': emails}, buffered=False)
+    assert response.status_code == 200
+    assert response.headers['X-Request-Priority'] == 'bulk'
+    assert controller.counts()['in_flight'] == 1
+
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    response.close()
+
+    assert lines[-1]['summary'] == {'emails': 3, 'domains': 1, 'invalid': 1,
+                                    'elapsedTime': lines[-1]['summary']['elapsedTime']}
+    assert sorted(line['email'] for line in lines[:-1]) == sorted(emails)
+    assert controller.counts() == {'in_flight': 0, 'queued': 0}
+    assert controller.snapshot()['classes']['bulk']['admitted'] == 1
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/api/test-connection de ponta a ponta: precheck, supressão de logins
+recusados e Happy Eyeballs com um endereço que não responde
+"""
+
+import time
+import socket
+
+import pytest
+
+from conftest import IMAP_HOST, SMTP_HOST
+from happy_eyeballs import HE_MIN_ATTEMPT_DELAY
+from latency_stats import hedge_budget
+
+
+def _imap_only(mail_server, email, password, **extra):
+    body = dict(mail_server.connection_settings(IMAP_HOST, SMTP_HOST),
+                email=email, password=password, testSmtp=False)
+    body.update(extra)
+    return body
+
+
+def _imap_logins(mail_server):
+    counters = mail_server.stats.get('imap', {})
+    return counters.get('logins_ok', 0) + counters.get('logins_failed', 0)
+
+
+@pytest.fixture
+def black_hole(mail_server):
+    """
+    Escuta em ::1 na porta IMAP do servidor de teste com a fila de conexões
+    cheia: o SYN é descartado e o connect fica pendurado até o timeout. Sendo
+    IPv6, é sempre o primeiro endereço tentado pelo Happy Eyeballs.
+    """
+    port = mail_server.ports['imap_ssl']
+    listener = socket.socket(socket.AF_INET6)
+    try:
+        listener.bind(('::1', port))
+    except OSError:
+        listener.close()
+        pytest.skip('IPv6 de loopback indisponível')
+    listener.listen(0)
+    fillers = []
+    for _ in range(3):
+        filler = socket.socket(socket.AF_INET6)
+        filler.setblocking(False)
+        filler.connect_ex(('::1', port))
+        fillers.append(filler)
+    time.sleep(0.2)
+    yield '::1'
+    for sock in fillers + [listener]:
+        sock.close()
+
+
+def test_precheck_rejects_impossible_email_without_network(client, auth_headers, mail_server):
+    connections = mail_server.stats.get('imap', {}).get('connections', 0)
+
+    response = client.post('/api/test-connection', headers=auth_headers,
+                           json=_imap_only(mail_server, 'sem-arroba.example.com', 'x'))
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['success'] is False
+    assert data['stage'] == 'precheck'
+    assert data['details']['precheck']['error_type'] == 'invalid_email'
+    assert mail_server.stats.get('imap', {}).get('connections', 0) == connections
+
+
+def test_precheck_rejects_password_outside_provider_format(client, auth_headers):
+    # imap.gmail.com não existe no DNS de teste: só o precheck evita a falha de rede
+    body = {'email': 'user@gmail.com', 'password': 'senha-comum', 'autodetect': False,
+            'imapHost': 'imap.gmail.com', 'imapPort': 993, 'imapSecure': True,
+            'smtpHost': 'smtp.gmail.com', 'smtpPort': 587, 'testSmtp': False}
+
+    data = client.post('/api/test-connection', headers=auth_headers, json=body).get_json()
+
+    assert data['success'] is False
+    assert data['details']['imap']['stage'] == 'precheck'
+
+
+def test_rejected_credentials_are_suppressed_until_password_changes(client, auth_headers, mail_server):
+    email = 'suppressed@fake.test'
+    mail_server.add_account(email, 'right-password')
+
+    first = client.post('/api/test-connection', headers=auth_headers,
+                        json=_imap_only(mail_server, email, 'wrong-password')).get_json()
+    assert first['details']['imap']['stage'] == 'authentication'
+    assert not first['details']['imap'].get('suppressed')
+
+    logins = _imap_logins(mail_server)
+    second = client.post('/api/test-connection', headers=auth_headers,
+                         json=_imap_only(mail_server, email, 'wrong-password')).get_json()
+    assert second['details']['imap']['suppressed'] is True
+    assert second['details']['imap']['suppression']['failures'] == 1
+    assert _imap_logins(mail_server) == logins
+
+    # Outra senha apaga o registro e vai ao provedor
+    third = client.post('/api/test-connection', headers=auth_headers,
+                        json=_imap_only(mail_server, email, 'right-password')).get_json()
+    assert third['success'] is True
+    assert _imap_logins(mail_server) == logins + 1
+
+    # Depois do login aceito, a senha antiga também volta a ser testada
+    fourth = client.post('/api/test-connection', headers=auth_headers,
+                         json=_imap_only(mail_server, email, 'wrong-password')).get_json()
+    assert not fourth['details']['imap'].get('suppressed')
+    assert _imap_logins(mail_server) == logins + 2
+
+
+def test_happy_eyeballs_falls_back_from_black_holed_address(client, auth_headers, dns_server,
+                                                           mail_server, black_hole, monkeypatch):
+    host = 'imap-dual.fake.test'
+    dns_server.add_records(host, 'AAAA', [black_hole])
+    dns_server.add_records(host, 'A', ['127.0.0.1'])
+    email = 'fallback@fake.test'
+    mail_server.add_account(email, 'password')
+    # Sem orçamento de hedges o escalonamento entre endereços continua valendo
+    monkeypatch.setattr(hedge_budget, '_tokens', 0.0)
+
+    start = time.monotonic()
+    data = client.post('/api/test-connection', headers=auth_headers,
+                       json=_imap_only(mail_server, email, 'password', imapHost=host, timeout=5)).get_json()
+    elapsed = time.monotonic() - start
+
+    assert data['success'] is True, data
+    assert data['details']['imap']['network']['address'] == '127.0.0.1'
+    # Esperou o atraso entre tentativas, não o timeout de connect
+    assert HE_MIN_ATTEMPT_DELAY <= elapsed < 3
+
+
+def test_smtp_throttle_sets_retry_after_and_holds_the_account(client, auth_headers, mail_server):
+    # Domínio do Outlook: o catálogo do provedor classifica 432 4.3.2 como limitação
+    email = 'throttled@outlook.com'
+    mail_server.add_account(email, 'password')
+    mail_server.script(email, auth_failure='432 4.3.2 Concurrent connections limit exceeded')
+    body = dict(mail_server.connection_settings(IMAP_HOST, SMTP_HOST),
+                email=email, password='password', testImap=False)
+
+    first = client.post('/api/test-connection', headers=auth_headers, json=body)
+    smtp = first.get_json()['details']['smtp']
+    assert smtp['error_type'] == 'throttled'
+    assert smtp['decision']['throttle'] is True
+    assert first.headers['Retry-After'] == str(smtp['decision']['retry_after'])
+
+    logins = mail_server.stats['smtp'].get('logins_failed', 0)
+    second = client.post('/api/test-connection', headers=auth_headers, json=body)
+    held = second.get_json()['details']['smtp']
+    assert held['throttled'] is True
+    assert 0 < int(second.headers['Retry-After']) <= smtp['decision']['retry_after']
+    assert mail_server.stats['smtp'].get('logins_failed', 0) == logins
+
+
+def test_smtp_network_failures_carry_the_retry_decision(client, auth_headers, mail_server):
+    closed = socket.socket()
+    closed.bind(('127.0.0.1', 0))
+    port = closed.getsockname()[1]
+    closed.close()
+    body = dict(mail_server.connection_settings(IMAP_HOST, SMTP_HOST),
+                email='refused@fake.test', password='password', testImap=False, smtpPort=port)
+
+    refused = client.post('/api/test-connection', headers=auth_headers, json=body)
+    smtp = refused.get_json()['details']['smtp']
+    assert smtp['stage'] == 'network'
+    assert smtp['error_type'] == 'connection_refused'
+    assert smtp['decision']['retry'] is False
+    assert 'Retry-After' not in refused.headers
+
+    body.update(smtpHost='sem-registro.fake.test', smtpPort=587)
+    unresolved = client.post('/api/test-connection', headers=auth_headers, json=body)
+    smtp = unresolved.get_json()['details']['smtp']
+    assert smtp['stage'] == 'dns'
+    assert smtp['error_type'] == 'dns_error'
+    assert unresolved.headers['Retry-After'] == str(smtp['decision']['retry_after'])